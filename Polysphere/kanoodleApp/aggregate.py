@@ -0,0 +1,227 @@
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .pool import get_process_pool
+from .util import DeadlineReached, _worker_solver
+
+
+def board_symmetries(width, height, board_state, mask=None):
+    """Coordinate maps of the board's symmetry group that leave ``board_state`` (and ``mask``) unchanged.
+
+    The identity comes first. Rectangles have the four flips and half-turns;
+    square boards also have the quarter-turns and diagonal reflections.
+    """
+    w, h = width - 1, height - 1
+    maps = [
+        lambda x, y: (x, y),
+        lambda x, y: (w - x, y),
+        lambda x, y: (x, h - y),
+        lambda x, y: (w - x, h - y),
+    ]
+    if width == height:
+        maps += [
+            lambda x, y: (y, x),
+            lambda x, y: (w - y, x),
+            lambda x, y: (y, h - x),
+            lambda x, y: (w - y, h - x),
+        ]
+    return [
+        g for g in maps
+        if all(board_state[g(x, y)[1]][g(x, y)[0]] == board_state[y][x]
+               for y in range(height) for x in range(width))
+        and (mask is None or {g(x, y) for x, y in mask} == mask)
+    ]
+
+
+def symmetry_exclusions(solver, board_state, symmetries):
+    """Placements to drop so each symmetry orbit of solutions is enumerated once.
+
+    Picks the first unplaced piece none of whose placements is fixed by a
+    non-identity symmetry and keeps only the smallest placement of each of
+    its orbits. Returns ``(exclude, symmetries)``; when no such piece exists
+    nothing is excluded and only the identity is kept.
+    """
+    if len(symmetries) == 1:
+        return set(), symmetries
+    placed = {cell for row in board_state for cell in row if cell}
+    occupied = {(x, y) for y, row in enumerate(board_state) for x, cell in enumerate(row) if cell}
+    for piece_data in solver.pieces_data:
+        if piece_data['id'] in placed:
+            continue
+        placements = solver._get_placements(piece_data, occupied)
+        images = {}
+        for placement_id, _, positions in placements:
+            key = tuple(sorted(positions))
+            orbit = [tuple(sorted(g(x, y) for x, y in positions)) for g in symmetries]
+            if any(image == key for image in orbit[1:]):
+                break
+            images[placement_id] = (key, min(orbit))
+        else:
+            return {pid for pid, (key, canonical) in images.items() if key != canonical}, symmetries
+    return set(), symmetries[:1]
+
+
+class SolutionStats:
+    """Per-row solution counts and per-piece-pair contact counts, folded by ``DancingLinks.fold``.
+
+    Counters are plain dicts while the search runs, so folding a node costs a
+    few dict updates and never allocates a board; ``aggregate_solutions``
+    turns them into NumPy arrays at the end.
+    """
+
+    def __init__(self, placement_info, fixed):
+        self.placement_info = placement_info
+        self.fixed = fixed
+        self.cells = {}
+        self.neighbours = {}
+        for row_id, (_, positions) in list(placement_info.items()) + list(fixed.items()):
+            cells = frozenset(positions)
+            self.cells[row_id] = cells
+            self.neighbours[row_id] = frozenset(
+                (x + dx, y + dy) for x, y in cells for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            ) - cells
+        self.rows = {}
+        self.contacts = {}
+        self.total = 0
+
+    def _touch(self, a, b, n):
+        if not self.cells[a].isdisjoint(self.neighbours[b]):
+            pa, pb = self._piece(a), self._piece(b)
+            key = (pa, pb) if pa <= pb else (pb, pa)
+            self.contacts[key] = self.contacts.get(key, 0) + n
+
+    def _piece(self, row_id):
+        return (self.placement_info.get(row_id) or self.fixed[row_id])[0]
+
+    def visit(self, row_id, ancestors, n):
+        self.rows[row_id] = self.rows.get(row_id, 0) + n
+        for other in ancestors:
+            self._touch(other, row_id, n)
+        for other in self.fixed:
+            self._touch(other, row_id, n)
+
+    def finish(self, total):
+        self.total = total
+        fixed = list(self.fixed)
+        for i, a in enumerate(fixed):
+            for b in fixed[i + 1:]:
+                self._touch(a, b, total)
+
+    def raw(self):
+        return self.total, self.rows, self.contacts
+
+
+def _fixed_pieces(board_state):
+    cells = {}
+    for y, row in enumerate(board_state):
+        for x, piece_id in enumerate(row):
+            if piece_id:
+                cells.setdefault(('fixed', piece_id), []).append((x, y))
+    return {key: (key[1], tuple(positions)) for key, positions in cells.items()}
+
+
+def _prepare(solver, board_state):
+    board_state = solver._build_matrix(board_state)[0]
+    symmetries = board_symmetries(solver.width, solver.height, board_state, solver.mask)
+    exclude, symmetries = symmetry_exclusions(solver, board_state, symmetries)
+    board_state, dlx, placement_info, error = solver._build_matrix(board_state, exclude=exclude)
+    return board_state, dlx, placement_info, error, exclude, symmetries
+
+
+def _fold_shards(job):
+    spec, board_state, exclude, prefixes, deadline = job
+    board_state, dlx, placement_info, _ = _worker_solver(spec)._build_matrix(board_state, exclude=exclude)
+    stats = SolutionStats(placement_info, {})
+    stats.total = sum(dlx.fold(stats.visit, prefix=prefix, deadline=deadline) for prefix in prefixes)
+    return stats.raw()
+
+
+def aggregate_solutions(solver, board_state, max_time=None, shard_depth=0, workers=1):
+    """Heatmap and contact statistics over every solution of ``board_state``.
+
+    Returns ``cellPieceCounts`` (height x width x pieces: solutions in which
+    each piece covers each cell) and ``contacts`` (pieces x pieces: solutions
+    in which two pieces share an edge) as NumPy arrays, indexed by
+    ``pieceIds``. When the board is symmetric, one solution per symmetry
+    orbit is enumerated and the counts are weighted back up by the group.
+    With ``workers`` > 1 the tree is split at ``shard_depth`` (at least 1)
+    and the shards are folded on slots of the shared process pool and
+    summed; with no free slots the whole tree is folded inline.
+    """
+    if np is None:
+        return {'solutionCount': 0, 'timedOut': False, 'message': "NumPy is required for aggregate statistics."}
+    deadline = time.time() + max_time / 1000 if max_time else None
+    if workers > 1 and solver.placement_table is None:
+        # Workers rebuild the matrix from the table, so placement ids must come from it too.
+        solver.placement_table = solver.build_placement_table()
+    board_state, dlx, placement_info, error, exclude, symmetries = _prepare(solver, board_state)
+    piece_ids = [p['id'] for p in solver.pieces_data]
+    index = {piece_id: i for i, piece_id in enumerate(piece_ids)}
+    heat = np.zeros((solver.height, solver.width, len(piece_ids)), dtype=np.int64)
+    contacts = np.zeros((len(piece_ids), len(piece_ids)), dtype=np.int64)
+    result = {'pieceIds': piece_ids, 'symmetry': len(symmetries), 'cellPieceCounts': heat,
+              'contacts': contacts, 'solutionCount': 0, 'timedOut': False}
+    if error:
+        result['message'] = error
+        return result
+
+    fixed = _fixed_pieces(board_state)
+    stats = SolutionStats(placement_info, fixed)
+    pool = get_process_pool()
+    try:
+        with pool.reserve(workers) as granted:
+            if granted:
+                prefixes = dlx.branch_prefixes(max(1, shard_depth))
+                spec = solver.worker_spec()
+                jobs = [(spec, board_state, exclude, prefixes[i::granted], deadline) for i in range(granted)]
+                total = 0
+                for shard_total, rows, shard_contacts in pool.map(_fold_shards, jobs):
+                    total += shard_total
+                    for row_id, n in rows.items():
+                        stats.rows[row_id] = stats.rows.get(row_id, 0) + n
+                    for key, n in shard_contacts.items():
+                        stats.contacts[key] = stats.contacts.get(key, 0) + n
+                # Contacts with pre-placed pieces are not folded in the shards.
+                for row_id, n in stats.rows.items():
+                    for other in fixed:
+                        stats._touch(other, row_id, n)
+            else:
+                total = dlx.fold(stats.visit, deadline=deadline)
+    except DeadlineReached:
+        result.update({'timedOut': True, 'message': "Time limit reached before all solutions were folded."})
+        return result
+    stats.finish(total)
+
+    for row_id, n in stats.rows.items():
+        piece_id, positions = placement_info[row_id]
+        for x, y in positions:
+            heat[y, x, index[piece_id]] += n
+    for piece_id, positions in fixed.values():
+        for x, y in positions:
+            heat[y, x, index[piece_id]] += total
+    for (a, b), n in stats.contacts.items():
+        contacts[index[a], index[b]] += n
+        if a != b:
+            contacts[index[b], index[a]] += n
+
+    if len(symmetries) > 1:
+        ys, xs = np.indices((solver.height, solver.width)).reshape(2, -1)
+        weighted = np.zeros_like(heat)
+        for g in symmetries:
+            gx, gy = np.array([g(x, y) for x, y in zip(xs, ys)]).T
+            weighted[gy, gx] += heat[ys, xs]
+        heat = weighted
+        contacts = contacts * len(symmetries)
+
+    count = total * len(symmetries)
+    result.update({
+        'cellPieceCounts': heat,
+        'contacts': contacts,
+        'solutionCount': count,
+        'message': f"Aggregated {count} solution(s)." if count else "No solutions found.",
+    })
+    return result
@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class KanoodleappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kanoodleApp'
+
+    def ready(self):
+        from . import catalogue  # noqa: F401 -- registers Piece change signals
+        self._load_warmstart()
+
+    def _load_warmstart(self):
+        import logging
+        import os
+        from django.conf import settings
+        path = getattr(settings, 'KANOODLE_WARMSTART_PATH', None)
+        if not path or not os.path.exists(path):
+            return
+        from .warmstart import load_snapshot
+        try:
+            load_snapshot(path)
+        except Exception:
+            logging.getLogger(__name__).exception("Could not load warm-start snapshot %s", path)
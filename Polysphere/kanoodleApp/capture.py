@@ -0,0 +1,188 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from .util import _setting, get_progress
+
+_LOGGER = None
+_CATALOGUES = set()
+_LOCK = threading.Lock()
+
+# Response counters copied into a record next to the request body.
+OUTCOME_FIELDS = ('solutionCount', 'solutionsReturned', 'timedOut', 'exhausted', 'limitReached', 'cache')
+
+
+def capture_dir():
+    return _setting('KANOODLE_CAPTURE_DIR', None)
+
+
+def _capture_logger():
+    """Logger writing one JSON record per line to a size-rotated ``requests.jsonl``."""
+    global _LOGGER
+    if _LOGGER is None:
+        with _LOCK:
+            if _LOGGER is None:
+                directory = capture_dir()
+                os.makedirs(directory, exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    os.path.join(directory, 'requests.jsonl'),
+                    maxBytes=_setting('KANOODLE_CAPTURE_MAX_BYTES', 10 * 1024 * 1024),
+                    backupCount=_setting('KANOODLE_CAPTURE_BACKUPS', 5),
+                    encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger = logging.getLogger('kanoodleApp.capture.records')
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                _LOGGER = logger
+    return _LOGGER
+
+
+def _save_catalogue(catalogue):
+    """Write ``catalogue-<digest>.json`` once, so records only need the digest."""
+    if catalogue.digest in _CATALOGUES:
+        return
+    path = os.path.join(capture_dir(), f'catalogue-{catalogue.digest}.json')
+    if not os.path.exists(path):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(catalogue.pieces, f)
+        os.replace(tmp, path)
+    _CATALOGUES.add(catalogue.digest)
+
+
+def load_catalogue(directory, digest):
+    """Pieces saved for ``digest`` in a capture directory, or None."""
+    path = os.path.join(directory, f'catalogue-{digest}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_records(paths):
+    """Yield capture records from JSONL files, skipping lines cut short by a crash."""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _sampled():
+    rate = _setting('KANOODLE_CAPTURE_RATE', 0)
+    return bool(rate) and capture_dir() is not None and random.random() < rate
+
+
+def _outcome(response):
+    """Result counters from an uncompressed JSON response; other wire formats record only the status."""
+    out = {'status': response.status_code}
+    if response.get('Content-Type', '').startswith('application/json') and not response.get('Content-Encoding'):
+        try:
+            payload = json.loads(response.content)
+        except ValueError:
+            payload = {}
+        out.update({key: payload[key] for key in OUTCOME_FIELDS if key in payload})
+    elif response.get('X-Kanoodle-Cache'):
+        out['cache'] = response['X-Kanoodle-Cache'].lower()
+    return out
+
+
+def _nodes(progress_key, before):
+    """Search nodes this request added to the progress published under ``progress_key``."""
+    progress = get_progress(progress_key)
+    if progress is None:
+        return None
+    if progress is before[0]:
+        return progress.nodes - before[1]
+    return progress.nodes
+
+
+def _record(request, solution_id, started, elapsed_ms, nodes_before, offset, response):
+    from .catalogue import get_catalogue
+    from .cursors import get_cursor_store
+    try:
+        data = json.loads(request.body)
+        if data.get('action') == 'progress':
+            return
+        board = get_cursor_store().get(solution_id).board
+        catalogue = get_catalogue()
+        _save_catalogue(catalogue)
+        record = {
+            'ts': round(started, 3),
+            'solutionId': solution_id,
+            'width': board.width,
+            'height': board.height,
+            'mask': board.mask,
+            'catalogue': catalogue.digest,
+            'action': data.get('action') or 'solve',
+            'request': data,
+            'elapsedMs': round(elapsed_ms, 1),
+            'nodes': _nodes(f"solve:{solution_id}", nodes_before),
+        }
+        if record['action'] == 'next':
+            # The client pages by session, not by token; keep where this page began.
+            record['offset'] = offset
+        record.update(_outcome(response))
+        _capture_logger().info(json.dumps(record, separators=(',', ':')))
+    except Exception:
+        logging.getLogger(__name__).exception("Could not capture solve request")
+
+
+def _nodes_before(solution_id):
+    progress = get_progress(f"solve:{solution_id}")
+    return progress, progress.nodes if progress is not None else 0
+
+
+def _served_offset(solution_id):
+    """Solutions already served to the paging cursor of ``solution_id``, or None."""
+    from .cursors import get_cursor_store
+    try:
+        return int(get_cursor_store().get(solution_id).state_data.get('cursor', 0))
+    except Exception:
+        return None
+
+
+def capture_solves(view):
+    """Record a ``KANOODLE_CAPTURE_RATE`` sample of a board solve view's requests.
+
+    Each record holds the request body, the board size and mask, the
+    catalogue digest (its pieces are saved once alongside the log), the
+    wall time, the search nodes the request added, the response's counters
+    and cache outcome, and for ``next`` the cursor offset the page started
+    at, for ``manage.py replay_captures``. Off
+    unless both ``KANOODLE_CAPTURE_RATE`` and ``KANOODLE_CAPTURE_DIR`` are
+    set; works on sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def _async_view(request, solution_id, *args, **kwargs):
+            if request.method != 'POST' or not _sampled():
+                return await view(request, solution_id, *args, **kwargs)
+            offset = await sync_to_async(_served_offset)(solution_id)
+            started, before = time.time(), _nodes_before(solution_id)
+            response = await view(request, solution_id, *args, **kwargs)
+            elapsed_ms = (time.time() - started) * 1000
+            await sync_to_async(_record)(request, solution_id, started, elapsed_ms, before, offset, response)
+            return response
+        return _async_view
+
+    @functools.wraps(view)
+    def _view(request, solution_id, *args, **kwargs):
+        if request.method != 'POST' or not _sampled():
+            return view(request, solution_id, *args, **kwargs)
+        offset = _served_offset(solution_id)
+        started, before = time.time(), _nodes_before(solution_id)
+        response = view(request, solution_id, *args, **kwargs)
+        _record(request, solution_id, started, (time.time() - started) * 1000, before, offset, response)
+        return response
+    return _view
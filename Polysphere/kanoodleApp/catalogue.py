@@ -0,0 +1,68 @@
+import threading
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Piece
+from .util import generate_orientations, hash_pieces
+
+
+class CatalogueSnapshot:
+    """Immutable view of the piece table as the solver consumes it.
+
+    ``digest`` is the ``hash_pieces`` value used in cache keys and doubles as
+    the HTTP ETag; ``orientations`` maps piece id to its distinct orientations
+    (taken from a warm-start snapshot when one registered them for this
+    digest).
+    """
+
+    def __init__(self, version, pieces):
+        self.version = version
+        self.pieces = pieces
+        self.digest = hash_pieces(pieces)
+        self.etag = f'"{self.digest}"'
+        self.orientations = _ORIENTATIONS.get(self.digest) or {
+            p['id']: list(generate_orientations([tuple(c) for c in p['shapeData']]))
+            for p in pieces
+        }
+
+
+# Orientations loaded from a warm-start snapshot, by catalogue digest.
+_ORIENTATIONS = {}
+
+def register_orientations(digest, orientations):
+    """Use ``orientations`` for any snapshot of the catalogue with ``digest`` instead of regenerating them."""
+    _ORIENTATIONS[digest] = orientations
+
+
+_SNAPSHOT = None
+_VERSION = 0
+_LOCK = threading.Lock()
+
+def get_catalogue():
+    """Return the current snapshot, rebuilding it from the database after an invalidation."""
+    global _SNAPSHOT
+    snapshot = _SNAPSHOT
+    if snapshot is not None:
+        return snapshot
+    with _LOCK:
+        if _SNAPSHOT is None:
+            version = _VERSION
+            pieces = [
+                {'id': p.pk, 'name': p.name, 'shapeData': p.shapeData, 'color': p.color}
+                for p in Piece.objects.order_by('pk')
+            ]
+            _SNAPSHOT = CatalogueSnapshot(version, pieces)
+        return _SNAPSHOT
+
+def invalidate_catalogue():
+    global _SNAPSHOT, _VERSION
+    with _LOCK:
+        _VERSION += 1
+        _SNAPSHOT = None
+
+
+@receiver(post_save, sender=Piece)
+@receiver(post_delete, sender=Piece)
+def _piece_changed(sender, **kwargs):
+    invalidate_catalogue()
@@ -0,0 +1,201 @@
+REGION_MODES = ('within', 'touches', 'avoids')
+EDGES = ('left', 'right', 'top', 'bottom')
+PAIR_TYPES = ('adjacent', 'apart')
+
+
+def neighbours(cells):
+    """Cells sharing an edge with ``cells`` but not in it."""
+    cells = frozenset(cells)
+    return frozenset((x + dx, y + dy) for x, y in cells
+                     for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))) - cells
+
+
+def _cell(value, width, height):
+    try:
+        x, y = (int(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Bad cell {value!r}; expected [x, y].")
+    if not (0 <= x < width and 0 <= y < height):
+        raise ValueError(f"Cell {[x, y]} is off the {width}x{height} board.")
+    return (x, y)
+
+
+def _region_ok(mode, cells, region):
+    if mode == 'within':
+        return cells <= region
+    if mode == 'touches':
+        return not cells.isdisjoint(region)
+    return cells.isdisjoint(region)
+
+
+class ConstraintSet:
+    """Compiled ``all_required_constraints`` for one board size.
+
+    Rules, as dicts in the request:
+
+    * ``{"type": "cell", "cell": [x, y], "pieces": [id, ...]}`` - the cell is
+      covered by one of ``pieces`` (``"piece": id`` for a single piece);
+    * ``{"type": "region", "piece": id, "cells": [[x, y], ...], "mode": m}`` -
+      the piece lies ``within`` the region, ``touches`` it or ``avoids`` it;
+    * ``{"type": "edge", "piece": id, "edge": "left"}`` - the piece covers a
+      cell on that board edge;
+    * ``{"type": "adjacent" | "apart", "pieces": [a, b]}`` - the two pieces
+      do / do not share an edge.
+
+    Piece ids must be integers, and one of ``piece_ids`` when that is
+    given. Cell, region and edge rules become row removals. A pair rule between
+    two unplaced pieces drops the placements with no compatible partner and
+    records the incompatible pairs as row conflicts, so choosing one piece's
+    placement hides the partner placements it rules out and the search
+    never branches into a violating combination. Rules on pieces already on
+    the board are checked against it, or narrowed to row removals on the
+    other piece (see ``bind``).
+    """
+
+    def __init__(self, width, height, piece_ids=None):
+        self.width = width
+        self.height = height
+        self.piece_ids = frozenset(piece_ids) if piece_ids is not None else None
+        self.cell_rules = {}
+        self.piece_rules = []
+        self.pair_rules = []
+
+    def __bool__(self):
+        return bool(self.cell_rules or self.piece_rules or self.pair_rules)
+
+    def _piece(self, value):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"Bad piece id {value!r}; expected an integer.")
+        if self.piece_ids is not None and value not in self.piece_ids:
+            raise ValueError(f"Unknown piece id {value}.")
+        return value
+
+    def add(self, rule):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Bad constraint {rule!r}; expected an object.")
+        kind = rule.get('type')
+        if kind == 'cell':
+            pos = _cell(rule.get('cell'), self.width, self.height)
+            allowed = rule.get('pieces') if 'pieces' in rule else [rule.get('piece')]
+            if not isinstance(allowed, (list, tuple)):
+                raise ValueError(f"Bad pieces {allowed!r}; expected a list of piece ids.")
+            allowed = frozenset(self._piece(piece_id) for piece_id in allowed)
+            self.cell_rules[pos] = self.cell_rules.get(pos, allowed) & allowed
+        elif kind == 'region':
+            mode = rule.get('mode', 'within')
+            if mode not in REGION_MODES:
+                raise ValueError(f"Unknown region mode {mode!r}; expected one of {', '.join(REGION_MODES)}.")
+            region = frozenset(_cell(c, self.width, self.height) for c in rule.get('cells') or ())
+            self.piece_rules.append((self._piece(rule.get('piece')), mode, region))
+        elif kind == 'edge':
+            edge = rule.get('edge')
+            if edge not in EDGES:
+                raise ValueError(f"Unknown edge {edge!r}; expected one of {', '.join(EDGES)}.")
+            w, h = self.width, self.height
+            region = {
+                'left': {(0, y) for y in range(h)},
+                'right': {(w - 1, y) for y in range(h)},
+                'top': {(x, 0) for x in range(w)},
+                'bottom': {(x, h - 1) for x in range(w)},
+            }[edge]
+            self.piece_rules.append((self._piece(rule.get('piece')), 'touches', frozenset(region)))
+        elif kind in PAIR_TYPES:
+            pieces = rule.get('pieces')
+            if not isinstance(pieces, (list, tuple)) or len(pieces) != 2 or pieces[0] == pieces[1]:
+                raise ValueError(f"{kind!r} constraints need two different pieces.")
+            self.pair_rules.append((self._piece(pieces[0]), self._piece(pieces[1]), kind == 'adjacent'))
+        else:
+            raise ValueError(f"Unknown constraint type {kind!r}.")
+
+    def bind(self, board_state):
+        """Copy of the rules with those about pieces already on ``board_state`` folded into the rest.
+
+        ``board_state`` must be a full ``height`` x ``width`` grid (as
+        ``_build_matrix`` pads it). Returns ``(bound, error)``: ``error`` is a
+        message when the placed pieces break a rule, else None. A pair rule
+        with one placed piece becomes a region rule on the other piece: it
+        must touch (or avoid) the placed piece's neighbours. ``self`` is left
+        unchanged, so one set can be bound to many boards.
+        """
+        bound = ConstraintSet(self.width, self.height, self.piece_ids)
+        bound.cell_rules = dict(self.cell_rules)
+        bound.piece_rules = list(self.piece_rules)
+        fixed = {}
+        for y, row in enumerate(board_state):
+            for x, piece_id in enumerate(row):
+                if piece_id:
+                    fixed.setdefault(piece_id, set()).add((x, y))
+        for pos, allowed in self.cell_rules.items():
+            piece_id = board_state[pos[1]][pos[0]]
+            if piece_id and piece_id not in allowed:
+                return None, f"Constraint broken: cell {list(pos)} is covered by piece {piece_id}."
+        for piece_id, mode, region in self.piece_rules:
+            if piece_id in fixed and not _region_ok(mode, frozenset(fixed[piece_id]), region):
+                return None, f"Constraint broken: placed piece {piece_id} does not {mode.rstrip('s')} its region."
+        pairs = []
+        for a, b, touch in self.pair_rules:
+            if a in fixed and b in fixed:
+                if touch == neighbours(fixed[a]).isdisjoint(fixed[b]):
+                    return None, f"Constraint broken: placed pieces {a} and {b} {'do not touch' if touch else 'touch'}."
+            elif a in fixed or b in fixed:
+                placed, other = (a, b) if a in fixed else (b, a)
+                bound.piece_rules.append((other, 'touches' if touch else 'avoids', neighbours(fixed[placed])))
+            else:
+                pairs.append((a, b, touch))
+        bound.pair_rules = pairs
+        return bound, None
+
+    def allows(self, piece_id, positions):
+        """Row filter: whether one placement satisfies every single-piece rule."""
+        cells = frozenset(positions)
+        for pos in cells & self.cell_rules.keys():
+            if piece_id not in self.cell_rules[pos]:
+                return False
+        for rule_piece, mode, region in self.piece_rules:
+            if rule_piece == piece_id and not _region_ok(mode, cells, region):
+                return False
+        return True
+
+    def pair_conflicts(self, rows):
+        """Conflicting rows for each pair rule, for ``DancingLinks.add_conflicts``.
+
+        ``rows`` is a list of ``(placement_id, piece_id, positions)``.
+        Returns ``(rows, conflicts)``: ``rows`` without the placements that
+        no placement of the partner piece can satisfy, and a dict mapping
+        each paired placement id to the partner placements it rules out.
+        Overlapping placements are left out; covering already removes them.
+        """
+        conflicts = {}
+        dead = set()
+        for a, b, touch in self.pair_rules:
+            rows_a = [(row[0], frozenset(row[2])) for row in rows if row[1] == a]
+            rows_b = [(row[0], frozenset(row[2])) for row in rows if row[1] == b]
+            partners = {row_id: 0 for row_id, _ in rows_a + rows_b}
+            for id_a, cells_a in rows_a:
+                edge = neighbours(cells_a)
+                for id_b, cells_b in rows_b:
+                    if not cells_a.isdisjoint(cells_b):
+                        continue
+                    if touch == edge.isdisjoint(cells_b):
+                        conflicts.setdefault(id_a, []).append(id_b)
+                        conflicts.setdefault(id_b, []).append(id_a)
+                    else:
+                        partners[id_a] += 1
+                        partners[id_b] += 1
+            dead.update(row_id for row_id, n in partners.items() if not n)
+        rows = [row for row in rows if row[0] not in dead]
+        conflicts = {row_id: [other for other in others if other not in dead]
+                     for row_id, others in conflicts.items() if row_id not in dead}
+        return rows, conflicts
+
+
+def compile_constraints(rules, width, height, piece_ids=None):
+    """``ConstraintSet`` for a list of rule dicts; raises ValueError on a malformed rule or unknown piece."""
+    if isinstance(rules, ConstraintSet):
+        return rules
+    if rules is not None and not isinstance(rules, (list, tuple)):
+        raise ValueError("Constraints must be a list.")
+    constraints = ConstraintSet(width, height, piece_ids)
+    for rule in rules or ():
+        constraints.add(rule)
+    return constraints
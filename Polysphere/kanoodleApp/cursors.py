@@ -0,0 +1,174 @@
+import atexit
+import json
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+from django.db import transaction
+
+from .models import partialSolution
+from .util import _setting, get_redis_client
+
+
+class BoardDims:
+    def __init__(self, board):
+        self.pk = board.pk
+        self.name = board.name
+        self.width = board.width
+        self.height = board.height
+        self.mask = board.mask
+
+
+class CursorRecord:
+    """Stand-in for a ``partialSolution`` row on the paging hot path.
+
+    Exposes ``board`` and ``state_data`` like the model; ``save`` hands the
+    state to the ``CursorStore`` instead of writing to the database.
+    """
+
+    def __init__(self, store, solution_id, board, state_data):
+        self.store = store
+        self.pk = solution_id
+        self.board = board
+        self.state_data = state_data
+
+    def save(self, update_fields=None):
+        self.store.put(self.pk, self.state_data)
+
+
+class CursorStore:
+    """Write-behind cache of ``partialSolution.state_data``.
+
+    Paging cursors are read and written in memory (or in Redis when it is
+    reachable, so every worker sees the same cursor) and marked dirty; a
+    daemon thread flushes all dirty rows to SQLite in one transaction every
+    ``flush_interval_s`` seconds, and once more at interpreter exit. With an
+    interval of 0 nothing is flushed until ``flush`` is called.
+
+    At most ``max_entries`` records are cached, least recently used first
+    out; unflushed cursors stay in the dirty set until they are written.
+    One Redis client is kept for the store's lifetime; while Redis is
+    unreachable it is looked up again at most every ``REDIS_RETRY_S``.
+    """
+
+    REDIS_PREFIX = "kanoodle:cursor:"
+    REDIS_TTL = 24 * 3600
+    REDIS_RETRY_S = 30
+
+    def __init__(self, flush_interval_s=5, max_entries=10_000):
+        self.flush_interval_s = flush_interval_s
+        self.max_entries = max_entries
+        self._records = OrderedDict()
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        self._redis_client = None
+        self._redis_retry_at = 0
+
+    def _redis(self):
+        if self._redis_client is None and time.monotonic() >= self._redis_retry_at:
+            self._redis_client = get_redis_client()
+            if self._redis_client is None:
+                self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_S
+        return self._redis_client
+
+    def _remember(self, solution_id, board, state):
+        # Callers hold ``_lock``.
+        self._records[solution_id] = (board, state)
+        self._records.move_to_end(solution_id)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    def get(self, solution_id):
+        with self._lock:
+            board, state = self._records.get(solution_id, (None, None))
+            if board is not None:
+                self._records.move_to_end(solution_id)
+        if board is None:
+            record = partialSolution.objects.select_related('board').get(pk=solution_id)
+            board = BoardDims(record.board)
+            with self._lock:
+                state = self._dirty.get(solution_id)
+                if state is None:
+                    state = dict(record.state_data or {})
+                self._remember(solution_id, board, state)
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                raw = redis_client.get(self.REDIS_PREFIX + str(solution_id))
+                if raw:
+                    state = json.loads(raw)
+            except Exception:
+                pass
+        return CursorRecord(self, solution_id, board, dict(state))
+
+    def put(self, solution_id, state_data):
+        state = dict(state_data)
+        with self._lock:
+            board, _ = self._records.get(solution_id, (None, None))
+            if board is not None:
+                self._remember(solution_id, board, state)
+            self._dirty[solution_id] = state
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_client.set(self.REDIS_PREFIX + str(solution_id), json.dumps(state), ex=self.REDIS_TTL)
+            except Exception:
+                pass
+        self._ensure_flusher()
+
+    def flush(self):
+        """Write every dirty cursor to the database in one transaction; returns the row count."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        try:
+            with transaction.atomic():
+                for solution_id, state in dirty.items():
+                    partialSolution.objects.filter(pk=solution_id).update(state_data=state)
+        except Exception:
+            with self._lock:
+                for solution_id, state in dirty.items():
+                    self._dirty.setdefault(solution_id, state)
+            raise
+        return len(dirty)
+
+    def forget(self, solution_id):
+        with self._lock:
+            self._records.pop(solution_id, None)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or not self.flush_interval_s:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='kanoodle-cursor-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self._flush_quietly)
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            traceback.print_exc()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval_s):
+            self._flush_quietly()
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def get_cursor_store():
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = CursorStore(flush_interval_s=_setting('KANOODLE_CURSOR_FLUSH_INTERVAL', 5),
+                                     max_entries=_setting('KANOODLE_CURSOR_CACHE_MAX', 10_000))
+    return _STORE
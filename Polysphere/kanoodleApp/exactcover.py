@@ -0,0 +1,145 @@
+import time
+
+from .util import DancingLinks, DeadlineProgress, DeadlineReached, _deadline, _hash_json, _rank_memo
+
+
+def _names(values, what):
+    if not isinstance(values, (list, tuple)):
+        raise ValueError(f"{what} must be a list.")
+    names = [str(v) for v in values]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{what} contain duplicates.")
+    return names
+
+
+class ExactCoverSolver:
+    """Exact cover over a sparse matrix given as data, with ``KanoodleSolver``'s solving interface.
+
+    ``rows`` maps row ids to the names of the columns they cover; primary
+    ``columns`` must be covered exactly once and ``secondary`` columns at
+    most once (see ``DancingLinks``). N-Queens, for instance, is ranks and
+    files as primary columns and diagonals as secondary ones.
+
+    The counterpart of a partial board is the list of row ids already
+    chosen, so ``SolverSession``, shared streams, resume tokens and the
+    subtree-count memos work on these problems unchanged.
+    """
+
+    def __init__(self, columns, rows, secondary=()):
+        self.columns = _names(columns, "Columns")
+        self.secondary = _names(secondary, "Secondary columns")
+        known = set(self.columns)
+        if not known.isdisjoint(self.secondary):
+            raise ValueError("A column cannot be both primary and secondary.")
+        known.update(self.secondary)
+        if not isinstance(rows, dict):
+            raise ValueError("Rows must be an object mapping row ids to column lists.")
+        self.rows = {}
+        for row_id, cols in rows.items():
+            cols = _names(cols, f"Columns of row {row_id!r}")
+            unknown = [c for c in cols if c not in known]
+            if not cols or unknown:
+                raise ValueError(f"Row {row_id!r} covers {'unknown columns ' + ', '.join(unknown) if unknown else 'no columns'}.")
+            self.rows[str(row_id)] = tuple(cols)
+        self._digest = None
+
+    def problem_digest(self):
+        if self._digest is None:
+            self._digest = _hash_json({'c': self.columns, 's': self.secondary, 'r': self.rows})
+        return self._digest
+
+    def fingerprint(self, selected):
+        return _hash_json({'p': self.problem_digest(), 's': sorted(self.copy_state(selected))})[:16]
+
+    def copy_state(self, selected):
+        return [str(row_id) for row_id in selected or ()]
+
+    def render_solution(self, selected, rows, placement_info):
+        return {'rows': list(selected) + list(rows)}
+
+    def _build_matrix(self, selected):
+        """``(selected, dlx, placement_info, error)`` like ``KanoodleSolver._build_matrix``.
+
+        The columns of ``selected`` rows are left out of the matrix along
+        with every row touching them.
+        """
+        selected = self.copy_state(selected)
+        taken = set()
+        for row_id in selected:
+            cols = self.rows.get(row_id)
+            if cols is None:
+                return selected, None, None, f"Unknown selected row {row_id!r}."
+            if not taken.isdisjoint(cols):
+                return selected, None, None, "Unsolvable: Selected rows overlap."
+            taken.update(cols)
+        dlx = DancingLinks([c for c in self.columns if c not in taken],
+                           [c for c in self.secondary if c not in taken])
+        placement_info = {}
+        for row_id, cols in self.rows.items():
+            if taken.isdisjoint(cols):
+                dlx.add_row(row_id, cols)
+                placement_info[row_id] = (row_id, cols)
+        return selected, dlx, placement_info, None
+
+    def build_incremental_session(self, selected, start_path=None, progress=None):
+        selected, dlx, placement_info, error = self._build_matrix(selected)
+        if error:
+            return None, None, {'unsolvable': True, 'message': error}
+        gen = dlx.search_generator(start_path=start_path, with_path=True, progress=progress)
+        return gen, placement_info, {'unsolvable': False}
+
+    def solvePartial(self, selected, max_samples=100, max_time=None, progress=None):
+        """Up to ``max_samples`` solutions, each ``{'rows': [...]}`` including ``selected``.
+
+        Same result keys as ``KanoodleSolver.solvePartial``; ``max_time``
+        (ms) bounds the search itself, not just the gaps between solutions.
+        """
+        max_samples = max_samples or 100
+        selected, dlx, placement_info, error = self._build_matrix(selected)
+        if error:
+            return {'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'timedOut': False,
+                    'limitReached': False, 'message': error}
+        deadline = _deadline(max_time)
+        if progress is None and deadline is not None:
+            progress = DeadlineProgress(deadline)
+        solutions = []
+        timed_out = False
+        try:
+            for rows in dlx.search_generator(progress=progress):
+                solutions.append(self.render_solution(selected, rows, placement_info))
+                if len(solutions) >= max_samples:
+                    break
+                if deadline is not None and time.time() >= deadline:
+                    timed_out = True
+                    break
+        except DeadlineReached:
+            timed_out = True
+        limit_reached = len(solutions) >= max_samples
+        if not solutions:
+            message = "Time limit reached before a solution was found." if timed_out else "No solutions found."
+        elif timed_out:
+            message = f"Found {len(solutions)} solution(s) before time limit."
+        elif limit_reached:
+            message = f"Found {len(solutions)} solution(s) (sample limit reached)."
+        else:
+            message = f"Found all {len(solutions)} solution(s)."
+        return {
+            'solutions': solutions,
+            'solutionCount': len(solutions),
+            'solutionsReturned': len(solutions),
+            'timedOut': timed_out,
+            'limitReached': limit_reached,
+            'message': message,
+        }
+
+    def count(self, selected, max_time=None):
+        """Exact number of solutions, via the memoised subtree counts shared with the board solver.
+
+        Raises ``DeadlineReached`` after ``max_time`` ms; counts finished so
+        far are kept for the next call. Raises ValueError when ``selected``
+        names an unknown row or overlapping rows.
+        """
+        selected, dlx, _, error = self._build_matrix(selected)
+        if error:
+            raise ValueError(error)
+        return dlx.count_subtree(_rank_memo(self.fingerprint(selected)), _deadline(max_time))
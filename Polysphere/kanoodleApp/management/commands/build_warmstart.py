@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from kanoodleApp.catalogue import get_catalogue
+from kanoodleApp.models import KanoodleBoard
+from kanoodleApp.warmstart import write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Build the warm-start snapshot of solver placement tables for every board size."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help="Snapshot path (defaults to settings.KANOODLE_WARMSTART_PATH).")
+
+    def handle(self, *args, **options):
+        path = options['output'] or getattr(settings, 'KANOODLE_WARMSTART_PATH', None)
+        if not path:
+            self.stderr.write("No output path given and KANOODLE_WARMSTART_PATH is not set.")
+            return
+        sizes = set(KanoodleBoard.objects.values_list('width', 'height'))
+        catalogue = get_catalogue()
+        count = write_snapshot(path, sizes, catalogue)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} placement table(s) for catalogue {catalogue.digest[:12]} to {path}"))
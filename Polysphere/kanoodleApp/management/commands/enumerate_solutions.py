@@ -0,0 +1,141 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kanoodleApp.catalogue import get_catalogue
+from kanoodleApp.models import KanoodleBoard
+from kanoodleApp.util import COMPACT_MAX_PIECE_ID, KanoodleSolver, board_to_string, next_start_path
+
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _run_shard(job):
+    """Process-pool worker: enumerate one subtree, appending boards to ``<name>.txt``.
+
+    Progress is checkpointed to ``<name>.json`` every ``every`` solutions with
+    the output byte offset and the branch path to resume from; a restarted
+    shard truncates its output back to the last checkpoint and continues.
+    """
+    width, height, board_state, pieces, pieces_hash, orientations, prefix, out_dir, name, every = job[:10]
+    mask = job[10] if len(job) > 10 else None
+    out_path = os.path.join(out_dir, f"{name}.txt")
+    ckpt_path = os.path.join(out_dir, f"{name}.json")
+    ckpt = {'prefix': prefix, 'count': 0, 'offset': 0, 'next_path': prefix, 'done': False}
+    if os.path.exists(ckpt_path):
+        with open(ckpt_path) as f:
+            ckpt = json.load(f)
+    if ckpt['done']:
+        return name, ckpt['count']
+
+    solver = KanoodleSolver(width, height, pieces, pieces_hash=pieces_hash, orientations=orientations, mask=mask)
+    with open(out_path, 'a+b') as out:
+        out.truncate(ckpt['offset'])
+        out.seek(ckpt['offset'])
+        since = 0
+        for board, path in solver.iter_solutions(board_state, start_path=ckpt['next_path'], pinned=len(prefix)):
+            out.write(board_to_string(board).encode('ascii') + b'\n')
+            ckpt['count'] += 1
+            since += 1
+            if since >= every and len(path) > len(prefix):
+                out.flush()
+                os.fsync(out.fileno())
+                ckpt['offset'] = out.tell()
+                ckpt['next_path'] = next_start_path(path)
+                _write_json(ckpt_path, ckpt)
+                since = 0
+        out.flush()
+        os.fsync(out.fileno())
+        ckpt['offset'] = out.tell()
+    ckpt['done'] = True
+    _write_json(ckpt_path, ckpt)
+    return name, ckpt['count']
+
+
+class Command(BaseCommand):
+    help = ("Enumerate every solution of a board offline, split into shards by the first "
+            "placement choices and run on a process pool. Re-running resumes from checkpoints.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('out_dir', help="Directory for shard files, checkpoints and summary.json.")
+        parser.add_argument('--board-id', type=int, help="KanoodleBoard to use (defaults to the first).")
+        parser.add_argument('--board-file', help="JSON file with a partial board state to enumerate.")
+        parser.add_argument('--pieces-file', help="JSON list of {id, name, shapeData} to use instead of the database.")
+        parser.add_argument('--shard-depth', type=int, default=1, help="Number of leading choices to split on.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--checkpoint-every', type=int, default=5000)
+        parser.add_argument('--merge', help="Also concatenate all shards, in search order, into this file.")
+
+    def handle(self, *args, **options):
+        board = (KanoodleBoard.objects.get(pk=options['board_id']) if options['board_id']
+                 else KanoodleBoard.objects.first())
+        if board is None:
+            raise CommandError("No KanoodleBoard found.")
+        board_state = None
+        if options['board_file']:
+            with open(options['board_file']) as f:
+                board_state = json.load(f)
+
+        if options['pieces_file']:
+            with open(options['pieces_file']) as f:
+                pieces = json.load(f)
+            pieces_hash, orientations = None, None
+        else:
+            catalogue = get_catalogue()
+            pieces, pieces_hash, orientations = catalogue.pieces, catalogue.digest, catalogue.orientations
+        too_large = [p['id'] for p in pieces if int(p['id']) > COMPACT_MAX_PIECE_ID]
+        if too_large:
+            raise CommandError(f"Shard files store one character per cell, so piece ids must be 1-{COMPACT_MAX_PIECE_ID}; "
+                               f"got {', '.join(map(str, too_large))}. Renumber them with --pieces-file.")
+
+        out_dir = options['out_dir']
+        os.makedirs(out_dir, exist_ok=True)
+        solver = KanoodleSolver(board.width, board.height, pieces, pieces_hash=pieces_hash, orientations=orientations,
+                                mask=board.mask)
+        prefixes = solver.shard_prefixes(board_state, depth=options['shard_depth'])
+        names = [f"shard_{'_'.join(str(i) for i in prefix) or 'root'}" for prefix in prefixes]
+        self.stdout.write(f"{len(prefixes)} shard(s) at depth {options['shard_depth']} -> {out_dir}")
+
+        counts = {}
+        jobs = [
+            (board.width, board.height, board_state, pieces, pieces_hash, orientations,
+             prefix, out_dir, name, options['checkpoint_every'], board.mask)
+            for prefix, name in zip(prefixes, names)
+        ]
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_run_shard, job) for job in jobs]
+            for finished, future in enumerate(as_completed(futures), start=1):
+                name, count = future.result()
+                counts[name] = count
+                self.stdout.write(f"[{finished}/{len(jobs)}] {name}: {count} solution(s)")
+
+        total = sum(counts.values())
+        _write_json(os.path.join(out_dir, 'summary.json'), {
+            'width': board.width,
+            'height': board.height,
+            'board': board_state,
+            'pieces_hash': solver.pieces_digest(),
+            'shard_depth': options['shard_depth'],
+            'shards': [{'name': name, 'prefix': prefix, 'count': counts[name]}
+                       for prefix, name in zip(prefixes, names)],
+            'total': total,
+        })
+
+        if options['merge']:
+            merged = 0
+            with open(options['merge'], 'wb') as out:
+                for name in names:
+                    with open(os.path.join(out_dir, f"{name}.txt"), 'rb') as shard:
+                        for line in shard:
+                            out.write(line)
+                            merged += 1
+            if merged != total:
+                raise CommandError(f"Merged {merged} lines but checkpoints report {total} solutions.")
+
+        self.stdout.write(self.style.SUCCESS(f"Total solutions: {total}"))
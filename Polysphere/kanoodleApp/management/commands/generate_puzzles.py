@@ -0,0 +1,57 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kanoodleApp.catalogue import get_catalogue
+from kanoodleApp.models import KanoodleBoard
+from kanoodleApp.puzzles import generate_puzzles
+from kanoodleApp.util import KanoodleSolver
+from kanoodleApp.warmstart import get_placement_table
+
+
+class Command(BaseCommand):
+    help = ("Generate puzzles with exactly one solution by removing pieces from random full "
+            "solutions, checking uniqueness on a shared DLX matrix.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('out', help="JSON file to write the puzzles to.")
+        parser.add_argument('--count', type=int, default=10)
+        parser.add_argument('--pieces', type=int, default=6, help="Pieces left for the player to place (difficulty).")
+        parser.add_argument('--board-id', type=int, help="KanoodleBoard to use (defaults to the first).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--seed', type=int, help="Base seed; puzzle i uses seed + i.")
+        parser.add_argument('--max-attempts', type=int, default=50,
+                            help="Random solutions to try per puzzle before giving up.")
+
+    def handle(self, *args, **options):
+        board = (KanoodleBoard.objects.get(pk=options['board_id']) if options['board_id']
+                 else KanoodleBoard.objects.first())
+        if board is None:
+            raise CommandError("No KanoodleBoard found.")
+        catalogue = get_catalogue()
+        solver = KanoodleSolver(board.width, board.height, catalogue.pieces,
+                                pieces_hash=catalogue.digest, orientations=catalogue.orientations,
+                                placement_table=get_placement_table(board.width, board.height, catalogue, board.mask),
+                                mask=board.mask)
+
+        started = time.time()
+        puzzles = generate_puzzles(solver, options['count'], options['pieces'], workers=options['workers'],
+                                   seed=options['seed'], max_attempts=options['max_attempts'])
+        elapsed = time.time() - started
+        found = [p for p in puzzles if p is not None]
+
+        tmp_path = f"{options['out']}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'width': board.width, 'height': board.height, 'pieces_hash': catalogue.digest,
+                       'puzzles': found}, f)
+        os.replace(tmp_path, options['out'])
+
+        rate = len(found) * 60 / elapsed if elapsed else float(len(found))
+        if len(found) < options['count']:
+            self.stdout.write(self.style.WARNING(
+                f"{options['count'] - len(found)} candidate(s) could not be made unique with "
+                f"{options['pieces']} piece(s) to place."))
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(found)} puzzle(s) in {elapsed:.1f}s ({rate:.0f}/min) -> {options['out']}"))
@@ -0,0 +1,150 @@
+import glob
+import json
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from kanoodleApp.capture import capture_dir, load_catalogue, read_records
+from kanoodleApp.catalogue import get_catalogue
+from kanoodleApp.util import get_progress
+from kanoodleApp.views import _one_shot_job
+
+
+def _default_paths():
+    directory = capture_dir()
+    if not directory:
+        return []
+    base = os.path.join(directory, 'requests.jsonl')
+    # Rotated files are requests.jsonl.1 (newest) to .N (oldest); replay oldest first.
+    rotated = [p for p in glob.glob(base + '.*') if p.rsplit('.', 1)[1].isdigit()]
+    rotated.sort(key=lambda p: int(p.rsplit('.', 1)[1]), reverse=True)
+    return rotated + ([base] if os.path.exists(base) else [])
+
+
+def _dash(value):
+    return '-' if value is None else value
+
+
+def replay(record, engine, pieces, max_time=None, progress_key='replay'):
+    """Re-run one captured request on ``engine``; returns ``(elapsed_ms, result, nodes)``.
+
+    Paging requests go through ``solveIncremental``, so a capture served
+    from the cache or a live session is replayed as the search that would
+    have produced it. A ``next`` resumes from the request's resume token
+    or, as the web client sends none, from the cursor offset recorded at
+    capture time.
+    """
+    data = record['request']
+    action = record['action']
+    board = data.get('partialBoard') or data.get('partial_board')
+    if max_time is None:
+        max_time = data.get('maxTime') or data.get('max_time')
+    solver = engine(record['width'], record['height'], pieces, pieces_hash=record['catalogue'], mask=record.get('mask'))
+    started = time.perf_counter()
+    if action in ('init', 'next'):
+        token = (data.get('resumeToken') or data.get('resume_token')) if action == 'next' else None
+        skip = (record.get('offset') or 0) if action == 'next' and not token else 0
+        result = solver.solveIncremental(board, data.get('batchSize', 24), max_time, skip_count=skip,
+                                         resume_token=token)
+    else:
+        fn, args = _one_shot_job(action, data, solver, board, max_time, progress_key)
+        result = fn(*args)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    progress = get_progress(progress_key) if action == 'solve' else None
+    return elapsed_ms, result, progress.nodes if progress is not None else None
+
+
+class Command(BaseCommand):
+    help = ("Re-run captured solve requests (see KANOODLE_CAPTURE_RATE) offline against a solver engine "
+            "and report how their timings differ from the capture.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help="Capture files (defaults to every requests.jsonl* in KANOODLE_CAPTURE_DIR).")
+        parser.add_argument('--engine', default='kanoodleApp.util.KanoodleSolver',
+                            help="Dotted path of a solver class with KanoodleSolver's constructor.")
+        parser.add_argument('--catalogue-dir', help="Directory of catalogue-<digest>.json files "
+                                                    "(defaults to the first capture file's directory).")
+        parser.add_argument('--action', action='append', help="Only replay these actions (repeatable).")
+        parser.add_argument('--limit', type=int, default=0, help="Replay at most N records (0 = all).")
+        parser.add_argument('--repeat', type=int, default=1, help="Run each request N times and keep the fastest.")
+        parser.add_argument('--max-time', type=int, default=None,
+                            help="Override every request's time limit in ms (0 = none).")
+        parser.add_argument('--json', action='store_true', help="Print one JSON object per record instead of a table.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or _default_paths()
+        if not paths:
+            raise CommandError("No capture files given and none found in KANOODLE_CAPTURE_DIR.")
+        try:
+            engine = import_string(options['engine'])
+        except ImportError as exc:
+            raise CommandError(f"Cannot import engine {options['engine']!r}: {exc}")
+        catalogue_dir = options['catalogue_dir'] or os.path.dirname(os.path.abspath(paths[0]))
+        current = get_catalogue()
+        catalogues = {}
+
+        rows = []
+        skipped = 0
+        for record in read_records(paths):
+            if options['action'] and record.get('action') not in options['action']:
+                continue
+            if options['limit'] and len(rows) >= options['limit']:
+                break
+            digest = record.get('catalogue')
+            if digest not in catalogues:
+                catalogues[digest] = load_catalogue(catalogue_dir, digest) or (
+                    current.pieces if digest == current.digest else None)
+            if catalogues[digest] is None:
+                skipped += 1
+                continue
+            try:
+                runs = [replay(record, engine, catalogues[digest], options['max_time'], f"replay:{len(rows)}")
+                        for _ in range(max(1, options['repeat']))]
+            except Exception as exc:
+                rows.append({'record': record, 'error': f"{type(exc).__name__}: {exc}"})
+                continue
+            elapsed_ms, result, nodes = min(runs, key=lambda run: run[0])
+            rows.append({'record': record, 'replayMs': elapsed_ms, 'nodes': nodes, 'result': result})
+
+        for i, row in enumerate(rows):
+            self._report(i, row, options['json'])
+        self._summary(rows, skipped)
+
+    def _report(self, i, row, as_json):
+        record = row['record']
+        result = row.get('result') or {}
+        if as_json:
+            self.stdout.write(json.dumps({
+                'index': i, 'ts': record.get('ts'), 'action': record.get('action'),
+                'capturedMs': record.get('elapsedMs'), 'replayMs': row.get('replayMs'),
+                'capturedNodes': record.get('nodes'), 'replayNodes': row.get('nodes'),
+                'capturedCount': record.get('solutionCount'), 'replayCount': result.get('solutionCount'),
+                'cache': record.get('cache'), 'error': row.get('error'),
+            }, separators=(',', ':')))
+            return
+        if 'error' in row:
+            self.stdout.write(f"#{i:<4} {record.get('action', '?'):<9} {self.style.ERROR(row['error'])}")
+            return
+        captured = record.get('elapsedMs')
+        ratio = f"x{row['replayMs'] / captured:.2f}" if captured else '-'
+        self.stdout.write(
+            f"#{i:<4} {record['action']:<9} {record['width']}x{record['height']:<4} "
+            f"captured {_dash(captured):>9} ms  replay {row['replayMs']:9.1f} ms  {ratio:>7}  "
+            f"solutions {_dash(record.get('solutionCount'))}/{_dash(result.get('solutionCount'))}  "
+            f"nodes {_dash(record.get('nodes'))}/{_dash(row['nodes'])}  "
+            f"cache {_dash(record.get('cache'))}")
+
+    def _summary(self, rows, skipped):
+        timed = [row for row in rows if 'error' not in row and row['record'].get('elapsedMs')]
+        errors = sum(1 for row in rows if 'error' in row)
+        line = f"Replayed {len(rows) - errors} request(s), {errors} failed, {skipped} skipped (catalogue not found)."
+        if timed:
+            ratios = [row['replayMs'] / row['record']['elapsedMs'] for row in timed]
+            slowest = max(timed, key=lambda row: row['replayMs'] - row['record']['elapsedMs'])
+            line += (f" Median replay/captured time x{statistics.median(ratios):.2f}; largest slowdown "
+                     f"{slowest['replayMs'] - slowest['record']['elapsedMs']:+.1f} ms ({slowest['record']['action']}).")
+        self.stdout.write(self.style.SUCCESS(line))
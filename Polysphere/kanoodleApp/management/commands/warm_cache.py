@@ -0,0 +1,114 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kanoodleApp.catalogue import get_catalogue
+from kanoodleApp.models import KanoodleBoard, partialSolution
+from kanoodleApp.util import (
+    SOLUTION_CACHE_TTL,
+    KanoodleSolver,
+    SolverSession,
+    append_cached_solutions,
+    get_redis_client,
+    make_cache_keys,
+)
+
+
+def _solve_opening(job):
+    """Process-pool worker: enumerate up to ``limit`` solutions of one opening."""
+    width, height, board_state, pieces, pieces_hash, orientations, limit, max_time = job[:8]
+    mask = job[8] if len(job) > 8 else None
+    solver = KanoodleSolver(width, height, pieces, pieces_hash=pieces_hash, orientations=orientations, mask=mask)
+    try:
+        session = SolverSession(solver, board_state)
+    except ValueError:
+        return [], 0, True
+    batch, total, exhausted, _ = session.next_batch(batch_size=limit, max_time=max_time)
+    return [sol['board'] for sol in batch], total, exhausted
+
+
+class Command(BaseCommand):
+    help = ("Pre-solve popular openings into the Redis solution cache, in the same key format "
+            "the solve endpoint reads. Safe to re-run: finished openings are checkpointed, and "
+            "re-warmed once their cache entries have expired.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--boards', help="JSON file with a list of board states (2D lists).")
+        parser.add_argument('--from-records', type=int, default=50,
+                            help="Without --boards, use boards from the N most recent partialSolution records.")
+        parser.add_argument('--board-id', type=int, help="KanoodleBoard whose size --boards entries use.")
+        parser.add_argument('--limit', type=int, default=1000, help="Solutions to cache per opening.")
+        parser.add_argument('--max-time', type=int, default=0, help="Per-opening time limit in ms (0 = none).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--checkpoint', help="JSON file recording finished openings, for resuming; "
+                                                 "openings whose cache entries expired are warmed again.")
+        parser.add_argument('--ttl', type=int, default=SOLUTION_CACHE_TTL, help="Cache TTL in seconds.")
+
+    def _openings(self, options):
+        if options['boards']:
+            board = (KanoodleBoard.objects.get(pk=options['board_id']) if options['board_id']
+                     else KanoodleBoard.objects.first())
+            if board is None:
+                raise CommandError("No KanoodleBoard to take the board size from.")
+            with open(options['boards']) as f:
+                states = json.load(f)
+            return [(board.width, board.height, board.mask, state) for state in states]
+        records = partialSolution.objects.select_related('board').order_by('-pk')[:options['from_records']]
+        return [
+            (r.board.width, r.board.height, r.board.mask, r.state_data.get('board'))
+            for r in records if isinstance(r.state_data, dict) and 'board' in r.state_data
+        ]
+
+    def handle(self, *args, **options):
+        redis_client = get_redis_client()
+        if redis_client is None:
+            raise CommandError("Redis is not reachable; nothing to warm.")
+
+        catalogue = get_catalogue()
+        checkpoint_path = options['checkpoint']
+        done = set()
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                done = set(json.load(f).get('done', []))
+
+        jobs = {}
+        warm = 0
+        for width, height, mask, state in self._openings(options):
+            base_key, meta_key = make_cache_keys(width, height, state, catalogue.pieces, pieces_hash=catalogue.digest,
+                                                 mask=mask)
+            if base_key in jobs:
+                continue
+            if base_key in done:
+                # Checkpointed entries still expire after the TTL; only skip those still cached.
+                if redis_client.exists(meta_key):
+                    warm += 1
+                    continue
+                done.discard(base_key)
+            jobs[base_key] = (meta_key, (width, height, state, catalogue.pieces, catalogue.digest,
+                                         catalogue.orientations, options['limit'], options['max_time'], mask))
+
+        total_jobs = len(jobs)
+        self.stdout.write(f"Warming {total_jobs} opening(s) ({warm} checkpointed and still cached) "
+                          f"with {options['workers']} worker(s)")
+        if not jobs:
+            return
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(_solve_opening, job): key for key, (_, job) in jobs.items()}
+            for finished, future in enumerate(as_completed(futures), start=1):
+                base_key = futures[future]
+                boards, total, exhausted = future.result()
+                append_cached_solutions(redis_client, base_key, jobs[base_key][0], boards, total, exhausted,
+                                        replace=True, ttl=options['ttl'])
+                done.add(base_key)
+                if checkpoint_path:
+                    tmp_path = f"{checkpoint_path}.tmp"
+                    with open(tmp_path, 'w') as f:
+                        json.dump({'done': sorted(done)}, f)
+                    os.replace(tmp_path, checkpoint_path)
+                self.stdout.write(f"[{finished}/{total_jobs}] {base_key} +{len(boards)} "
+                                  f"{'exhausted' if exhausted else 'partial'}")
+
+        self.stdout.write(self.style.SUCCESS(f"Warmed {total_jobs} opening(s)."))
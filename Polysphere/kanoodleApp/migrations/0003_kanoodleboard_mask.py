@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kanoodleApp', '0002_piece_color'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kanoodleboard',
+            name='mask',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
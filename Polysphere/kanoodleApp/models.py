@@ -4,6 +4,9 @@ class KanoodleBoard(models.Model):
     name = models.CharField(max_length=100)
     width = models.IntegerField(default=5)
     height = models.IntegerField(default=11)
+    # Playable cells for irregular boards: one string per row, '#' playable and
+    # anything else a hole (or rows of 0/1). Null means the full rectangle.
+    mask = models.JSONField(null=True, blank=True)
 
     def __str__(self):
         return str(self.name)
@@ -0,0 +1,202 @@
+import threading
+import time
+
+from .pool import get_process_pool
+from .util import DeadlineReached, get_redis_client
+
+# Subtrees with more rows left than this check the deadline; smaller ones
+# finish in well under a millisecond and run unchecked.
+_CHECK_ROWS = 10
+
+# Finished shard counts per board size, ``{n: {prefix: count}}``. A timed-out
+# count keeps the shards it finished, so the next request for the same
+# ``n`` only searches the rest.
+_SHARDS = {}
+_LOCK = threading.Lock()
+
+
+def _redis_key(n):
+    return f"nqueens:shards:{n}"
+
+
+def _count(full, rows, cols, ld, rd):
+    """Completions of a board with ``rows`` rows left, given the attacked columns and diagonals."""
+    avail = full & ~(cols | ld | rd)
+    if rows == 1:
+        return bin(avail).count('1')
+    total = 0
+    while avail:
+        bit = avail & -avail
+        avail ^= bit
+        total += _count(full, rows - 1, cols | bit, ((ld | bit) << 1) & full, (rd | bit) >> 1)
+    return total
+
+
+def _count_timed(full, rows, cols, ld, rd, deadline):
+    if rows <= _CHECK_ROWS:
+        return _count(full, rows, cols, ld, rd)
+    if time.time() >= deadline:
+        raise DeadlineReached()
+    avail = full & ~(cols | ld | rd)
+    total = 0
+    while avail:
+        bit = avail & -avail
+        avail ^= bit
+        total += _count_timed(full, rows - 1, cols | bit, ((ld | bit) << 1) & full, (rd | bit) >> 1, deadline)
+    return total
+
+
+def _place(n, prefix):
+    """``(cols, ld, rd)`` after queens in columns ``prefix`` of the first rows, or None if two attack."""
+    full = (1 << n) - 1
+    cols = ld = rd = 0
+    for c in prefix:
+        bit = 1 << c
+        if bit & (cols | ld | rd):
+            return None
+        cols, ld, rd = cols | bit, ((ld | bit) << 1) & full, (rd | bit) >> 1
+    return cols, ld, rd
+
+
+def shard_prefixes(n):
+    """Prefixes of the first two rows to count, with their mirror-symmetry weights.
+
+    A solution's left-right mirror is another solution, so only first-row
+    columns in the left half are searched and counted twice. With an odd
+    ``n`` the middle column is its own mirror; there the second-row queen
+    is left of centre in exactly one of each mirror pair, so that half is
+    counted twice instead. Boards below 4 are too small to split.
+    """
+    if n < 4:
+        return [((), 1)]
+    prefixes = [((c1, c2), 2) for c1 in range(n // 2) for c2 in range(n) if abs(c1 - c2) > 1]
+    if n % 2:
+        mid = n // 2
+        prefixes += [((mid, c2), 2) for c2 in range(mid - 1)]
+    return prefixes
+
+
+def count_prefix(n, prefix, deadline=None):
+    """Solutions of the ``n``-queens board whose first rows hold queens in columns ``prefix``."""
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineReached()
+    state = _place(n, prefix)
+    if state is None:
+        return 0
+    rows = n - len(prefix)
+    if rows == 0:
+        return 1
+    full = (1 << n) - 1
+    if deadline is None:
+        return _count(full, rows, *state)
+    return _count_timed(full, rows, *state, deadline)
+
+
+def _count_job(job):
+    n, prefix, deadline = job
+    try:
+        return prefix, count_prefix(n, prefix, deadline)
+    except DeadlineReached:
+        return prefix, None
+
+
+def _count_chunk(jobs):
+    counts = []
+    for job in jobs:
+        prefix, count = _count_job(job)
+        if count is None:
+            break
+        counts.append((prefix, count))
+    return counts
+
+
+def _load_shards(n, redis_client):
+    with _LOCK:
+        done = dict(_SHARDS.get(n, {}))
+    if redis_client is not None:
+        try:
+            stored = redis_client.hgetall(_redis_key(n))
+        except Exception:
+            stored = {}
+        for field, value in stored.items():
+            done.setdefault(tuple(int(c) for c in field.split(',') if c), int(value))
+    return done
+
+
+def _store_shards(n, counts, redis_client):
+    with _LOCK:
+        _SHARDS.setdefault(n, {}).update(counts)
+    if redis_client is not None and counts:
+        try:
+            redis_client.hset(_redis_key(n), mapping={','.join(map(str, p)): c for p, c in counts.items()})
+        except Exception:
+            pass
+
+
+def count_solutions(n, max_time=None, workers=1):
+    """Number of ways to place ``n`` non-attacking queens on an ``n`` x ``n`` board.
+
+    The search is split into the two-row prefixes of ``shard_prefixes``
+    and, with ``workers`` > 1, counted on slots of the shared process pool. Finished shards
+    are kept per process and in Redis when it is reachable, so a count
+    that runs out of ``max_time`` (milliseconds) picks up where it stopped
+    on the next call. Returns ``{'n', 'count', 'timedOut', 'shardsDone',
+    'shards', 'message'}``; ``count`` is None until every shard is done.
+    """
+    deadline = time.time() + max_time / 1000 if max_time else None
+    prefixes = shard_prefixes(n)
+    redis_client = get_redis_client()
+    done = _load_shards(n, redis_client)
+    todo = [(n, prefix, deadline) for prefix, _ in prefixes if prefix not in done]
+    fresh = {}
+    if todo:
+        pool = get_process_pool()
+        with pool.reserve(min(workers, len(todo))) as granted:
+            if granted:
+                for counts in pool.map(_count_chunk, [todo[i::granted] for i in range(granted)]):
+                    fresh.update(counts)
+            else:
+                fresh.update(_count_chunk(todo))
+        _store_shards(n, fresh, redis_client)
+        done.update(fresh)
+
+    finished = sum(1 for prefix, _ in prefixes if prefix in done)
+    result = {'n': n, 'count': None, 'timedOut': finished < len(prefixes),
+              'shardsDone': finished, 'shards': len(prefixes)}
+    if result['timedOut']:
+        result['message'] = f"Time limit reached after {finished} of {len(prefixes)} shard(s); ask again to continue."
+    else:
+        result['count'] = sum(weight * done[prefix] for prefix, weight in prefixes)
+        result['message'] = f"{result['count']} solution(s)."
+    return result
+
+
+def iter_solutions(n, after=None):
+    """Yield each solution as a tuple of queen columns (0-based, row by row), in lexicographic order.
+
+    With ``after`` (a column tuple, typically the last solution of the
+    previous page) the walk resumes with the first solution that sorts
+    after it, without revisiting the subtrees before it.
+    """
+    if after is not None and (len(after) != n or not all(0 <= c < n for c in after)):
+        raise ValueError(f"Cursor must list {n} columns between 0 and {n - 1}.")
+    full = (1 << n) - 1
+    columns = []
+
+    def _walk(row, cols, ld, rd, on_path):
+        if row == n:
+            # Still on the cursor's path means this is the cursor itself.
+            if not on_path:
+                yield tuple(columns)
+            return
+        avail = full & ~(cols | ld | rd)
+        start = after[row] if on_path else 0
+        for c in range(start, n):
+            bit = 1 << c
+            if not avail & bit:
+                continue
+            columns.append(c)
+            yield from _walk(row + 1, cols | bit, ((ld | bit) << 1) & full, (rd | bit) >> 1, on_path and c == start)
+            columns.pop()
+
+    yield from _walk(0, 0, 0, 0, after is not None)
@@ -0,0 +1,182 @@
+import multiprocessing
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .util import _setting
+
+
+class SolverOverloaded(Exception):
+    """Raised when a solve is refused at admission; carries the HTTP status to send."""
+
+    def __init__(self, message, status=503, retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SolverPool:
+    """Dedicated executor for solver work with admission control.
+
+    At most ``max_workers`` solves run at once and at most ``max_queue`` more
+    wait for a slot; anything beyond that is rejected immediately with a 503
+    so request threads are not tied up behind expensive boards. With
+    ``per_client`` set, one client may hold at most that many running or
+    queued solves and is refused with a 429 past it.
+    """
+
+    def __init__(self, max_workers=4, max_queue=16, per_client=0, retry_after_s=2):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.per_client = per_client
+        self.retry_after_s = retry_after_s
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._by_client = defaultdict(int)
+        self._stats = {'accepted': 0, 'rejected_full': 0, 'rejected_client': 0}
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='kanoodle-solver')
+        return self._executor
+
+    def submit(self, fn, *args, client=None, **kwargs):
+        with self._lock:
+            if self.per_client and client is not None and self._by_client[client] >= self.per_client:
+                self._stats['rejected_client'] += 1
+                raise SolverOverloaded("Too many concurrent solves for this client.", status=429,
+                                       retry_after=self.retry_after_s)
+            if self._pending >= self.max_workers + self.max_queue:
+                self._stats['rejected_full'] += 1
+                raise SolverOverloaded("Solver is at capacity, try again shortly.", status=503,
+                                       retry_after=self.retry_after_s)
+            self._pending += 1
+            if client is not None:
+                self._by_client[client] += 1
+            self._stats['accepted'] += 1
+            executor = self._get_executor()
+
+        def _release(_future):
+            with self._lock:
+                self._pending -= 1
+                if client is not None:
+                    self._by_client[client] -= 1
+                    if self._by_client[client] <= 0:
+                        del self._by_client[client]
+
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except Exception:
+            _release(None)
+            raise
+        future.add_done_callback(_release)
+        return future
+
+    def run(self, fn, *args, client=None, **kwargs):
+        """Submit ``fn`` and block until it finishes, re-raising its exception."""
+        return self.submit(fn, *args, client=client, **kwargs).result()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                'pending': self._pending,
+                'clients': len(self._by_client),
+                'maxWorkers': self.max_workers,
+                'maxQueue': self.max_queue,
+            })
+            return out
+
+
+class ProcessPool:
+    """Long-lived process pool shared by every multi-process solver path.
+
+    Batch solves, hints, aggregate statistics and N-Queens counts ask for
+    process slots with ``reserve`` instead of starting an executor per
+    request. At most ``max_processes`` slots are handed out at a time; a
+    request that finds fewer free gets fewer (possibly none, meaning it
+    should run in its own solver-pool thread), so concurrent requests
+    cannot multiply the process count. Workers are started with the
+    ``spawn`` method, which is safe from the threaded server.
+    """
+
+    def __init__(self, max_processes=2):
+        self.max_processes = max_processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._stats = {'granted': 0, 'refused': 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_processes,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    @contextmanager
+    def reserve(self, wanted):
+        """Hold up to ``wanted`` process slots for the ``with`` block; yields how many were granted.
+
+        A single slot is not worth shipping the work to another process, so
+        fewer than two free slots (or asking for fewer) yields 0 and the
+        caller runs inline.
+        """
+        if wanted < 2:
+            yield 0
+            return
+        with self._lock:
+            granted = min(wanted, self.max_processes - self._busy)
+            if granted < 2:
+                granted = 0
+            self._busy += granted
+            self._stats['granted' if granted else 'refused'] += 1
+        try:
+            yield granted
+        finally:
+            with self._lock:
+                self._busy -= granted
+
+    def map(self, fn, jobs):
+        """``Executor.map`` on the shared workers; call it inside ``reserve`` with at most the granted jobs in flight."""
+        return self._get_executor().map(fn, jobs)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out.update({'busy': self._busy, 'maxProcesses': self.max_processes})
+            return out
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_PROCESS_POOL = None
+
+def get_solver_pool():
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = SolverPool(
+                    max_workers=_setting('KANOODLE_SOLVER_WORKERS', 4),
+                    max_queue=_setting('KANOODLE_SOLVER_QUEUE', 16),
+                    per_client=_setting('KANOODLE_SOLVER_PER_CLIENT', 0),
+                    retry_after_s=_setting('KANOODLE_SOLVER_RETRY_AFTER', 2),
+                )
+    return _POOL
+
+def get_process_pool():
+    global _PROCESS_POOL
+    if _PROCESS_POOL is None:
+        with _POOL_LOCK:
+            if _PROCESS_POOL is None:
+                _PROCESS_POOL = ProcessPool(max_processes=_setting('KANOODLE_PROCESS_WORKERS', 2))
+    return _PROCESS_POOL
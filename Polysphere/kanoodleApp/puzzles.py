@@ -0,0 +1,107 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from .util import KanoodleSolver, SearchProgress
+
+
+def _ignore(_rows):
+    pass
+
+
+class PuzzleGenerator:
+    """Builds puzzles with exactly one solution on the solver's board.
+
+    The DLX matrix for the empty board is built once. A random full solution
+    is taken from it, then pieces are removed in random order. Each removal is
+    kept only if the remaining pieces still force a unique completion. Every
+    check selects the given rows on the shared matrix and stops at the second
+    solution, so no matrix is rebuilt between checks.
+    """
+
+    def __init__(self, solver):
+        self.solver = solver
+        _, self.dlx, self.placement_info, error = solver._build_matrix(None)
+        if error:
+            raise ValueError(error)
+
+    def count_completions(self, given_rows, limit=2, progress=None):
+        selected = self.dlx.select_rows(given_rows)
+        try:
+            return self.dlx.search([], _ignore, limit, progress)
+        finally:
+            self.dlx.unselect_rows(selected)
+
+    def board(self, rows):
+        grid = [[0] * self.solver.width for _ in range(self.solver.height)]
+        for row_id in rows:
+            piece_id, positions = self.placement_info[row_id]
+            for x, y in positions:
+                grid[y][x] = piece_id
+        return grid
+
+    def generate(self, pieces_to_place, rng, max_attempts=50):
+        """One puzzle leaving ``pieces_to_place`` pieces for the player, or None.
+
+        ``pieces_to_place`` is the difficulty knob. When a random solution
+        cannot be reduced that far while staying unique, a fresh solution is
+        drawn, up to ``max_attempts`` times.
+        """
+        for attempt in range(1, max_attempts + 1):
+            solution = self.dlx.random_solution(rng)
+            if solution is None:
+                return None
+            given = list(solution)
+            rng.shuffle(given)
+            removed = 0
+            for row_id in list(given):
+                if removed == pieces_to_place:
+                    break
+                trial = [r for r in given if r != row_id]
+                if self.count_completions(trial) == 1:
+                    given = trial
+                    removed += 1
+            if removed == pieces_to_place:
+                progress = SearchProgress()
+                self.count_completions(given, progress=progress)
+                return {
+                    'board': self.board(given),
+                    'solution': self.board(solution),
+                    'piecesToPlace': pieces_to_place,
+                    'searchNodes': progress.nodes,
+                    'attempts': attempt,
+                }
+        return None
+
+
+_GENERATOR = None
+
+def _init_worker(width, height, pieces, pieces_hash, orientations, placement_table, mask=None):
+    global _GENERATOR
+    _GENERATOR = PuzzleGenerator(KanoodleSolver(width, height, pieces, pieces_hash=pieces_hash,
+                                                orientations=orientations, placement_table=placement_table,
+                                                mask=mask))
+
+def _generate_one(job):
+    seed, pieces_to_place, max_attempts = job
+    return _GENERATOR.generate(pieces_to_place, random.Random(seed), max_attempts)
+
+
+def generate_puzzles(solver, count, pieces_to_place, workers=1, seed=None, max_attempts=50):
+    """``count`` unique-solution puzzles, generated in parallel over ``workers`` processes.
+
+    Puzzle ``i`` is drawn from ``random.Random(seed + i)``, so a seeded run
+    is reproducible whatever the worker count. Candidates that fail to reach
+    the requested difficulty are returned as None.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    jobs = [(seed + i, pieces_to_place, max_attempts) for i in range(count)]
+    if solver.placement_table is None:
+        solver.placement_table = solver.build_placement_table()
+    init_args = (solver.width, solver.height, solver.pieces_data, solver.pieces_hash,
+                 solver.orientations, solver.placement_table, solver.mask)
+    if workers <= 1:
+        _init_worker(*init_args)
+        return [_generate_one(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+        return list(executor.map(_generate_one, jobs))
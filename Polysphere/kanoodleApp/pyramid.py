@@ -0,0 +1,310 @@
+import threading
+import time
+
+from .util import DancingLinks, DeadlineReached, generate_orientations, normalize_coords
+
+# Lattice coordinates: sphere (x, y, z) sits in layer z at physical position
+# (x + z/2, y + z/2, z/sqrt(2)), so each layer rests in the hollows of the one
+# below and the spheres form a face-centred cubic lattice. Flat pieces lie in
+# one of its three square-grid plane families; these are the unit steps
+# spanning each one (the horizontal layers and the two diagonal slants).
+PLANES = (
+    ((1, 0, 0), (0, 1, 0)),
+    ((0, 0, 1), (-1, -1, 1)),
+    ((-1, 0, 1), (0, -1, 1)),
+)
+
+_ORIENTATIONS = {}
+# Placement tables by (size, catalogue digest), oldest first; at most _TABLES_MAX are kept.
+_TABLES = {}
+_TABLES_MAX = 8
+_LOCK = threading.Lock()
+
+
+def normalize_coords_3d(coords):
+    min_x = min(p[0] for p in coords)
+    min_y = min(p[1] for p in coords)
+    min_z = min(p[2] for p in coords)
+    return tuple(sorted((x - min_x, y - min_y, z - min_z) for x, y, z in coords))
+
+
+def lattice_orientations(shape):
+    """Every distinct 3D orientation of a flat square-grid ``shape`` in the pyramid lattice.
+
+    Each 2D orientation is laid into each plane family; the lattice's point
+    group maps square planes onto square planes, so this is the full set (at
+    most 24). Computed once per shape and cached for the process.
+    """
+    key = normalize_coords([tuple(c) for c in shape])
+    orientations = _ORIENTATIONS.get(key)
+    if orientations is None:
+        seen = set()
+        for flat in generate_orientations(key):
+            for e1, e2 in PLANES:
+                seen.add(normalize_coords_3d([
+                    (u * e1[0] + v * e2[0], u * e1[1] + v * e2[1], u * e1[2] + v * e2[2])
+                    for u, v in flat
+                ]))
+        orientations = _ORIENTATIONS.setdefault(key, tuple(sorted(seen)))
+    return orientations
+
+
+# In-layer, upper-layer and lower-layer contacts of a sphere: twelve in all.
+NEIGHBOURS = (
+    (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0),
+    (0, 0, 1), (-1, 0, 1), (0, -1, 1), (-1, -1, 1),
+    (0, 0, -1), (1, 0, -1), (0, 1, -1), (1, 1, -1),
+)
+
+
+def pyramid_cells(size):
+    """Cells of a square pyramid with a ``size`` x ``size`` base, row-major per layer.
+
+    The apex comes first: cells are the search order, and starting in the
+    narrow top, where few placements fit, keeps the tree small.
+    """
+    return [(x, y, z) for z in reversed(range(size)) for y in range(size - z) for x in range(size - z)]
+
+
+def get_pyramid_table(size, catalogue):
+    """Placement table for a pyramid size and catalogue, built once per process (up to ``_TABLES_MAX`` kept)."""
+    key = (size, catalogue.digest)
+    table = _TABLES.get(key)
+    if table is None:
+        table = PyramidSolver(size, catalogue.pieces).build_placement_table()
+        with _LOCK:
+            table = _TABLES.setdefault(key, table)
+            while len(_TABLES) > _TABLES_MAX:
+                del _TABLES[next(iter(_TABLES))]
+    return table
+
+
+class PyramidSolver:
+    """Solver for the 3D pyramid variant with a ``size`` x ``size`` base.
+
+    Boards are lists of layers, bottom first; layer ``z`` is a
+    ``size - z`` square grid of piece ids (0 for empty), indexed ``[y][x]``.
+    Internally every cell is one bit and every placement a mask, and the
+    search fills the lowest empty cell first, trying only the placements
+    whose lowest cell it is. ``_build_matrix`` gives the same problem as a
+    ``DancingLinks`` matrix for the generic tools.
+    """
+
+    def __init__(self, size, pieces, placement_table=None):
+        self.size = size
+        self.pieces_data = pieces
+        self.cells = pyramid_cells(size)
+        self.index = {cell: i for i, cell in enumerate(self.cells)}
+        self.full = (1 << len(self.cells)) - 1
+        self.neighbours = []
+        for x, y, z in self.cells:
+            bits = 0
+            for dx, dy, dz in NEIGHBOURS:
+                i = self.index.get((x + dx, y + dy, z + dz))
+                if i is not None:
+                    bits |= 1 << i
+            self.neighbours.append(bits)
+        self.placement_table = placement_table
+        self._positions = None
+
+    def build_placement_table(self):
+        """Every placement of every piece in the empty pyramid, keyed by piece id.
+
+        Entries are ``(placement_id, positions, mask)`` with ``positions`` the
+        sorted ``(x, y, z)`` cells and ``mask`` their bits.
+        """
+        table = {}
+        for piece_data in self.pieces_data:
+            placements = []
+            for shape in lattice_orientations(piece_data['shapeData']):
+                for tz in range(self.size):
+                    for ty in range(self.size - tz):
+                        for tx in range(self.size - tz):
+                            positions = tuple((x + tx, y + ty, z + tz) for x, y, z in shape)
+                            if all(pos in self.index for pos in positions):
+                                mask = 0
+                                for pos in positions:
+                                    mask |= 1 << self.index[pos]
+                                placements.append(((piece_data['id'], len(placements)), positions, mask))
+            table[piece_data['id']] = placements
+        return table
+
+    def _table(self):
+        if self.placement_table is None:
+            self.placement_table = self.build_placement_table()
+        return self.placement_table
+
+    def _placement_positions(self):
+        if self._positions is None:
+            self._positions = {pid: positions for entries in self._table().values() for pid, positions, _ in entries}
+        return self._positions
+
+    def _empty_layers(self):
+        return [[[0] * (self.size - z) for _ in range(self.size - z)] for z in range(self.size)]
+
+    def _read_board(self, layers):
+        """``(layers, occupied_mask, placed_piece_ids)`` for a partial board, or raise ValueError."""
+        if not layers:
+            layers = self._empty_layers()
+        if not isinstance(layers, list) or len(layers) != self.size or any(
+                not isinstance(layer, list) or len(layer) != self.size - z or
+                any(not isinstance(row, list) or len(row) != self.size - z for row in layer)
+                for z, layer in enumerate(layers)):
+            raise ValueError(f"Expected {self.size} square layers of sides {self.size} down to 1.")
+        occupied = 0
+        placed = set()
+        for x, y, z in self.cells:
+            piece_id = layers[z][y][x]
+            if isinstance(piece_id, bool) or not isinstance(piece_id, int):
+                raise ValueError(f"Bad cell {piece_id!r}; expected a piece id or 0.")
+            if piece_id:
+                occupied |= 1 << self.index[(x, y, z)]
+                placed.add(piece_id)
+        return layers, occupied, placed
+
+    def _halo(self, mask):
+        bits = 0
+        while mask:
+            low = mask & -mask
+            bits |= self.neighbours[low.bit_length() - 1]
+            mask ^= low
+        return bits
+
+    def _candidates(self, occupied, placed):
+        """Remaining placements bucketed by their lowest cell, plus the bit of each remaining piece.
+
+        Entries are ``(piece_bit, mask, halo, placement_id)``; ``halo`` is
+        the mask of cells touching the placement.
+        """
+        by_cell = [[] for _ in self.cells]
+        piece_bits = {}
+        for piece_data in self.pieces_data:
+            piece_id = piece_data['id']
+            if piece_id in placed:
+                continue
+            piece_bits[piece_id] = 1 << len(piece_bits)
+            for placement_id, positions, mask in self._table()[piece_id]:
+                if not mask & occupied:
+                    by_cell[(mask & -mask).bit_length() - 1].append(
+                        (piece_bits[piece_id], mask, self._halo(mask) & ~mask, placement_id))
+        return by_cell, piece_bits
+
+    def iter_solutions(self, layers=None, progress=None, deadline=None):
+        """Yield each completion of ``layers`` as a list of placement ids.
+
+        Stops quietly once ``deadline`` (a ``time.time()`` value) passes; the
+        caller can tell from the clock.
+        """
+        layers, occupied, placed = self._read_board(layers)
+        remaining_cells = sum(len(p['shapeData']) for p in self.pieces_data if p['id'] not in placed)
+        if remaining_cells != len(self.cells) - bin(occupied).count('1'):
+            return
+        by_cell, piece_bits = self._candidates(occupied, placed)
+        all_pieces = sum(piece_bits.values())
+        chosen = []
+        nodes = [0]
+
+        def _search(occupied, used):
+            if occupied == self.full:
+                if used == all_pieces:
+                    yield list(chosen)
+                return
+            nodes[0] += 1
+            if deadline is not None and nodes[0] % 1024 == 0 and time.time() >= deadline:
+                raise DeadlineReached()
+            free = self.full & ~occupied
+            candidates = by_cell[(free & -free).bit_length() - 1]
+            depth = len(chosen)
+            for index, (piece_bit, mask, halo, placement_id) in enumerate(candidates):
+                if piece_bit & used or mask & occupied:
+                    continue
+                if progress is not None:
+                    progress.enter(depth, index, len(candidates))
+                after = occupied | mask
+                # Every piece has several spheres, so an empty cell walled in
+                # by this placement can never be filled.
+                edge = halo & ~after
+                walled = False
+                while edge:
+                    low = edge & -edge
+                    if not self.neighbours[low.bit_length() - 1] & ~after:
+                        walled = True
+                        break
+                    edge ^= low
+                if walled:
+                    continue
+                chosen.append(placement_id)
+                yield from _search(after, used | piece_bit)
+                chosen.pop()
+
+        try:
+            yield from _search(occupied, 0)
+        except DeadlineReached:
+            return
+
+    def board(self, layers, placement_ids):
+        """Copy of ``layers`` with the given placements filled in."""
+        layers = [[list(row) for row in layer] for layer in layers or self._empty_layers()]
+        positions = self._placement_positions()
+        for placement_id in placement_ids:
+            for x, y, z in positions[placement_id]:
+                layers[z][y][x] = placement_id[0]
+        return layers
+
+    def solvePartial(self, layers, max_samples=100, max_time=None, progress=None):
+        """Same contract as ``KanoodleSolver.solvePartial``, with ``{'layers': ...}`` solutions."""
+        max_samples = max_samples or 100
+        deadline = time.time() + max_time / 1000 if max_time else None
+        try:
+            layers = self._read_board(layers)[0]
+        except ValueError as exc:
+            return {'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'timedOut': False,
+                    'limitReached': False, 'message': str(exc)}
+        solutions = []
+        for placement_ids in self.iter_solutions(layers, progress, deadline):
+            solutions.append({'layers': self.board(layers, placement_ids)})
+            if progress is not None:
+                progress.solutions += 1
+            if len(solutions) >= max_samples:
+                break
+        limit_reached = len(solutions) >= max_samples
+        timed_out = not limit_reached and deadline is not None and time.time() >= deadline
+        if progress is not None:
+            progress.finish(complete=not (limit_reached or timed_out))
+        if not solutions:
+            message = "Time limit reached before a solution was found." if timed_out else "No solutions found."
+        elif timed_out:
+            message = f"Found {len(solutions)} solution(s) before time limit."
+        elif limit_reached:
+            message = f"Found {len(solutions)} solution(s) (sample limit reached)."
+        else:
+            message = f"Found all {len(solutions)} solution(s)."
+        return {
+            'solutions': solutions,
+            'solutionCount': len(solutions),
+            'solutionsReturned': len(solutions),
+            'timedOut': timed_out,
+            'limitReached': limit_reached,
+            'message': message,
+        }
+
+    def _build_matrix(self, layers=None):
+        """``(layers, dlx, placement_info, error)`` like ``KanoodleSolver._build_matrix``, cells as ``(x, y, z)``."""
+        try:
+            layers, occupied, placed = self._read_board(layers)
+        except ValueError as exc:
+            return layers, None, None, str(exc)
+        remaining = [p for p in self.pieces_data if p['id'] not in placed]
+        empty = [cell for cell in self.cells if not occupied >> self.index[cell] & 1]
+        if sum(len(p['shapeData']) for p in remaining) != len(empty):
+            return layers, None, None, "Unsolvable: Placed pieces do not leave a solvable empty space."
+        dlx = DancingLinks([f"piece_{p['id']}" for p in remaining] + [f"pos_{x}_{y}_{z}" for x, y, z in empty])
+        placement_info = {}
+        for piece_data in remaining:
+            for placement_id, positions, mask in self._table()[piece_data['id']]:
+                if not mask & occupied:
+                    dlx.add_row(placement_id, [f"piece_{piece_data['id']}"] + [f"pos_{x}_{y}_{z}" for x, y, z in positions])
+                    placement_info[placement_id] = (piece_data['id'], positions)
+        if not placement_info:
+            return layers, None, None, "Unsolvable: No valid placements found."
+        return layers, dlx, placement_info, None
@@ -1,7 +1,33 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
+from asgiref.sync import sync_to_async
+import asyncio
+import gzip
+import itertools
 import hashlib
+import json
 
-from .util import solverKanoodle
+import random
+import threading
+import time
+from unittest import mock, skipUnless
+
+try:
+	import fakeredis
+except ImportError:
+	fakeredis = None
+
+from .aggregate import aggregate_solutions, board_symmetries, np as aggregate_np
+from .catalogue import get_catalogue, invalidate_catalogue
+from .cursors import CursorStore, get_cursor_store
+from .models import KanoodleBoard, Piece, partialSolution
+from .pool import ProcessPool, SolverPool, SolverOverloaded, get_process_pool
+from .puzzles import PuzzleGenerator, generate_puzzles
+from .exactcover import ExactCoverSolver
+from .nqueens import _SHARDS, count_prefix, count_solutions, iter_solutions
+from .pyramid import PyramidSolver, lattice_orientations
+from .warmstart import load_snapshot, write_snapshot, _TABLES
+from .wire import WireFormat
+from .util import _RANK_MEMOS, append_cached_solutions, board_from_string, board_to_string, mask_cells, solverKanoodle, SearchProgress, SharedSolutionStream, SolverSession, SessionStore, create_session, delete_session, get_progress, make_cache_keys
 
 def board_hash(board):
 	"""Stable hash of a 2D board array."""
@@ -161,3 +187,1215 @@ class CorrectnessTests(TestCase):
 		duplicates = [grp for grp in canonical_map.values() if len(grp) > 1]
 		self.assertEqual(duplicates, [], f"Found shape-identical piece groups: {duplicates}")
 
+DOMINOES = [{'id':i,'name':f'Domino{i}','shapeData':[(0,0),(1,0)]} for i in range(1, 5)]
+
+def full_order(width, height, pieces):
+	solver = solverKanoodle(width, height, pieces)
+	result = solver.solvePartial(board_state=None, max_samples=10000, max_time=0)
+	return [board_hash(sol['board']) for sol in result['solutions']]
+
+def domino_catalogue():
+	invalidate_catalogue()
+	for i in range(4):
+		Piece.objects.create(name=f'Domino {i}', shapeData=[[0, 0], [1, 0]])
+
+def solve_record(width=4, height=2):
+	board = KanoodleBoard.objects.create(name=f'{width}x{height}', width=width, height=height)
+	record = partialSolution.objects.create(board=board, state_data={})
+	# Primary keys are reused after each test's rollback; drop any cached cursor
+	# or session left under this one.
+	get_cursor_store().forget(record.pk)
+	delete_session(f"solve:{record.pk}")
+	return record
+
+class ResumeTokenTests(TestCase):
+	def test_token_pages_match_full_order(self):
+		"""Paging one solution at a time via resume tokens reproduces the full DLX order."""
+		expected = full_order(4, 2, DOMINOES)
+		seen, token = [], None
+		for _ in range(len(expected) + 2):
+			solver = solverKanoodle(4, 2, DOMINOES)
+			page = solver.solveIncremental(None, batch_size=1, resume_token=token)
+			seen.extend(board_hash(s['board']) for s in page['solutions'])
+			token = page['resumeToken']
+			if page['exhausted']:
+				break
+		self.assertEqual(seen, expected)
+		self.assertIsNone(token)
+
+	def test_session_token_resumes_on_fresh_session(self):
+		"""A token from one session continues the sequence in a brand-new session."""
+		expected = full_order(4, 2, DOMINOES)
+		first = SolverSession(solverKanoodle(4, 2, DOMINOES), None)
+		batch, total, _, _ = first.next_batch(batch_size=1)
+		resumed = SolverSession(solverKanoodle(4, 2, DOMINOES), None, resume_token=first.resume_token())
+		rest, total, exhausted, _ = resumed.next_batch(batch_size=1000)
+		self.assertEqual([board_hash(s['board']) for s in batch + rest], expected)
+		self.assertEqual(total, len(expected))
+		self.assertTrue(exhausted)
+
+	def test_token_rejected_for_other_board(self):
+		"""Tokens are bound to the board and piece set they were issued for."""
+		page = solverKanoodle(4, 2, DOMINOES).solveIncremental(None, batch_size=1)
+		other = [[1, 1, 0, 0], [0, 0, 0, 0]]
+		with self.assertRaises(ValueError):
+			solverKanoodle(4, 2, DOMINOES).solveIncremental(other, batch_size=1, resume_token=page['resumeToken'])
+
+	@mock.patch('kanoodleApp.views.get_redis_client', return_value=None)
+	def test_endpoint_rejects_bad_tokens(self, _redis):
+		"""Malformed or foreign resume tokens are a 400, not an unsolvable board."""
+		domino_catalogue()
+		record, other = solve_record(), solve_record(2, 4)
+		post = lambda rec, body: self.client.post(f'/api/solve/{rec.pk}/', json.dumps(body), content_type='application/json')
+		resp = post(record, {'action': 'next', 'batchSize': 1, 'resumeToken': 'not-a-token'})
+		self.assertEqual(resp.status_code, 400)
+		self.assertEqual(resp.json(), {'error': 'Invalid resume token.', 'success': False})
+		token = post(record, {'action': 'init', 'batchSize': 1}).json()['resumeToken']
+		resp = post(other, {'action': 'next', 'batchSize': 1, 'resumeToken': token})
+		self.assertEqual(resp.status_code, 400)
+		self.assertFalse(resp.json()['success'])
+		self.assertIn('does not match', resp.json()['error'])
+
+class EstimatorTests(TestCase):
+	def test_estimate_tracks_exact_count(self):
+		"""Knuth probes on a small board land near the exact solution count."""
+		est = solverKanoodle(4, 2, DOMINOES).estimate(None, probes=2000, seed=7)
+		self.assertEqual(est['probes'], 2000)
+		self.assertLessEqual(est['solutionsLow'], 120)
+		self.assertGreaterEqual(est['solutionsHigh'], 120)
+		self.assertGreater(est['estimatedNodes'], est['estimatedSolutions'])
+
+	def test_probe_restores_matrix(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		_, dlx, _, _ = solver._build_matrix(None)
+
+		rng = random.Random(1)
+		for _ in range(50):
+			dlx.random_probe(rng)
+		self.assertEqual(sum(1 for _ in dlx.search_generator()), 120)
+
+	def test_probes_clamped_to_setting(self):
+		from django.test import override_settings
+		from .views import _one_shot_job
+		solver = solverKanoodle(4, 2, DOMINOES)
+		with override_settings(KANOODLE_MAX_PROBES=50):
+			fn, args = _one_shot_job('estimate', {'probes': 10 ** 9}, solver, None, None, 'test:probes')
+		self.assertEqual(fn(*args)['probes'], 50)
+		with self.assertRaises(ValueError):
+			_one_shot_job('estimate', {'probes': 'lots'}, solver, None, None, 'test:probes')
+
+	def test_shard_depth_clamped_to_setting(self):
+		from django.test import override_settings
+		from .views import _one_shot_job
+		solver = solverKanoodle(4, 2, DOMINOES)
+		with override_settings(KANOODLE_MAX_SHARD_DEPTH=2):
+			_, args = _one_shot_job('aggregate', {'shardDepth': 10 ** 6}, solver, None, None, 'test:aggregate')
+		self.assertEqual(args[3], 2)
+		self.assertEqual(_one_shot_job('aggregate', {}, solver, None, None, 'test:aggregate')[1][3], 1)
+		for depth in ('deep', 0, -1):
+			with self.assertRaises(ValueError):
+				_one_shot_job('aggregate', {'shardDepth': depth}, solver, None, None, 'test:aggregate')
+
+	def test_hint_cap_clamped_to_setting(self):
+		from django.test import override_settings
+		from .views import _one_shot_job
+		solver = solverKanoodle(4, 2, DOMINOES)
+		with override_settings(KANOODLE_MAX_HINT_CAP=3):
+			fn, args = _one_shot_job('hint', {'pieceId': 1, 'cap': 10 ** 9}, solver, None, None, 'test:hint')
+		self.assertEqual(max(p['solutions'] for p in fn(*args)['placements']), 3)
+		fn, args = _one_shot_job('hint', {'pieceId': 1, 'cap': '5'}, solver, None, None, 'test:hint')
+		self.assertEqual(max(p['solutions'] for p in fn(*args)['placements']), 5)
+		for cap in (-3, 0, 'lots'):
+			with self.assertRaises(ValueError):
+				_one_shot_job('hint', {'pieceId': 1, 'cap': cap}, solver, None, None, 'test:hint')
+
+class ProgressTests(TestCase):
+	def test_session_progress_reaches_completion(self):
+		sess = SolverSession(solverKanoodle(4, 2, DOMINOES), None)
+		sess.next_batch(batch_size=10)
+		mid = sess.progress.snapshot()
+		self.assertEqual(mid['solutions'], 10)
+		self.assertFalse(mid['done'])
+		self.assertLess(mid['fraction'], 1.0)
+
+		sess.next_batch(batch_size=1000)
+		end = sess.progress.snapshot()
+		self.assertEqual(end['solutions'], 120)
+		self.assertTrue(end['complete'])
+		self.assertEqual(end['fraction'], 1.0)
+		self.assertGreater(end['nodes'], mid['nodes'])
+
+	def test_solve_partial_reports_progress(self):
+		progress = SearchProgress()
+		solverKanoodle(4, 2, DOMINOES).solvePartial(None, max_samples=5, progress=progress)
+		self.assertTrue(progress.done)
+		self.assertFalse(progress.complete)
+		self.assertGreaterEqual(progress.solutions, 5)
+
+	def test_sampled_progress_counts_every_node(self):
+		"""Sampling below the top levels skips calls, not node counts or branch positions."""
+		class Counting(SearchProgress):
+			calls = 0
+			def sample(self, depth, index, size):
+				self.calls += 1
+				super().sample(depth, index, size)
+		every, sampled = SearchProgress(top_levels=2, sample_every=1), Counting(top_levels=2, sample_every=64)
+		for progress in (every, sampled):
+			solverKanoodle(4, 2, DOMINOES).solvePartial(None, max_samples=1000, progress=progress)
+		self.assertEqual(sampled.nodes, every.nodes)
+		self.assertEqual(sampled.fraction(), every.fraction())
+		self.assertLess(sampled.calls, every.nodes)
+
+	def test_progress_dropped_with_session(self):
+		create_session('test:progress', solverKanoodle(4, 2, DOMINOES), None)
+		self.assertIsNotNone(get_progress('test:progress'))
+		delete_session('test:progress')
+		self.assertIsNone(get_progress('test:progress'))
+
+class WireFormatTests(TestCase):
+	def setUp(self):
+		self.factory = RequestFactory()
+		self.solutions = solverKanoodle(4, 2, DOMINOES).solvePartial(None, max_samples=200)['solutions']
+
+	def _wire(self, data=None, **headers):
+		return WireFormat.negotiate(self.factory.post('/', **headers), data or {})
+
+	def test_defaults_are_plain_json(self):
+		wire = self._wire(HTTP_ACCEPT='*/*')
+		resp = wire.response({'solutions': wire.solutions(self.solutions[:2])})
+		self.assertEqual(resp['Content-Type'], 'application/json')
+		self.assertFalse(resp.has_header('Content-Encoding'))
+		self.assertNotIn('format', json.loads(resp.content))
+
+	def test_compact_boards_round_trip(self):
+		encoded = self._wire({'format': 'compact'}).solutions(self.solutions)
+		self.assertEqual([board_from_string(s, 4) for s in encoded], [s['board'] for s in self.solutions])
+
+	def test_placements_skip_request_pieces(self):
+		board = self.solutions[0]['board']
+		request_board = [row[:] for row in board]
+		request_board[1] = [0, 0, 0, 0]
+		placed = self._wire({'format': 'placements'}).solutions([self.solutions[0]], request_board)[0]
+		self.assertEqual(sorted(cell for _, cells in placed for cell in cells), [4, 5, 6, 7])
+
+	def test_placements_tolerate_short_request_board(self):
+		board = self.solutions[0]['board']
+		placed = self._wire({'format': 'placements'}).solutions([self.solutions[0]], [board[0][:2]])[0]
+		self.assertEqual(sorted(cell for _, cells in placed for cell in cells), [2, 3, 4, 5, 6, 7])
+
+	def test_compact_falls_back_to_grid_for_large_ids(self):
+		solutions = [{'board': [[36, 36, 1, 1]]}]
+		wire = self._wire({'format': 'compact'})
+		self.assertEqual(wire.solutions(solutions), solutions)
+		self.assertNotIn('format', json.loads(wire.response({'solutions': solutions}).content))
+		with self.assertRaisesRegex(ValueError, 'Piece id 36'):
+			board_to_string([[36]])
+
+	def test_large_batches_are_compressed(self):
+		wire = self._wire(HTTP_ACCEPT_ENCODING='gzip, deflate')
+		payload = {'solutions': wire.solutions(self.solutions)}
+		resp = wire.response(payload)
+		self.assertEqual(resp['Content-Encoding'], 'gzip')
+		self.assertEqual(json.loads(gzip.decompress(resp.content))['solutions'], payload['solutions'])
+		self.assertIn('Accept-Encoding', resp['Vary'])
+
+	def test_unknown_format_rejected(self):
+		with self.assertRaises(ValueError):
+			self._wire({'format': 'xml'})
+
+class BatchSolveTests(TestCase):
+	def test_results_in_input_order(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		first = solver.solvePartial(None, max_samples=200)['solutions'][0]['board']
+		opening = [row[:] for row in first]
+		opening[1] = [0, 0, 0, 0]
+		items = [None, opening, {'board': opening, 'max_samples': 1}, opening]
+		results = solver.solve_many(items, max_samples=200)
+		self.assertEqual([r['solutionCount'] for r in results],
+		                 [120, solver.solvePartial(opening)['solutionCount'], 1, results[1]['solutionCount']])
+		self.assertIsNot(results[1], results[3])
+
+	def test_process_pool_matches_inline(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		boards = [None] + [s['board'] for s in solver.solvePartial(None, max_samples=3)['solutions']]
+		boards = [[row[:2] + [0, 0] for row in b] if b else b for b in boards]
+		inline = solver.solve_many(boards)
+		pooled = solver.solve_many(boards, workers=2)
+		self.assertEqual([r['solutions'] for r in pooled], [r['solutions'] for r in inline])
+
+	def test_per_board_time_limit_stops_the_search(self):
+		dominoes = [{'id': i, 'name': f'Domino{i}', 'shapeData': [(0, 0), (1, 0)]} for i in range(1, 9)]
+		solver = solverKanoodle(4, 4, dominoes)
+		started = time.monotonic()
+		timed, free = solver.solve_many([{'board': None, 'max_samples': 10 ** 6, 'max_time': 50},
+		                                 {'board': None, 'max_samples': 5}])
+		self.assertLess(time.monotonic() - started, 5)
+		self.assertTrue(timed['timedOut'])
+		self.assertLess(timed['solutionCount'], 10 ** 6)
+		self.assertEqual((free['timedOut'], free['solutionsReturned']), (False, 5))
+
+	@mock.patch('kanoodleApp.views.get_redis_client', return_value=None)
+	def test_endpoint_clamps_sample_limits(self, _redis):
+		from django.test import override_settings
+		domino_catalogue()
+		record = solve_record()
+		body = {'boardId': record.board.pk, 'sampleLimit': 10 ** 9, 'boards': [None, {'partialBoard': None, 'sampleLimit': 10 ** 9}]}
+		with override_settings(KANOODLE_MAX_SAMPLES=3, KANOODLE_BATCH_WORKERS=1):
+			resp = self.client.post('/api/solve/batch/', json.dumps(body), content_type='application/json')
+		self.assertEqual([r['solutionsReturned'] for r in resp.json()['results']], [3, 3])
+		body['boards'][1]['sampleLimit'] = -1
+		resp = self.client.post('/api/solve/batch/', json.dumps(body), content_type='application/json')
+		self.assertEqual(resp.status_code, 400)
+
+	@mock.patch('kanoodleApp.views.get_redis_client', return_value=None)
+	def test_endpoint_solves_on_shared_process_slots(self, _redis):
+		from django.test import override_settings
+		domino_catalogue()
+		record = solve_record()
+		openings = [None, [[0, 0, 0, 0], [0, 0, 0, 0]], [[1, 1, 0, 0], [0, 0, 0, 0]]]
+		pool = ProcessPool(max_processes=2)
+		self.addCleanup(pool.shutdown)
+		with override_settings(KANOODLE_BATCH_WORKERS=2), mock.patch('kanoodleApp.pool._PROCESS_POOL', pool):
+			resp = self.client.post('/api/solve/batch/', json.dumps({'boardId': record.board.pk, 'boards': openings}),
+			                        content_type='application/json')
+		self.assertEqual(resp.status_code, 200)
+		inline = solverKanoodle(4, 2, DOMINOES).solve_many(openings)
+		self.assertEqual([r['solutionCount'] for r in resp.json()['results']], [r['solutionCount'] for r in inline])
+		self.assertEqual(pool.stats(), {'granted': 1, 'refused': 0, 'busy': 0, 'maxProcesses': 2})
+
+class SingleFlightTests(TestCase):
+	def test_concurrent_cursors_share_one_producer(self):
+		"""Cursors for the same board/catalogue read one shared stream and all see the full order."""
+		expected = full_order(4, 2, DOMINOES)
+		shared_key, _ = make_cache_keys(4, 2, None, DOMINOES)
+		keys = [f"test:sf:{i}" for i in range(6)]
+		cursors = [create_session(k, solverKanoodle(4, 2, DOMINOES), None, shared_key=shared_key) for k in keys]
+		self.assertEqual(len({id(c.stream) for c in cursors}), 1)
+		results = {}
+
+		def drain(idx, cursor):
+			out = []
+			while True:
+				batch, _, exhausted, _ = cursor.next_batch(batch_size=7)
+				out.extend(board_hash(s['board']) for s in batch)
+				if exhausted:
+					break
+			results[idx] = out
+
+		threads = [threading.Thread(target=drain, args=(i, c)) for i, c in enumerate(cursors)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		for k in keys:
+			delete_session(k)
+		self.assertEqual(cursors[0].stream.session.total_found, len(expected))
+		for out in results.values():
+			self.assertEqual(out, expected)
+
+	def test_lagging_cursor_falls_back_outside_window(self):
+		"""The stream keeps only its window; a cursor left behind resumes privately in the same order."""
+		expected = full_order(4, 2, DOMINOES)
+		stream = SharedSolutionStream(solverKanoodle(4, 2, DOMINOES), None, window=5)
+		fast, slow = stream.attach(0), stream.attach(0)
+		batch, _, _, _ = slow.next_batch(batch_size=2)
+		seen = [board_hash(s['board']) for s in batch]
+		while not fast.next_batch(batch_size=3)[2]:
+			self.assertLessEqual(len(stream.solutions), 5)
+		self.assertIsNotNone(slow.fallback_token)
+		self.assertIsNone(stream.attach(2))
+		while True:
+			batch, position, exhausted, _ = slow.next_batch(batch_size=50)
+			seen.extend(board_hash(s['board']) for s in batch)
+			if exhausted:
+				break
+		self.assertEqual(seen, expected)
+		self.assertEqual(position, len(expected))
+
+	@skipUnless(fakeredis, "fakeredis not installed")
+	def test_concurrent_cache_appends_have_no_duplicates(self):
+		"""Cursors racing to append the same solutions leave the cached list in order with no repeats."""
+		expected = full_order(4, 2, DOMINOES)
+		redis_client = fakeredis.FakeRedis(decode_responses=True)
+		base_key, meta_key = make_cache_keys(4, 2, None, DOMINOES)
+		keys = [f"test:append:{i}" for i in range(6)]
+		cursors = [create_session(k, solverKanoodle(4, 2, DOMINOES), None, shared_key=base_key) for k in keys]
+
+		def drain(cursor):
+			while True:
+				batch, total, exhausted, _ = cursor.next_batch(batch_size=7)
+				append_cached_solutions(redis_client, base_key, meta_key, [s['board'] for s in batch],
+				                        total, exhausted, start=total - len(batch))
+				if exhausted:
+					break
+
+		threads = [threading.Thread(target=drain, args=(c,)) for c in cursors]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		for k in keys:
+			delete_session(k)
+		cached = [board_hash(json.loads(item)) for item in redis_client.lrange(base_key, 0, -1)]
+		self.assertEqual(cached, expected)
+		self.assertEqual(redis_client.hgetall(meta_key), {'total': str(len(expected)), 'exhausted': '1'})
+		append_cached_solutions(redis_client, base_key, meta_key, [[[9]]], len(expected) + 5, False,
+		                        start=len(expected) + 4)
+		self.assertEqual(redis_client.llen(base_key), len(expected))
+
+class SessionStoreTests(TestCase):
+	def test_lru_order_and_count_bound(self):
+		store = SessionStore(max_sessions=2, idle_ttl_s=0)
+		store.put('a', 'A'); store.put('b', 'B')
+		store.get('a')
+		store.put('c', 'C')
+		self.assertIsNone(store.get('b'))
+		self.assertEqual((store.get('a'), store.get('c')), ('A', 'C'))
+		self.assertEqual(store.stats()['evicted_lru'], 1)
+
+	def test_memory_budget_evicts_oldest(self):
+		store = SessionStore(max_sessions=10, max_nodes=100, idle_ttl_s=0)
+		store.put('a', 'A', weight=60)
+		store.put('b', 'B', weight=60)
+		self.assertIsNone(store.get('a'))
+		stats = store.stats()
+		self.assertEqual((stats['nodes'], stats['evicted_memory']), (60, 1))
+
+	def test_idle_ttl_reap(self):
+		store = SessionStore(idle_ttl_s=60)
+		store.put('a', 'A')
+		store._entries['a'][2] -= 120
+		store.put('b', 'B')
+		self.assertEqual(store.reap(), 1)
+		self.assertIsNone(store.get('a'))
+		self.assertEqual(store.get('b'), 'B')
+
+	def test_shared_weight_charged_per_live_reference_set(self):
+		"""A shared stream is charged once while cursors reference it and again after they all leave."""
+		store = SessionStore(idle_ttl_s=0)
+		stream = object()
+		store.put('a', 'A', weight=1, shared=stream, shared_weight=50)
+		store.put('b', 'B', weight=1, shared=stream, shared_weight=50)
+		self.assertEqual(store.stats()['nodes'], 52)
+		store.delete('a')
+		self.assertEqual(store.stats()['nodes'], 51)
+		store.delete('b')
+		self.assertEqual(store.stats()['nodes'], 0)
+		store.put('c', 'C', weight=1, shared=stream, shared_weight=50)
+		self.assertEqual(store.stats()['nodes'], 51)
+
+class CursorStoreTests(TestCase):
+	def test_cursor_writes_are_deferred_until_flush(self):
+		board = KanoodleBoard.objects.create(name='test', width=4, height=2)
+		record = partialSolution.objects.create(board=board, state_data={})
+		store = CursorStore(flush_interval_s=0)
+		cursor = store.get(record.pk)
+		self.assertEqual((cursor.board.width, cursor.board.height), (4, 2))
+		cursor.state_data['cursor'] = 24
+		with self.assertNumQueries(0):
+			cursor.save(update_fields=['state_data'])
+			self.assertEqual(store.get(record.pk).state_data['cursor'], 24)
+		record.refresh_from_db()
+		self.assertEqual(record.state_data, {})
+		self.assertEqual(store.flush(), 1)
+		record.refresh_from_db()
+		self.assertEqual(record.state_data['cursor'], 24)
+
+	def test_cache_bounded_and_redis_client_reused(self):
+		board = KanoodleBoard.objects.create(name='test', width=4, height=2)
+		first, second = (partialSolution.objects.create(board=board, state_data={}) for _ in range(2))
+		with mock.patch('kanoodleApp.cursors.get_redis_client', return_value=None) as lookup:
+			store = CursorStore(flush_interval_s=0, max_entries=1)
+			cursor = store.get(first.pk)
+			cursor.state_data['cursor'] = 5
+			cursor.save()
+			store.get(second.pk)
+			self.assertEqual(len(store._records), 1)
+			self.assertEqual(store.get(first.pk).state_data['cursor'], 5)
+		self.assertEqual(lookup.call_count, 1)
+
+class CatalogueTests(TestCase):
+	def setUp(self):
+		invalidate_catalogue()
+
+	def test_snapshot_invalidated_by_piece_signals(self):
+		Piece.objects.create(name='Domino', shapeData=[[0, 0], [1, 0]])
+		first = get_catalogue()
+		self.assertIs(get_catalogue(), first)
+		self.assertEqual(len(first.orientations[first.pieces[0]['id']]), 2)
+		Piece.objects.create(name='Tromino', shapeData=[[0, 0], [1, 0], [2, 0]])
+		second = get_catalogue()
+		self.assertIsNot(second, first)
+		self.assertNotEqual(second.digest, first.digest)
+		Piece.objects.filter(name='Tromino').get().delete()
+		self.assertEqual(get_catalogue().digest, first.digest)
+
+	def test_pieces_api_conditional_get(self):
+		Piece.objects.create(name='Domino', shapeData=[[0, 0], [1, 0]])
+		resp = self.client.get('/api/pieces/')
+		self.assertEqual(resp.status_code, 200)
+		etag = resp['ETag']
+		self.assertEqual(self.client.get('/api/pieces/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		Piece.objects.create(name='Tromino', shapeData=[[0, 0], [1, 0], [2, 0]])
+		self.assertEqual(self.client.get('/api/pieces/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+class AsyncViewTests(TestCase):
+	def setUp(self):
+		domino_catalogue()
+		self.record = solve_record()
+
+	async def _page(self, record, body):
+		resp = await self.async_client.post(f'/api/async/solve/{record.pk}/', json.dumps(body),
+		                                    content_type='application/json')
+		self.assertEqual(resp.status_code, 200)
+		return resp.json()
+
+	@mock.patch('kanoodleApp.views.get_async_redis_client', new_callable=mock.AsyncMock, return_value=None)
+	async def test_init_next_pages_full_order(self, _redis):
+		expected = full_order(4, 2, DOMINOES)
+		page = await self._page(self.record, {'action': 'init', 'batchSize': 50})
+		seen = [board_hash(s['board']) for s in page['solutions']]
+		while not page['exhausted']:
+			page = await self._page(self.record, {'action': 'next', 'batchSize': 50})
+			seen.extend(board_hash(s['board']) for s in page['solutions'])
+		self.assertEqual(seen, expected)
+		self.assertEqual((page['solutionCount'], page['cache'], page['resumeToken']), (120, 'miss', None))
+
+	@skipUnless(fakeredis, "fakeredis not installed")
+	async def test_second_client_served_from_cache(self):
+		from fakeredis import aioredis as fake_aioredis
+		server = fakeredis.FakeServer()
+		connect = mock.AsyncMock(side_effect=lambda: fake_aioredis.FakeRedis(server=server, decode_responses=True))
+		other = await sync_to_async(solve_record)()
+		with mock.patch('kanoodleApp.views.get_async_redis_client', connect):
+			first = await self._page(self.record, {'action': 'init', 'batchSize': 10})
+			second = await self._page(other, {'action': 'init', 'batchSize': 10})
+			following = await self._page(other, {'action': 'next', 'batchSize': 10})
+		self.assertEqual((first['cache'], second['cache'], following['cache']), ('miss', 'hit', 'miss'))
+		self.assertEqual(second['solutions'], first['solutions'])
+		self.assertEqual(following['solutionCount'], 20)
+		self.assertEqual([board_hash(s['board']) for s in following['solutions']], full_order(4, 2, DOMINOES)[10:20])
+
+	@mock.patch('kanoodleApp.views.get_async_redis_client', new_callable=mock.AsyncMock, return_value=None)
+	async def test_disconnect_cancels_batch(self, _redis):
+		"""Cancelling the request (client gone) sets the cancel event the running batch polls."""
+		from django.test import AsyncRequestFactory
+		from .views import solve_partial_batch_async
+		started, cancelled = threading.Event(), threading.Event()
+
+		class SlowSession:
+			def next_batch(self, batch_size=24, max_time=None, cancel=None, start=None):
+				started.set()
+				if cancel.wait(5):
+					cancelled.set()
+				return [], 0, False, True
+
+		request = AsyncRequestFactory().post(f'/api/async/solve/{self.record.pk}/', json.dumps({'action': 'next'}),
+		                                     content_type='application/json')
+		with mock.patch('kanoodleApp.views.get_session', return_value=SlowSession()):
+			task = asyncio.ensure_future(solve_partial_batch_async(request, self.record.pk))
+			while not started.is_set():
+				await asyncio.sleep(0.01)
+			task.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await task
+		self.assertTrue(await sync_to_async(cancelled.wait)(5))
+
+	async def test_pieces_conditional_get(self):
+		resp = await self.async_client.get('/api/async/pieces/')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.json()['pieces']), 4)
+		etag = resp['ETag']
+		self.assertEqual((await self.async_client.get('/api/async/pieces/', headers={'If-None-Match': etag})).status_code, 304)
+		self.assertEqual((await self.async_client.post('/api/async/pieces/')).status_code, 405)
+
+class WarmStartTests(TestCase):
+	def test_placement_table_matches_generated_placements(self):
+		"""Filtering the empty-board table yields the same solutions, in order, as fresh generation."""
+		partial = [[1, 1, 0, 0], [0, 0, 0, 0]]
+		plain = solverKanoodle(4, 2, DOMINOES)
+		table = plain.build_placement_table()
+		warm = solverKanoodle(4, 2, DOMINOES, placement_table=table)
+		a = plain.solvePartial(partial, max_samples=1000)
+		b = warm.solvePartial(partial, max_samples=1000)
+		self.assertEqual([s['board'] for s in a['solutions']], [s['board'] for s in b['solutions']])
+		self.assertGreater(a['solutionCount'], 0)
+
+	def test_snapshot_round_trip(self):
+		import os, tempfile
+		invalidate_catalogue()
+		Piece.objects.create(name='Domino', shapeData=[[0, 0], [1, 0]])
+		catalogue = get_catalogue()
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'warm.pkl')
+			self.assertEqual(write_snapshot(path, [(2, 1)], catalogue), 1)
+			expected = _TABLES.pop((2, 1, catalogue.digest))
+			self.assertEqual(load_snapshot(path), 1)
+		self.assertEqual(_TABLES[(2, 1, catalogue.digest)], expected)
+		invalidate_catalogue()
+		with mock.patch('kanoodleApp.catalogue.generate_orientations') as generate:
+			self.assertEqual(get_catalogue().orientations, catalogue.orientations)
+		generate.assert_not_called()
+
+class PuzzleGeneratorTests(TestCase):
+	def test_generated_puzzle_is_unique(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		puzzle = PuzzleGenerator(solver).generate(1, random.Random(5))
+		self.assertEqual(solver.solvePartial(puzzle['board'])['solutionCount'], 1)
+		self.assertEqual(solver.solvePartial(puzzle['board'])['solutions'][0]['board'], puzzle['solution'])
+
+	def test_swappable_pieces_never_unique(self):
+		# Any two dominoes left for the player can be swapped.
+		self.assertEqual(generate_puzzles(solverKanoodle(4, 2, DOMINOES), 2, 2, seed=1, max_attempts=3), [None, None])
+
+	def test_selection_restores_matrix(self):
+		generator = PuzzleGenerator(solverKanoodle(4, 2, DOMINOES))
+		rows = generator.dlx.random_solution(random.Random(2))
+		self.assertEqual(generator.count_completions(rows[:3], limit=None), 1)
+		self.assertEqual(sum(1 for _ in generator.dlx.search_generator()), 120)
+
+class HintTests(TestCase):
+	def test_counts_partition_all_solutions(self):
+		hint = solverKanoodle(4, 2, DOMINOES).hint(None, 1, cap=1000)
+		self.assertEqual(len(hint['placements']), 10)
+		self.assertEqual(sum(p['solutions'] for p in hint['placements']), 120)
+		counts = [p['solutions'] for p in hint['placements']]
+		self.assertEqual(counts, sorted(counts, reverse=True))
+		self.assertFalse(hint['timedOut'])
+
+	def test_pool_and_cap(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		inline = solver.hint(None, 2, cap=5)
+		self.assertLessEqual(max(p['solutions'] for p in inline['placements']), 5)
+		self.assertTrue(all(p['capped'] == (p['solutions'] == 5) for p in inline['placements']))
+		self.assertEqual(solver.hint(None, 2, cap=5, workers=2)['placements'], inline['placements'])
+
+	def test_placed_piece_rejected(self):
+		board = [[1, 1, 0, 0], [0, 0, 0, 0]]
+		self.assertEqual(solverKanoodle(4, 2, DOMINOES).hint(board, 1)['placements'], [])
+
+	@mock.patch('kanoodleApp.views.get_redis_client', return_value=None)
+	def test_endpoint_coerces_piece_id(self, _redis):
+		domino_catalogue()
+		record = solve_record()
+		piece_id = get_catalogue().pieces[0]['id']
+		resp = self.client.post(f'/api/solve/{record.pk}/', json.dumps({'action': 'hint', 'pieceId': str(piece_id)}),
+		                        content_type='application/json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.json()['placements']), 10)
+		for bad in ('first', None, [1]):
+			resp = self.client.post(f'/api/solve/{record.pk}/', json.dumps({'action': 'hint', 'pieceId': bad}),
+			                        content_type='application/json')
+			self.assertEqual(resp.status_code, 400)
+
+class SamplingTests(TestCase):
+	def test_exact_counts_give_uniform_draws(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		all_boards = {board_hash(s['board']) for s in solver.solvePartial(None, max_samples=1000)['solutions']}
+		drawn = [board_hash(s['board']) for s in solver.sample(None, samples=1200, seed=11, cap=1000)['solutions']]
+		counts = {h: drawn.count(h) for h in all_boards}
+		self.assertEqual(set(drawn), all_boards)
+		self.assertLess(max(counts.values()), 25)
+
+	def test_seed_reproduces_sample(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		first = solver.sample(None, samples=5, seed=3, cap=4)
+		self.assertEqual(solver.sample(None, samples=5, seed=3, cap=4)['solutions'], first['solutions'])
+		self.assertEqual(first['seed'], 3)
+		dlx = solver._build_matrix(None)[1]
+		dlx.sample_solution(random.Random(1), cap=4)
+		self.assertEqual(sum(1 for _ in dlx.search_generator()), 120)
+
+	@mock.patch('kanoodleApp.views.get_redis_client', return_value=None)
+	def test_samples_and_batch_size_clamped(self, _redis):
+		from django.test import override_settings
+		from .views import _one_shot_job
+		solver = solverKanoodle(4, 2, DOMINOES)
+		domino_catalogue()
+		record = solve_record()
+		with override_settings(KANOODLE_MAX_SAMPLES=4, KANOODLE_MAX_BATCH_SIZE=3):
+			fn, args = _one_shot_job('sample', {'samples': 10 ** 9, 'seed': 1}, solver, None, None, 'test:sample')
+			self.assertEqual(fn(*args)['solutionCount'], 4)
+			fn, args = _one_shot_job('page', {'batchSize': 10 ** 9}, solver, None, None, 'test:page')
+			self.assertEqual(len(fn(*args)['solutions']), 3)
+			resp = self.client.post(f'/api/solve/{record.pk}/', json.dumps({'action': 'init', 'batchSize': 10 ** 9}),
+			                        content_type='application/json')
+			self.assertEqual(resp.json()['solutionsReturned'], 3)
+			resp = self.client.post(f'/api/solve/{record.pk}/', json.dumps({'action': 'next', 'batchSize': 'all'}),
+			                        content_type='application/json')
+			self.assertEqual(resp.status_code, 400)
+
+class RankPagingTests(TestCase):
+	def setUp(self):
+		self.solver = solverKanoodle(4, 2, DOMINOES)
+		self.order = [s['board'] for s in self.solver.solvePartial(None, max_samples=1000)['solutions']]
+
+	def test_unrank_and_rank_match_search_order(self):
+		self.assertEqual(self.solver.count(None), 120)
+		for k in (0, 1, 37, 119):
+			self.assertEqual(self.solver.solution_at(None, k), self.order[k])
+			self.assertEqual(self.solver.rank(None, self.order[k]), k)
+		self.assertIsNone(self.solver.solution_at(None, 120))
+		self.assertIsNone(self.solver.rank(None, [[1, 1, 1, 1], [2, 2, 2, 2]]))
+
+	def test_page_resumes_like_a_session(self):
+		page = self.solver.page(None, 50, 10)
+		self.assertEqual([s['board'] for s in page['solutions']], self.order[50:60])
+		self.assertEqual(page['solutionCount'], 120)
+		sess = SolverSession(self.solver, None, resume_token=page['resumeToken'])
+		self.assertEqual(sess.next_solution()['board'], self.order[60])
+		self.assertTrue(self.solver.page(None, 115, 10)['exhausted'])
+
+	def test_counting_resumes_after_deadline(self):
+		_RANK_MEMOS.clear()
+		self.assertTrue(self.solver.page(None, 5, 1, max_time=1e-6)['timedOut'])
+		self.assertEqual(self.solver.page(None, 5, 1)['solutions'][0]['board'], self.order[5])
+
+	@mock.patch('kanoodleApp.views.get_redis_client', return_value=None)
+	def test_endpoint_rejects_bad_offsets(self, _redis):
+		domino_catalogue()
+		record = solve_record()
+		for offset, status in ((5, 200), (-1, 400), ('fifth', 400)):
+			resp = self.client.post(f'/api/solve/{record.pk}/', json.dumps({'action': 'page', 'offset': offset}),
+									content_type='application/json')
+			self.assertEqual(resp.status_code, status, offset)
+
+	def test_memos_are_bounded_by_entries(self):
+		from django.test import override_settings
+		_RANK_MEMOS.clear()
+		opening = [[0, 0, 0, 0], [0, 0, 0, 0]]
+		opening[0][:2] = self.order[0][0][:2]
+		with override_settings(KANOODLE_RANK_MEMO_ENTRIES=4):
+			self.assertEqual(self.solver.count(None), 120)
+			self.assertEqual(self.solver.page(None, 7, 1)['solutions'][0]['board'], self.order[7])
+			self.assertEqual([len(m) for m in _RANK_MEMOS.values()], [4])
+			self.assertEqual(self.solver.count(opening), self.solver.count(opening))
+			self.assertEqual(len(_RANK_MEMOS), 1)
+			self.assertLessEqual(len(next(iter(_RANK_MEMOS.values()))), 4)
+
+L_SET = [
+	{'id': 1, 'name': 'L1', 'shapeData': [(0, 0), (0, 1), (0, 2), (1, 2)]},
+	{'id': 2, 'name': 'L2', 'shapeData': [(0, 0), (0, 1), (0, 2), (1, 2)]},
+	{'id': 3, 'name': 'D3', 'shapeData': [(0, 0), (1, 0)]},
+	{'id': 4, 'name': 'D4', 'shapeData': [(0, 0), (1, 0)]},
+]
+
+@skipUnless(aggregate_np is not None, "NumPy not installed")
+class AggregateTests(TestCase):
+	def _brute(self, solver, board):
+		heat = [[[0] * 4 for _ in range(4)] for _ in range(3)]
+		contacts = [[0] * 4 for _ in range(4)]
+		solutions = solver.solvePartial(board, max_samples=10000)['solutions']
+		for sol in solutions:
+			b = sol['board']
+			pairs = set()
+			for y in range(3):
+				for x in range(4):
+					heat[y][x][b[y][x] - 1] += 1
+					if x < 3 and b[y][x + 1] != b[y][x]:
+						pairs.add(frozenset((b[y][x], b[y][x + 1])))
+					if y < 2 and b[y + 1][x] != b[y][x]:
+						pairs.add(frozenset((b[y][x], b[y + 1][x])))
+			for a, c in map(tuple, pairs):
+				contacts[a - 1][c - 1] += 1
+				contacts[c - 1][a - 1] += 1
+		return len(solutions), heat, contacts
+
+	def test_symmetry_weighted_counts_match_enumeration(self):
+		solver = solverKanoodle(4, 3, L_SET)
+		count, heat, contacts = self._brute(solver, None)
+		result = aggregate_solutions(solver, None)
+		self.assertEqual(result['symmetry'], 4)
+		self.assertEqual(result['solutionCount'], count)
+		self.assertEqual(result['cellPieceCounts'].tolist(), heat)
+		self.assertEqual(result['contacts'].tolist(), contacts)
+
+	def test_sharded_with_placed_piece(self):
+		solver = solverKanoodle(4, 3, L_SET)
+		board = [[3, 3, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
+		count, heat, contacts = self._brute(solver, board)
+		result = aggregate_solutions(solver, board, workers=2)
+		self.assertEqual(result['symmetry'], 1)
+		self.assertEqual(result['solutionCount'], count)
+		self.assertEqual(result['cellPieceCounts'].tolist(), heat)
+		self.assertEqual(result['contacts'].tolist(), contacts)
+
+class ConstraintTests(TestCase):
+	def _cells(self, board, piece_id):
+		return {(x, y) for y, row in enumerate(board) for x, cell in enumerate(row) if cell == piece_id}
+
+	def _touch(self, board, a, b):
+		cells_b = self._cells(board, b)
+		return any((x + dx, y + dy) in cells_b for x, y in self._cells(board, a) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)))
+
+	def _check(self, solver, board, rules, keep):
+		every = [s['board'] for s in solver.solvePartial(board, max_samples=10000)['solutions']]
+		result = solver.solvePartial(board, max_samples=10000, all_required_constraints=rules)
+		expected = sorted(board_hash(b) for b in every if keep(b))
+		self.assertGreater(len(expected), 0)
+		self.assertLess(len(expected), len(every))
+		self.assertEqual(sorted(board_hash(s['board']) for s in result['solutions']), expected)
+		self.assertEqual(result['solutionCount'], len(expected))
+
+	def test_single_piece_rules_match_filtering(self):
+		solver = solverKanoodle(4, 3, L_SET)
+		self._check(solver, None, [{'type': 'cell', 'cell': [0, 0], 'pieces': [3, 4]}],
+					lambda b: b[0][0] in (3, 4))
+		self._check(solver, None, [{'type': 'edge', 'piece': 1, 'edge': 'right'},
+								   {'type': 'region', 'piece': 3, 'cells': [[0, 0], [1, 0], [2, 0], [3, 0]], 'mode': 'avoids'}],
+					lambda b: any(row[3] == 1 for row in b) and 3 not in b[0])
+
+	def test_pair_rules_match_filtering(self):
+		solver = solverKanoodle(4, 3, L_SET)
+		self._check(solver, None, [{'type': 'adjacent', 'pieces': [3, 4]}], lambda b: self._touch(b, 3, 4))
+		self._check(solver, None, [{'type': 'apart', 'pieces': [1, 3]}, {'type': 'adjacent', 'pieces': [1, 4]}],
+					lambda b: not self._touch(b, 1, 3) and self._touch(b, 1, 4))
+		board = [[3, 3, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
+		self._check(solver, board, [{'type': 'apart', 'pieces': [3, 4]}], lambda b: not self._touch(b, 3, 4))
+
+	def test_broken_and_malformed_rules(self):
+		solver = solverKanoodle(4, 3, L_SET)
+		board = [[3, 3, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
+		broken = solver.solvePartial(board, all_required_constraints=[{'type': 'cell', 'cell': [0, 0], 'piece': 4}])
+		self.assertEqual(broken['solutions'], [])
+		self.assertIn('cell [0, 0]', broken['message'])
+		for rules in ([{'type': 'cell', 'cell': [9, 9], 'piece': 1}], [{'type': 'adjacent', 'pieces': [1, 1]}],
+					  [{'type': 'nearby'}], {'type': 'edge'}, [{'type': 'edge', 'piece': 9, 'edge': 'top'}],
+					  [{'type': 'adjacent', 'pieces': ['3', 4]}], [{'type': 'cell', 'cell': [0, 0]}]):
+			self.assertTrue(solver.solvePartial(None, all_required_constraints=rules)['message'].startswith('Invalid constraints'))
+
+	def test_ragged_board_and_rebinding(self):
+		from .constraints import compile_constraints
+		solver = solverKanoodle(4, 3, L_SET)
+		rules = [{'type': 'cell', 'cell': [3, 2], 'pieces': [3, 4]}]
+		self._check(solver, [[0]], rules, lambda b: b[2][3] in (3, 4))
+		constraints = compile_constraints([{'type': 'apart', 'pieces': [3, 4]}], 4, 3)
+		board = [[3, 3, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
+		first = solver.solvePartial(board, max_samples=1000, all_required_constraints=constraints)
+		second = solver.solvePartial(board, max_samples=1000, all_required_constraints=constraints)
+		self.assertEqual(second['solutions'], first['solutions'])
+		self.assertEqual((len(constraints.piece_rules), len(constraints.pair_rules)), (0, 1))
+
+	@mock.patch('kanoodleApp.views.get_redis_client', return_value=None)
+	def test_endpoint_rejects_unknown_pieces_and_unconstrained_actions(self, _redis):
+		domino_catalogue()
+		record = solve_record()
+		piece_id = get_catalogue().pieces[0]['id']
+		cases = [
+			({'sampleLimit': 5, 'constraints': [{'type': 'edge', 'piece': piece_id, 'edge': 'top'}]}, 200),
+			({'constraints': [{'type': 'edge', 'piece': str(piece_id), 'edge': 'top'}]}, 400),
+			({'constraints': [{'type': 'edge', 'piece': piece_id + 100, 'edge': 'top'}]}, 400),
+			({'action': 'sample', 'constraints': [{'type': 'edge', 'piece': piece_id, 'edge': 'top'}]}, 400),
+			({'action': 'init', 'constraints': [{'type': 'edge', 'piece': piece_id, 'edge': 'top'}]}, 400),
+		]
+		for body, status in cases:
+			resp = self.client.post(f'/api/solve/{record.pk}/', json.dumps(body), content_type='application/json')
+			self.assertEqual(resp.status_code, status, body)
+
+def lattice_distances(cells):
+	# Squared sphere-centre distances, scaled by 4 to stay integral.
+	out = []
+	for i, a in enumerate(cells):
+		for b in cells[i + 1:]:
+			dx, dy, dz = (b[k] - a[k] for k in range(len(a))) if len(a) == 3 else (b[0] - a[0], b[1] - a[1], 0)
+			out.append((2 * dx + dz) ** 2 + (2 * dy + dz) ** 2 + 2 * dz * dz)
+	return sorted(out)
+
+PYRAMID_SET = [
+	{'id': 1, 'name': 'L1', 'shapeData': [(0, 0), (0, 1), (0, 2), (1, 2)]},
+	{'id': 2, 'name': 'T2', 'shapeData': [(0, 0), (1, 0), (2, 0), (1, 1)]},
+	{'id': 3, 'name': 'V3', 'shapeData': [(0, 0), (0, 1), (1, 1)]},
+	{'id': 4, 'name': 'V4', 'shapeData': [(0, 0), (0, 1), (1, 1)]},
+]
+
+class PyramidTests(TestCase):
+	def test_lattice_orientations(self):
+		counts = {((0, 0), (1, 0)): 6, ((0, 0), (1, 0), (2, 0)): 6, ((0, 0), (0, 1), (1, 1)): 12,
+				  ((0, 0), (0, 1), (1, 0), (1, 1)): 3, ((0, 0), (0, 1), (0, 2), (1, 2)): 24}
+		for shape, expected in counts.items():
+			orientations = lattice_orientations(shape)
+			self.assertEqual(len(orientations), expected)
+			self.assertIs(lattice_orientations(list(shape)), orientations)
+			for cells in orientations:
+				self.assertEqual(lattice_distances(list(cells)), lattice_distances(list(shape)))
+
+	def test_bitmask_search_matches_dlx(self):
+		solver = PyramidSolver(3, PYRAMID_SET)
+		found = [solver.board(None, ids) for ids in solver.iter_solutions()]
+		_, dlx, placement_info, error = solver._build_matrix()
+		self.assertIsNone(error)
+		self.assertEqual(len(found), dlx.search([], lambda rows: None))
+		self.assertGreater(len(found), 0)
+		for layers in found:
+			for piece in PYRAMID_SET:
+				cells = [(x, y, z) for z, layer in enumerate(layers) for y, row in enumerate(layer)
+						 for x, cell in enumerate(row) if cell == piece['id']]
+				self.assertEqual(lattice_distances(cells), lattice_distances(piece['shapeData']))
+
+	def test_partial_layers_and_limits(self):
+		solver = PyramidSolver(3, PYRAMID_SET)
+		full = solver.solvePartial(None, max_samples=1000)
+		first = full['solutions'][0]['layers']
+		apex = first[2][0][0]
+		partial = [[[cell if cell == apex else 0 for cell in row] for row in layer] for layer in first]
+		result = solver.solvePartial(partial, max_samples=1000)
+		self.assertEqual(result['solutionCount'], sum(
+			all(s['layers'][z][y][x] == cell for z, layer in enumerate(partial) for y, row in enumerate(layer)
+				for x, cell in enumerate(row) if cell) for s in full['solutions']))
+		self.assertLess(result['solutionCount'], full['solutionCount'])
+		self.assertTrue(solver.solvePartial(None, max_samples=1)['limitReached'])
+		self.assertIn('Expected 3', solver.solvePartial([[[0]]])['message'])
+
+	def test_pyramid_endpoint(self):
+		invalidate_catalogue()
+		Piece.objects.create(name='V', shapeData=[[0, 0], [0, 1], [1, 1]])
+		Piece.objects.create(name='Domino', shapeData=[[0, 0], [1, 0]])
+		resp = self.client.post('/api/pyramid/solve/', json.dumps({'size': 2}), content_type='application/json')
+		data = resp.json()
+		self.assertEqual(resp.status_code, 200)
+		self.assertGreater(data['solutionCount'], 0)
+		self.assertEqual([len(layer) for layer in data['solutions'][0]['layers']], [2, 1])
+		resp = self.client.post('/api/pyramid/solve/', json.dumps({'size': 99}), content_type='application/json')
+		self.assertEqual(resp.status_code, 400)
+		for body in ({'size': 'big'}, {'size': 2, 'layers': [1, 2]}, {'size': 2, 'layers': 'ab'},
+					 {'size': 2, 'layers': [[[0, 0], [0, 0]], [['x']]]}, {'size': 2, 'sampleLimit': 'all'}):
+			resp = self.client.post('/api/pyramid/solve/', json.dumps(body), content_type='application/json')
+			self.assertEqual(resp.status_code, 400, body)
+
+	def test_tables_are_bounded(self):
+		from . import pyramid
+		catalogue = mock.Mock(pieces=[{'id': 1, 'name': 'Domino', 'shapeData': [(0, 0), (1, 0)]}])
+		with mock.patch.object(pyramid, '_TABLES', {}) as tables, mock.patch.object(pyramid, '_TABLES_MAX', 2):
+			for digest in 'abc':
+				catalogue.digest = digest
+				pyramid.get_pyramid_table(2, catalogue)
+			self.assertEqual(list(tables), [(2, 'b'), (2, 'c')])
+
+class BoardMaskTests(TestCase):
+	MASK = ['.####', '#####', '###..']
+
+	def _holes_filled(self, value):
+		return [[0 if cell == '#' else value for cell in row] for row in self.MASK]
+
+	def test_mask_parsing(self):
+		self.assertEqual(mask_cells(2, 2, ['#.', '##']), frozenset({(0, 0), (0, 1), (1, 1)}))
+		self.assertEqual(mask_cells(2, 2, [[1, 0], [1, 1]]), mask_cells(2, 2, ['#.', '##']))
+		self.assertIsNone(mask_cells(2, 2, ['##', '##']))
+		self.assertIsNone(mask_cells(2, 2, None))
+
+	def test_masked_board_matches_dummy_filled_board(self):
+		masked = solverKanoodle(5, 3, L_SET, mask=self.MASK)
+		dummy = solverKanoodle(5, 3, L_SET)
+		expected = sorted(board_hash(self._strip(s['board'])) for s in dummy.solvePartial(self._holes_filled(99), max_samples=1000)['solutions'])
+		found = masked.solvePartial(None, max_samples=1000)
+		self.assertGreater(found['solutionCount'], 0)
+		self.assertEqual(sorted(board_hash(s['board']) for s in found['solutions']), expected)
+		table = masked.build_placement_table()
+		self.assertTrue(all(pos in masked.mask for entries in table.values() for _, positions in entries for pos in positions))
+		self.assertLess(sum(map(len, table.values())), sum(map(len, dummy.build_placement_table().values())))
+
+	def _strip(self, board):
+		return [[0 if cell == 99 else cell for cell in row] for row in board]
+
+	def test_cache_keys_are_mask_aware(self):
+		plain = make_cache_keys(5, 3, None, L_SET)
+		masked = make_cache_keys(5, 3, None, L_SET, mask=self.MASK)
+		self.assertNotEqual(plain, masked)
+		self.assertEqual(make_cache_keys(5, 3, self._holes_filled(99), L_SET, mask=self.MASK), masked)
+		self.assertEqual(make_cache_keys(5, 3, None, L_SET, mask=['#####'] * 3), plain)
+		solver = solverKanoodle(5, 3, L_SET, mask=self.MASK)
+		self.assertEqual(solver.fingerprint(self._holes_filled(7)), solver.fingerprint(None))
+
+	def test_symmetries_respect_mask(self):
+		empty = [[0] * 5 for _ in range(3)]
+		self.assertEqual(len(board_symmetries(5, 3, empty)), 4)
+		self.assertEqual(len(board_symmetries(5, 3, empty, mask_cells(5, 3, self.MASK))), 1)
+
+class NQueensTests(TestCase):
+	def setUp(self):
+		# Shard counts otherwise persist in Redis across runs.
+		no_redis = mock.patch('kanoodleApp.nqueens.get_redis_client', return_value=None)
+		no_redis.start()
+		self.addCleanup(no_redis.stop)
+
+	def _brute_force(self, n):
+		return [p for p in itertools.permutations(range(n))
+				if len({c + r for r, c in enumerate(p)}) == n == len({c - r for r, c in enumerate(p)})]
+
+	def test_counts_and_order_match_brute_force(self):
+		for n in range(1, 9):
+			expected = self._brute_force(n)
+			self.assertEqual(count_solutions(n)['count'], len(expected))
+			self.assertEqual(list(iter_solutions(n)), expected)
+		self.assertEqual(count_solutions(10, workers=2)['count'], 724)
+
+	def test_timed_out_count_resumes_from_finished_shards(self):
+		_SHARDS.pop(11, None)
+		clock = itertools.chain([0, 0, 0], itertools.repeat(1e9))
+		with mock.patch('kanoodleApp.nqueens.time.time', side_effect=clock):
+			partial = count_solutions(11, max_time=1)
+		self.assertTrue(partial['timedOut'])
+		self.assertIsNone(partial['count'])
+		self.assertLess(partial['shardsDone'], partial['shards'])
+		with mock.patch('kanoodleApp.nqueens.count_prefix', side_effect=count_prefix) as counted:
+			self.assertEqual(count_solutions(11)['count'], 2680)
+		self.assertEqual(counted.call_count, partial['shards'] - partial['shardsDone'])
+
+	def test_cursor_paging(self):
+		solutions = list(iter_solutions(8))
+		self.assertEqual(list(iter_solutions(8, solutions[40])), solutions[41:])
+		with self.assertRaises(ValueError):
+			list(iter_solutions(8, (0, 1)))
+
+	def test_endpoints(self):
+		resp = self.client.post('/api/nqueens/count/', json.dumps({'n': 8}), content_type='application/json')
+		self.assertEqual(resp.json()['count'], 92)
+		resp = self.client.post('/api/nqueens/count/', json.dumps({'n': 99}), content_type='application/json')
+		self.assertEqual(resp.status_code, 400)
+		pages = []
+		after = None
+		while True:
+			data = self.client.post('/api/nqueens/solutions/', json.dumps({'n': 6, 'limit': 3, 'after': after}),
+									content_type='application/json').json()
+			pages += data['solutions']
+			after = data['next']
+			if after is None:
+				break
+		self.assertEqual(pages, [[c + 1 for c in p] for p in self._brute_force(6)])
+		resp = self.client.post('/api/nqueens/solutions/', json.dumps({'n': 6, 'stream': True}),
+								content_type='application/json')
+		lines = b''.join(resp.streaming_content).decode().splitlines()
+		self.assertEqual([json.loads(line) for line in lines], pages)
+
+	def test_endpoints_cap_max_time(self):
+		from django.test import override_settings
+		with override_settings(KANOODLE_NQUEENS_MAX_TIME=5), \
+				mock.patch('kanoodleApp.views.count_solutions', return_value={'n': 12}) as counted:
+			self.client.post('/api/nqueens/count/', json.dumps({'n': 12}), content_type='application/json')
+			self.client.post('/api/nqueens/count/', json.dumps({'n': 12, 'maxTime': 10 ** 9}),
+							 content_type='application/json')
+			self.client.post('/api/nqueens/count/', json.dumps({'n': 12, 'maxTime': 2}), content_type='application/json')
+		self.assertEqual([call.args[1] for call in counted.call_args_list], [5, 5, 2])
+		clock = itertools.chain([0, 0, 0, 0], itertools.repeat(1e9))
+		with mock.patch('kanoodleApp.views.time.monotonic', side_effect=clock):
+			resp = self.client.post('/api/nqueens/solutions/', json.dumps({'n': 12, 'stream': True}),
+									content_type='application/json')
+			lines = b''.join(resp.streaming_content).decode().splitlines()
+		self.assertEqual([json.loads(line) for line in lines], [[c + 1 for c in p] for p in itertools.islice(iter_solutions(12), 3)])
+
+class ExactCoverTests(TestCase):
+	def _queens(self, n):
+		"""N-Queens as exact cover: ranks and files primary, diagonals secondary."""
+		rows = {f"{r},{c}": [f"R{r}", f"F{c}", f"A{r + c}", f"B{r - c}"] for r in range(n) for c in range(n)}
+		secondary = [f"A{i}" for i in range(2 * n - 1)] + [f"B{i}" for i in range(1 - n, n)]
+		return [f"R{i}" for i in range(n)] + [f"F{i}" for i in range(n)], rows, secondary
+
+	def test_secondary_columns_match_queens_counts(self):
+		for n in range(1, 8):
+			solver = ExactCoverSolver(*self._queens(n))
+			result = solver.solvePartial(None, max_samples=1000)
+			self.assertEqual(result['solutionCount'], len(list(iter_solutions(n))))
+			self.assertEqual(solver.count(None), result['solutionCount'])
+		# Without the diagonals as secondary columns this is just rook placement.
+		columns, rows, _ = self._queens(4)
+		rooks = ExactCoverSolver(columns, {k: v[:2] for k, v in rows.items()})
+		self.assertEqual(rooks.count(None), 24)
+
+	def test_selected_rows(self):
+		solver = ExactCoverSolver(*self._queens(6))
+		result = solver.solvePartial(['0,1'], max_samples=100)
+		self.assertEqual(result['solutionCount'], 1)
+		self.assertEqual(sorted(result['solutions'][0]['rows']), ['0,1', '1,3', '2,5', '3,0', '4,2', '5,4'])
+		self.assertIn('overlap', solver.solvePartial(['0,1', '0,2'])['message'])
+		with self.assertRaises(ValueError):
+			ExactCoverSolver(['a'], {'r': ['a', 'b']})
+		for selected in (['9,9'], ['0,1', '0,2']):
+			with self.assertRaises(ValueError):
+				solver.count(selected)
+
+	def test_endpoint_paging(self):
+		columns, rows, secondary = self._queens(6)
+		body = {'columns': columns, 'rows': rows, 'secondary': secondary, 'batchSize': 3}
+		data = self.client.post('/api/exactcover/solve/', json.dumps(dict(body, action='init')),
+								content_type='application/json').json()
+		pages = data['solutions']
+		token = data['resumeToken']
+		while token:
+			data = self.client.post('/api/exactcover/solve/', json.dumps(dict(body, action='next', resumeToken=token)),
+									content_type='application/json').json()
+			pages += data['solutions']
+			token = data['resumeToken']
+		self.assertEqual(len(pages), 4)
+		self.assertEqual(data['solutionCount'], 4)
+		resp = self.client.post('/api/exactcover/solve/', json.dumps(dict(body, action='count')),
+								content_type='application/json')
+		self.assertEqual(resp.json()['solutionCount'], 4)
+		resp = self.client.post('/api/exactcover/solve/', json.dumps(dict(body, action='count', selected=['9,9'])),
+								content_type='application/json')
+		self.assertEqual(resp.status_code, 400)
+		resp = self.client.post('/api/exactcover/solve/', json.dumps({'columns': ['a'], 'rows': {'r': ['b']}}),
+								content_type='application/json')
+		self.assertEqual(resp.status_code, 400)
+
+class WarmCacheTests(TestCase):
+	def test_worker_caches_prefix_and_exhaustion(self):
+		from .management.commands.warm_cache import _solve_opening
+		expected = solverKanoodle(4, 2, DOMINOES).solvePartial(None, max_samples=1000)['solutions']
+		boards, total, exhausted = _solve_opening((4, 2, None, DOMINOES, None, None, 10, 0))
+		self.assertEqual((len(boards), total, exhausted), (10, 10, False))
+		self.assertEqual(boards, [s['board'] for s in expected[:10]])
+		boards, total, exhausted = _solve_opening((4, 2, None, DOMINOES, None, None, 1000, 0))
+		self.assertEqual((total, exhausted), (120, True))
+
+	@skipUnless(fakeredis, "fakeredis not installed")
+	def test_checkpoint_rewarms_expired_openings(self):
+		import io, os, tempfile
+		from django.core.management import call_command
+		domino_catalogue()
+		board = solve_record().board
+		redis_client = fakeredis.FakeRedis(decode_responses=True)
+		with tempfile.TemporaryDirectory() as tmp, \
+				mock.patch('kanoodleApp.management.commands.warm_cache.get_redis_client', return_value=redis_client):
+			boards = os.path.join(tmp, 'boards.json')
+			with open(boards, 'w') as f:
+				json.dump([None], f)
+			args = ('warm_cache', '--boards', boards, '--board-id', str(board.pk), '--limit', '5', '--workers', '1',
+					'--checkpoint', os.path.join(tmp, 'done.json'))
+			runs = []
+			for expire in (False, False, True):
+				if expire:
+					redis_client.flushall()
+				out = io.StringIO()
+				call_command(*args, stdout=out)
+				runs.append(out.getvalue().splitlines()[0])
+		self.assertEqual([run.split(' opening')[0] for run in runs], ['Warming 1', 'Warming 0', 'Warming 1'])
+		self.assertEqual(redis_client.llen(make_cache_keys(4, 2, None, get_catalogue().pieces)[0]), 5)
+
+class ShardedEnumerationTests(TestCase):
+	def test_shards_concatenate_to_full_order(self):
+		solver = solverKanoodle(4, 2, DOMINOES)
+		expected = [b for b, _ in solver.iter_solutions(None)]
+		self.assertEqual(len(expected), 120)
+		for depth in (1, 2):
+			merged = []
+			for prefix in solver.shard_prefixes(None, depth=depth):
+				merged.extend(b for b, _ in solver.iter_solutions(None, start_path=prefix, pinned=len(prefix)))
+			self.assertEqual(merged, expected)
+
+	def test_shard_resumes_from_checkpoint(self):
+		import json, os, tempfile
+		from .management.commands.enumerate_solutions import _run_shard
+		from .util import board_to_string, next_start_path
+		solver = solverKanoodle(4, 2, DOMINOES)
+		prefix = solver.shard_prefixes(None, depth=1)[0]
+		sols = list(solver.iter_solutions(None, start_path=prefix, pinned=1))
+		lines = [board_to_string(b) + '\n' for b, _ in sols]
+		with tempfile.TemporaryDirectory() as tmp:
+			k = 3
+			with open(os.path.join(tmp, 's.txt'), 'w') as f:
+				f.write(''.join(lines[:k]) + 'partial-line-from-killed-run')
+			with open(os.path.join(tmp, 's.json'), 'w') as f:
+				json.dump({'prefix': prefix, 'count': k, 'offset': len(''.join(lines[:k])),
+						   'next_path': next_start_path(sols[k - 1][1]), 'done': False}, f)
+			name, count = _run_shard((4, 2, None, DOMINOES, None, None, prefix, tmp, 's', 2))
+			with open(os.path.join(tmp, 's.txt')) as f:
+				self.assertEqual(f.read(), ''.join(lines))
+		self.assertEqual(count, len(sols))
+
+class CaptureTests(TestCase):
+	def test_capture_and_replay(self):
+		import io, os, tempfile
+		from django.core.management import call_command
+		from django.test import override_settings
+		from . import capture
+		from .management.commands.replay_captures import replay
+		domino_catalogue()
+		record = solve_record()
+		with tempfile.TemporaryDirectory() as tmp, override_settings(KANOODLE_CAPTURE_RATE=1, KANOODLE_CAPTURE_DIR=tmp):
+			self.addCleanup(setattr, capture, '_LOGGER', None)
+			self.addCleanup(capture._CATALOGUES.clear)
+			pages = []
+			for body in ({'sampleLimit': 500}, {'sampleLimit': 5, 'maxTime': 60000}, {'action': 'progress'},
+						 {'action': 'init', 'batchSize': 7}, {'action': 'next', 'batchSize': 7}):
+				with mock.patch('kanoodleApp.views.get_redis_client', return_value=None):
+					resp = self.client.post(f'/api/solve/{record.pk}/', json.dumps(body), content_type='application/json')
+				self.assertEqual(resp.status_code, 200)
+				pages.append(resp.json().get('solutions'))
+			for handler in capture._LOGGER.handlers[:]:
+				handler.close()
+				capture._LOGGER.removeHandler(handler)
+			records = list(capture.read_records([os.path.join(tmp, 'requests.jsonl')]))
+			self.assertEqual([r['action'] for r in records], ['solve', 'solve', 'init', 'next'])
+			self.assertEqual(records[3]['offset'], 7)
+			self.assertEqual((records[0]['width'], records[0]['height'], records[0]['solutionCount']), (4, 2, 120))
+			self.assertGreater(records[0]['nodes'], 0)
+			self.assertTrue(records[1]['limitReached'])
+			self.assertEqual(capture.load_catalogue(tmp, records[0]['catalogue']), get_catalogue().pieces)
+			out = io.StringIO()
+			call_command('replay_captures', os.path.join(tmp, 'requests.jsonl'), '--json', stdout=out)
+		replayed = [json.loads(line) for line in out.getvalue().splitlines()[:-1]]
+		self.assertEqual([r['replayCount'] for r in replayed], [r['solutionCount'] for r in records])
+		self.assertEqual(replayed[0]['replayNodes'], records[0]['nodes'])
+		# The captured next carries no token; it replays from the recorded offset.
+		self.assertNotIn('resumeToken', records[3]['request'])
+		_, second, _ = replay(records[3], solverKanoodle, get_catalogue().pieces)
+		self.assertEqual(second['solutions'], pages[4])
+		self.assertNotEqual(second['solutions'], pages[3])
+
+class SolverPoolTests(TestCase):
+	def test_admission_control(self):
+		"""Beyond workers + queue the pool sheds load (503); per-client caps give 429."""
+		pool = SolverPool(max_workers=1, max_queue=1, per_client=1, retry_after_s=3)
+		gate = threading.Event()
+		running = [pool.submit(gate.wait, client='a'), pool.submit(gate.wait, client='b')]
+		with self.assertRaises(SolverOverloaded) as full:
+			pool.submit(gate.wait, client='c')
+		self.assertEqual((full.exception.status, full.exception.retry_after), (503, 3))
+		gate.set()
+		for f in running:
+			f.result()
+		blocker = threading.Event()
+		pool.submit(blocker.wait, client='a')
+		with self.assertRaises(SolverOverloaded) as per_client:
+			pool.submit(blocker.wait, client='a')
+		self.assertEqual(per_client.exception.status, 429)
+		blocker.set()
+		self.assertEqual(pool.run(lambda: 7, client='b'), 7)
+
+	def test_client_id_trusts_only_configured_proxies(self):
+		"""X-Forwarded-For is ignored unless the peer is a trusted proxy, and then read from the right."""
+		from django.test import override_settings
+		from .views import _client_id
+		factory = RequestFactory()
+		spoofed = factory.get('/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.9')
+		self.assertEqual(_client_id(spoofed), '10.0.0.5')
+		with override_settings(KANOODLE_TRUSTED_PROXIES=['10.0.0.0/8']):
+			self.assertEqual(_client_id(spoofed), '203.0.113.9')
+			chained = factory.get('/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.9, 10.1.1.1')
+			self.assertEqual(_client_id(chained), '203.0.113.9')
+			direct = factory.get('/', REMOTE_ADDR='198.51.100.7', HTTP_X_FORWARDED_FOR='1.2.3.4')
+			self.assertEqual(_client_id(direct), '198.51.100.7')
+
+	def test_process_slots_are_shared(self):
+		"""Concurrent reservations share max_processes slots; fewer than two free means run inline."""
+		pool = ProcessPool(max_processes=3)
+		with pool.reserve(2) as first:
+			with pool.reserve(2) as second:
+				self.assertEqual((first, second), (2, 0))
+				self.assertEqual(pool.stats()['busy'], 2)
+		with pool.reserve(1) as single:
+			self.assertEqual(single, 0)
+		with pool.reserve(5) as third:
+			self.assertEqual(third, 3)
+		self.assertEqual(pool.stats(), {'granted': 2, 'refused': 1, 'busy': 0, 'maxProcesses': 3})
+
+def setUpModule():
+	# Endpoint tests share the process-wide cursor store; flush it by hand
+	# (see tearDownModule) instead of from its timer thread.
+	get_cursor_store().flush_interval_s = 0
+
+def tearDownModule():
+	# Flush cursors the endpoint tests left in the shared store into the test
+	# database now, rather than into the real one at interpreter exit.
+	get_cursor_store().flush()
+	get_process_pool().shutdown()
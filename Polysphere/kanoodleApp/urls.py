@@ -4,5 +4,13 @@ from . import views
 urlpatterns = [
     path("", views.kanoodle_solver, name="index"),
     path('api/solve/<int:solution_id>/', views.solvePartialSolution, name='solve_api'),
+    path('api/solve/batch/', views.solve_batch, name='solve_batch_api'),
+    path('api/pyramid/solve/', views.solve_pyramid, name='pyramid_solve_api'),
+    path('api/nqueens/count/', views.count_queens, name='nqueens_count_api'),
+    path('api/nqueens/solutions/', views.queens_solutions, name='nqueens_solutions_api'),
+    path('api/exactcover/solve/', views.solve_exact_cover, name='exact_cover_api'),
     path('api/pieces/', views.getPiecesApi, name='pieces_api'),
+    path('api/async/solve/<int:solution_id>/', views.solve_partial_batch_async, name='solve_api_async'),
+    path('api/async/pieces/', views.get_pieces_async, name='pieces_api_async'),
+    path('api/sessions/stats/', views.get_session_stats, name='session_stats_api'),
 ]
\ No newline at end of file
@@ -3,10 +3,20 @@ import traceback
 import threading
 import json
 import hashlib
+import base64
+import math
+import random
+import weakref
+from collections import OrderedDict
+from .constraints import compile_constraints
 try:
     import redis  
 except Exception:
     redis = None
+try:
+    import redis.asyncio as aioredis
+except Exception:
+    aioredis = None
 
 
 
@@ -28,22 +38,132 @@ class ColumnNode(DancingLinksNode):
         self.column = self
 
 
+class SearchProgress:
+    """Cheap, pollable progress counters for one running search.
+
+    The search only bumps ``nodes``/``solutions`` and records the branch
+    index and column size for the first ``top_levels`` depths; the completion
+    fraction is derived from those indices when ``snapshot`` is read, so
+    polling never slows the search down. Below ``top_levels`` only every
+    ``sample_every``-th node reaches ``sample`` (so ``max_depth`` is the
+    deepest sampled node); the DLX searches count nodes inline and skip the
+    call for the rest. With ``deadline`` set, a sampled node past it raises
+    ``DeadlineReached``.
+    """
+
+    def __init__(self, top_levels=4, sample_every=256):
+        self.top_levels = top_levels
+        self.sample_every = sample_every
+        self.next_sample = sample_every
+        self.nodes = 0
+        self.solutions = 0
+        self.max_depth = 0
+        self.done = False
+        self.complete = False
+        self.finished = None
+        self.started = time.time()
+        self.branch = [(0, 1)] * top_levels
+        self.levels = 0
+        self.deadline = None
+
+    def enter(self, depth, index, size):
+        self.nodes += 1
+        if depth < self.top_levels or self.nodes >= self.next_sample:
+            self.sample(depth, index, size)
+
+    def sample(self, depth, index, size):
+        """Record a node already counted in ``nodes`` (see ``enter`` for when it is called)."""
+        if self.nodes >= self.next_sample:
+            self.next_sample = self.nodes + self.sample_every
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if depth < self.top_levels:
+            self.branch[depth] = (index, size)
+            self.levels = depth + 1
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise DeadlineReached()
+
+    def fraction(self):
+        if self.complete:
+            return 1.0
+        fraction = 0.0
+        scale = 1.0
+        for index, size in self.branch[:self.levels]:
+            fraction += scale * index / size
+            scale /= size
+        return fraction
+
+    def finish(self, complete=False):
+        self.complete = complete
+        self.finished = time.time()
+        self.done = True
+
+    def snapshot(self):
+        fraction = self.fraction()
+        elapsed = (self.finished or time.time()) - self.started
+        remaining = elapsed * (1 - fraction) / fraction if 0 < fraction < 1 and not self.done else None
+        return {
+            'nodes': self.nodes,
+            'solutions': self.solutions,
+            'maxDepth': self.max_depth,
+            'fraction': fraction,
+            'elapsedSeconds': elapsed,
+            'estimatedSecondsRemaining': remaining,
+            'done': self.done,
+            'complete': self.complete,
+        }
+
+
+class DeadlineReached(Exception):
+    pass
+
+
+class DeadlineProgress(SearchProgress):
+    """``SearchProgress`` that aborts the search by raising ``DeadlineReached``.
+
+    The matrix is left partly covered when that happens, so the caller must
+    discard it.
+    """
+
+    def __init__(self, deadline, check_every=1024):
+        super().__init__(top_levels=0, sample_every=check_every)
+        self.deadline = deadline
+
+    def sample(self, depth, index, size):
+        self.next_sample = self.nodes + self.sample_every
+        if time.time() >= self.deadline:
+            raise DeadlineReached()
+
+
 class DancingLinks:
+    """Exact cover matrix for Knuth's Algorithm X.
+
+    ``columns`` must each be covered by exactly one chosen row.
+    ``secondary`` columns may be covered at most once: they hang off their
+    own header, so the search never branches on them and a solution may
+    leave them uncovered, but choosing a row still removes every other row
+    that shares one.
+    """
 
-    def __init__(self, columns):
+    def __init__(self, columns, secondary=()):
         self.header = ColumnNode("header")
+        self.secondary = ColumnNode("secondary")
         self.columns = {}
-
-        prev = self.header
-        for col_name in columns:
-            col = ColumnNode(col_name)
-            self.columns[col_name] = col
-
-            col.left = prev
-            col.right = prev.right
-            prev.right.left = col
-            prev.right = col
-            prev = col
+        self.rows = {}
+        self.conflicts = {}
+
+        for header, names in ((self.header, columns), (self.secondary, secondary)):
+            prev = header
+            for col_name in names:
+                col = ColumnNode(col_name)
+                col.bit = 1 << len(self.columns)
+                self.columns[col_name] = col
+
+                col.left = prev
+                col.right = prev.right
+                prev.right.left = col
+                prev.right = col
+                prev = col
 
     def add_row(self, row_id, column_names):
         if not column_names:
@@ -71,6 +191,7 @@ class DancingLinks:
             for i in range(len(nodes)):
                 nodes[i].left = nodes[i-1]
                 nodes[i].right = nodes[(i+1) % len(nodes)]
+            self.rows[row_id] = nodes[0]
 
     def cover(self, col):
         col.right.left = col.left
@@ -100,8 +221,425 @@ class DancingLinks:
         col.right.left = col
         col.left.right = col
 
-    def search(self, solution, callback, max_solutions=None):
+    def add_conflicts(self, row_id, row_ids):
+        """Rows ``search`` hides while ``row_id`` is chosen, for pairwise rules exact cover cannot express."""
+        self.conflicts.setdefault(row_id, []).extend(self.rows[other] for other in row_ids)
+
+    def _hide_conflicts(self, row_id):
+        hidden = []
+        for node in self.conflicts.get(row_id, ()):
+            # A row removed by a covered column keeps only its node in that
+            # column linked, so two linked nodes mean the row is still live.
+            if node.up.down is not node or node.right.up.down is not node.right:
+                continue
+            j = node
+            while True:
+                j.up.down = j.down
+                j.down.up = j.up
+                j.column.size -= 1
+                j = j.right
+                if j is node:
+                    break
+            hidden.append(node)
+        return hidden
+
+    def _unhide(self, hidden):
+        for node in reversed(hidden):
+            j = node.left
+            while True:
+                j.column.size += 1
+                j.down.up = j
+                j.up.down = j
+                if j is node:
+                    break
+                j = j.left
+
+    def select_rows(self, row_ids):
+        """Cover the columns of ``row_ids`` as if the search had chosen them.
+
+        The rows must be pairwise disjoint. Returns the handle to pass to
+        ``unselect_rows``, which restores the matrix; searching in between
+        explores only completions of the selected rows.
+        """
+        selected = []
+        for row_id in row_ids:
+            node = self.rows[row_id]
+            self.cover(node.column)
+            j = node.right
+            while j != node:
+                self.cover(j.column)
+                j = j.right
+            selected.append(node)
+        return selected
+
+    def unselect_rows(self, selected):
+        for node in reversed(selected):
+            j = node.left
+            while j != node:
+                self.uncover(j.column)
+                j = j.left
+            self.uncover(node.column)
+
+    def random_solution(self, rng):
+        """Row ids of the first solution found trying each column's rows in random order, or None."""
+        solution = []
+
+        def _dfs():
+            if self.header.right == self.header:
+                return True
+            col = self.choose_column()
+            if col is None or col.size == 0:
+                return False
+            self.cover(col)
+            rows = []
+            r = col.down
+            while r != col:
+                rows.append(r)
+                r = r.down
+            rng.shuffle(rows)
+            found = False
+            for r in rows:
+                solution.append(r.row_id)
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                found = _dfs()
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                if found:
+                    break
+                solution.pop()
+            self.uncover(col)
+            return found
+
+        return solution if _dfs() else None
+
+    def count_solutions(self, cap, max_nodes=None):
+        """Count solutions up to ``cap``, trying at most ``max_nodes`` rows.
+
+        Returns ``(count, complete)``; ``complete`` is False when the node
+        budget ran out first, in which case ``count`` is a lower bound. The
+        matrix is always restored.
+        """
+        nodes = 0
+
+        def _count(limit):
+            nonlocal nodes
+            if self.header.right == self.header:
+                return 1, True
+            col = self.choose_column()
+            if col is None or col.size == 0:
+                return 0, True
+            self.cover(col)
+            total = 0
+            complete = True
+            r = col.down
+            while r != col and total < limit:
+                nodes += 1
+                if max_nodes is not None and nodes > max_nodes:
+                    complete = False
+                    break
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                found, complete = _count(limit - total)
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                total += found
+                if not complete:
+                    break
+                r = r.down
+            self.uncover(col)
+            return total, complete
+
+        return _count(cap)
+
+    def fold(self, visit, prefix=(), deadline=None):
+        """Count solutions, reporting every row with the number of solutions below it.
+
+        ``visit(row_id, ancestors, n)`` is called once per tree node with
+        ``n > 0``: ``ancestors`` is the live stack of row ids above it (do
+        not keep it). Summing over these calls folds per-row or per-pair
+        statistics over all solutions without materialising any of them.
+        ``prefix`` pins the first choices like ``branch_prefixes`` paths,
+        so the fold covers one shard. Raises ``DeadlineReached`` past
+        ``deadline``, leaving the matrix unusable.
+        """
+        stack = []
+        nodes = 0
+
+        def _fold():
+            nonlocal nodes
+            if self.header.right == self.header:
+                return 1
+            nodes += 1
+            if deadline is not None and nodes % 1024 == 0 and time.time() >= deadline:
+                raise DeadlineReached()
+            col = self.choose_column()
+            if col is None or col.size == 0:
+                return 0
+            self.cover(col)
+            total = 0
+            r = col.down
+            while r != col:
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                stack.append(r.row_id)
+                n = _fold()
+                stack.pop()
+                if n:
+                    visit(r.row_id, stack, n)
+                    total += n
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                r = r.down
+            self.uncover(col)
+            return total
+
+        chosen = []
+        try:
+            for index in prefix:
+                col = self.choose_column()
+                if col is None or col.size <= index:
+                    return 0
+                self.cover(col)
+                r = col.down
+                for _ in range(index):
+                    r = r.down
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                chosen.append((col, r))
+                stack.append(r.row_id)
+            total = _fold()
+            if total:
+                while stack:
+                    row_id = stack.pop()
+                    visit(row_id, stack, total)
+            return total
+        finally:
+            while chosen:
+                col, r = chosen.pop()
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                self.uncover(col)
+
+    def state_key(self):
+        """Bitmask of the uncovered columns, which fully determines the remaining subtree."""
+        key = 0
+        for header in (self.header, self.secondary):
+            c = header.right
+            while c != header:
+                key |= c.bit
+                c = c.right
+        return key
+
+    def count_subtree(self, memo, deadline=None):
+        """Solutions below the current state, memoised in ``memo`` by ``state_key``.
+
+        Raises ``DeadlineReached`` once ``deadline`` passes; the matrix must
+        then be discarded, but every count already in ``memo`` stays valid,
+        so a retry carries on where this one stopped.
+        """
         if self.header.right == self.header:
+            return 1
+        key = self.state_key()
+        total = memo.get(key)
+        if total is not None:
+            return total
+        if deadline is not None and time.time() >= deadline:
+            raise DeadlineReached()
+        col = self.choose_column()
+        total = 0
+        if col is not None and col.size > 0:
+            self.cover(col)
+            r = col.down
+            while r != col:
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                total += self.count_subtree(memo, deadline)
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                r = r.down
+            self.uncover(col)
+        memo[key] = total
+        return total
+
+    def unrank(self, k, memo, deadline=None):
+        """Branch path of the solution at 0-based rank ``k`` in search order, or None.
+
+        Descends only into the subtree holding rank ``k``, skipping earlier
+        siblings by their memoised counts. The path can be passed as
+        ``start_path`` to ``search_generator`` to continue from that solution.
+        """
+        path = []
+        chosen = []
+        try:
+            while self.header.right != self.header:
+                col = self.choose_column()
+                if col is None or col.size == 0:
+                    return None
+                self.cover(col)
+                r = col.down
+                index = 0
+                while r != col:
+                    j = r.right
+                    while j != r:
+                        self.cover(j.column)
+                        j = j.right
+                    count = self.count_subtree(memo, deadline)
+                    if k < count:
+                        break
+                    k -= count
+                    j = r.left
+                    while j != r:
+                        self.uncover(j.column)
+                        j = j.left
+                    r = r.down
+                    index += 1
+                if r == col:
+                    self.uncover(col)
+                    return None
+                chosen.append((col, r))
+                path.append(index)
+            return path
+        finally:
+            while chosen:
+                col, r = chosen.pop()
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                self.uncover(col)
+
+    def rank(self, row_ids, memo, deadline=None):
+        """0-based search-order rank of the solution made of ``row_ids``, or None if it is not one."""
+        rank = 0
+        chosen = []
+        try:
+            while self.header.right != self.header:
+                col = self.choose_column()
+                if col is None or col.size == 0:
+                    return None
+                self.cover(col)
+                r = col.down
+                while r != col and r.row_id not in row_ids:
+                    j = r.right
+                    while j != r:
+                        self.cover(j.column)
+                        j = j.right
+                    rank += self.count_subtree(memo, deadline)
+                    j = r.left
+                    while j != r:
+                        self.uncover(j.column)
+                        j = j.left
+                    r = r.down
+                if r == col:
+                    self.uncover(col)
+                    return None
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                chosen.append((col, r))
+            return rank
+        finally:
+            while chosen:
+                col, r = chosen.pop()
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                self.uncover(col)
+
+    def sample_solution(self, rng, cap=64, max_nodes=300):
+        """Row ids of one random solution, or None if there is none.
+
+        A random depth-first walk. Wherever the remaining subtree can be
+        counted exactly (fewer than ``cap`` solutions within ``max_nodes``
+        rows), the next row is drawn in proportion to its number of
+        completions, which is exactly uniform from there down. Above that
+        point rows are tried in shuffled order, backtracking out of dead
+        ends, so the draw is only approximately uniform near the root. The
+        cost depends on depth, branching and the limits, not on the total
+        number of solutions. The matrix is fully restored before returning.
+        """
+        solution = []
+
+        def _select(r):
+            j = r.right
+            while j != r:
+                self.cover(j.column)
+                j = j.right
+
+        def _unselect(r):
+            j = r.left
+            while j != r:
+                self.uncover(j.column)
+                j = j.left
+
+        def _walk(exact):
+            if self.header.right == self.header:
+                return True
+            if not exact:
+                count, complete = self.count_solutions(cap, max_nodes)
+                if complete and count == 0:
+                    return False
+                exact = complete and count < cap
+            col = self.choose_column()
+            if col is None or col.size == 0:
+                return False
+            self.cover(col)
+            rows = []
+            r = col.down
+            while r != col:
+                rows.append(r)
+                r = r.down
+            if exact:
+                weights = []
+                for r in rows:
+                    _select(r)
+                    weights.append(self.count_solutions(cap)[0])
+                    _unselect(r)
+                order = [rng.choices(rows, weights)[0]]
+            else:
+                order = rows
+                rng.shuffle(order)
+            found = False
+            for r in order:
+                solution.append(r.row_id)
+                _select(r)
+                found = _walk(exact)
+                _unselect(r)
+                if found:
+                    break
+                solution.pop()
+            self.uncover(col)
+            return found
+
+        return solution if _walk(False) else None
+
+    def search(self, solution, callback, max_solutions=None, progress=None):
+        if self.header.right == self.header:
+            if progress is not None:
+                progress.solutions += 1
             callback(solution[:])
             return 1
 
@@ -119,18 +657,29 @@ class DancingLinks:
 
         self.cover(col)
         solutions_found = 0
+        depth = len(solution)
+        size = col.size
+        index = 0
 
         r = col.down
         while r != col:
             solution.append(r.row_id)
+            if progress is not None:
+                progress.nodes += 1
+                if depth < progress.top_levels or progress.nodes >= progress.next_sample:
+                    progress.sample(depth, index, size)
+                index += 1
 
             j = r.right
             while j != r:
                 self.cover(j.column)
                 j = j.right
+            hidden = self._hide_conflicts(r.row_id) if self.conflicts else None
 
-            solutions_found += self.search(solution, callback, max_solutions)
+            solutions_found += self.search(solution, callback, max_solutions, progress)
 
+            if hidden:
+                self._unhide(hidden)
             if max_solutions is not None and solutions_found >= max_solutions:
                 j = r.left
                 while j != r:
@@ -151,51 +700,170 @@ class DancingLinks:
         self.uncover(col)
         return solutions_found
 
-    def search_generator(self):
-        solution = []
+    def choose_column(self):
+        """Column with the fewest rows (first on ties), as used by every search."""
+        col = None
+        min_size = float('inf')
+        c = self.header.right
+        while c != self.header:
+            if c.size < min_size:
+                min_size = c.size
+                col = c
+            c = c.right
+        return col
 
-        def choose_column():
-            col = None
-            min_size = float('inf')
-            c = self.header.right
-            while c != self.header:
-                if c.size < min_size:
-                    min_size = c.size
-                    col = c
-                c = c.right
-            return col
+    def branch_prefixes(self, depth):
+        """All branch paths of length ``depth`` (shorter where a solution is reached first).
+
+        Dead ends are dropped. Searching each prefix with ``search_generator(
+        start_path=prefix, pinned=len(prefix))`` and concatenating the results in
+        list order reproduces the full search order.
+        """
+        out = []
+        path = []
 
-        def _search_gen():
+        def _walk():
+            if len(path) == depth or self.header.right == self.header:
+                out.append(list(path))
+                return
+            col = self.choose_column()
+            if col is None or col.size == 0:
+                return
+            self.cover(col)
+            r = col.down
+            index = 0
+            while r != col:
+                path.append(index)
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                _walk()
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                path.pop()
+                r = r.down
+                index += 1
+            self.uncover(col)
+
+        _walk()
+        return out
+
+    def random_probe(self, rng):
+        """One Knuth random descent through the search tree.
+
+        Follows the same column choice as ``search`` but takes a uniformly
+        random row at every level. Returns ``(nodes, solutions, depth)`` where
+        ``nodes`` is the unbiased tree-size estimate ``1 + d1 + d1*d2 + ...``
+        and ``solutions`` is ``d1*d2*...*dk`` if the descent ended in a
+        solution, else 0. The matrix is fully restored before returning.
+        """
+        covered = []
+        weight = 1
+        nodes = 1
+        solutions = 0
+        try:
+            while True:
+                if self.header.right == self.header:
+                    solutions = weight
+                    break
+                col = self.choose_column()
+                if col is None or col.size == 0:
+                    break
+                pick = rng.randrange(col.size)
+                r = col.down
+                for _ in range(pick):
+                    r = r.down
+                weight *= col.size
+                nodes += weight
+                self.cover(col)
+                j = r.right
+                while j != r:
+                    self.cover(j.column)
+                    j = j.right
+                covered.append((col, r))
+        finally:
+            depth = len(covered)
+            while covered:
+                col, r = covered.pop()
+                j = r.left
+                while j != r:
+                    self.uncover(j.column)
+                    j = j.left
+                self.uncover(col)
+        return nodes, solutions, depth
+
+    def search_generator(self, start_path=None, with_path=False, pinned=0, progress=None):
+        """Yield solutions in deterministic DLX order.
+
+        ``start_path`` lists, per search depth, the index of the row to start
+        from inside the chosen column; branches before it are skipped without
+        being explored. The first ``pinned`` depths never move past their start
+        row, which confines the search to one subtree. With ``with_path`` each
+        item is ``(rows, path)`` where ``path`` holds the row index taken at
+        every depth of that solution. An optional ``SearchProgress`` is
+        updated as the search runs.
+        """
+        solution = []
+        path = []
+        start_path = list(start_path or [])
+        choose_column = self.choose_column
+
+        def _search_gen(resuming):
             if self.header.right == self.header:
-                yield list(solution)
+                if progress is not None:
+                    progress.solutions += 1
+                yield (list(solution), list(path)) if with_path else list(solution)
                 return
 
             col = choose_column()
             if col is None or col.size == 0:
                 return
 
+            depth = len(path)
+            resuming = resuming and depth < len(start_path)
+
             self.cover(col)
+            size = col.size
             r = col.down
+            index = 0
+            if resuming:
+                while index < start_path[depth] and r != col:
+                    r = r.down
+                    index += 1
             while r != col:
                 solution.append(r.row_id)
+                path.append(index)
+                if progress is not None:
+                    progress.nodes += 1
+                    if depth < progress.top_levels or progress.nodes >= progress.next_sample:
+                        progress.sample(depth, index, size)
                 j = r.right
                 while j != r:
                     self.cover(j.column)
                     j = j.right
 
-                yield from _search_gen()
+                yield from _search_gen(resuming and index == start_path[depth])
+                resuming = False
 
                 j = r.left
                 while j != r:
                     self.uncover(j.column)
                     j = j.left
+                path.pop()
                 solution.pop()
+                if depth < pinned:
+                    break
                 r = r.down
+                index += 1
 
             self.uncover(col)
 
-        yield from _search_gen()
-
+        yield from _search_gen(bool(start_path))
+        if progress is not None:
+            progress.finish(complete=not pinned)
 
 
 def normalize_coords(coords):
@@ -232,21 +900,76 @@ versions = generate_orientations
 
 
 
+def mask_cells(width, height, mask):
+    """Playable ``(x, y)`` cells of a board mask, or None when the whole rectangle is playable.
+
+    ``mask`` is ``KanoodleBoard.mask``: a list of rows, each a string
+    (``#`` marks a playable cell, anything else a hole) or a list of
+    truthy/falsy values. A set of cells is returned as a frozenset.
+    """
+    if mask is None:
+        return None
+    if isinstance(mask, (set, frozenset)):
+        cells = frozenset(mask)
+    else:
+        cells = frozenset(
+            (x, y)
+            for y, row in enumerate(mask[:height])
+            for x, cell in enumerate(list(row)[:width])
+            if (cell == '#' if isinstance(cell, str) else cell)
+        )
+    return None if len(cells) == width * height else cells
+
+
 class KanoodleSolver:
-    def __init__(self, board_width, board_height, pieces):
+    def __init__(self, board_width, board_height, pieces, pieces_hash=None, orientations=None, placement_table=None,
+                 mask=None):
         self.width = board_width
         self.height = board_height
         self.pieces_data = pieces
         self.id_to_name = {p['id']: p['name'] for p in pieces}
+        self.pieces_hash = pieces_hash
+        self.orientations = orientations or {}
+        self.placement_table = placement_table
+        self.mask = mask_cells(board_width, board_height, mask)
+
+    def build_placement_table(self):
+        """Every placement of every piece on the empty board, keyed by piece id.
+
+        Entries are ``(placement_id, positions)`` in generation order, so
+        filtering a piece's list by occupied cells gives the same rows, in the
+        same order, as generating them against that partial board.
+        """
+        table = {}
+        for piece_data in self.pieces_data:
+            table[piece_data['id']] = [
+                (placement_id, positions)
+                for placement_id, _, positions in self._generate_placements(piece_data, set())
+            ]
+        return table
 
     def _get_placements(self, piece_data, occupied_positions):
+        piece_id = piece_data['id']
+        if self.placement_table is not None and piece_id in self.placement_table:
+            return [
+                (placement_id, piece_id, positions)
+                for placement_id, positions in self.placement_table[piece_id]
+                if occupied_positions.isdisjoint(positions)
+            ]
+        return self._generate_placements(piece_data, occupied_positions)
+
+    def _generate_placements(self, piece_data, occupied_positions):
         placements_list = []
         piece_id = piece_data['id']
         placement_counter = 0
 
-        base_coords = [tuple(c) for c in piece_data['shapeData']]
+        orientations = self.orientations.get(piece_id)
+        if orientations is None:
+            orientations = generate_orientations([tuple(c) for c in piece_data['shapeData']])
+        if self.mask is not None:
+            return self._generate_masked_placements(piece_id, orientations, occupied_positions)
 
-        for shape_coords in generate_orientations(base_coords):
+        for shape_coords in orientations:
             if not shape_coords:
                 continue
 
@@ -276,77 +999,214 @@ class KanoodleSolver:
 
         return placements_list
 
-    def solvePartial(self, board_state, max_samples=100, max_time=None, all_required_constraints=None):
-        start_time_ms = time.time() * 1000
+    def _generate_masked_placements(self, piece_id, orientations, occupied_positions):
+        """Placements inside ``self.mask``, generated per mask cell.
+
+        Each orientation's first cell is anchored on every mask cell in
+        row-major order, so only translations landing inside the mask are
+        tried and holes cost nothing.
+        """
+        cells = sorted(self.mask, key=lambda pos: (pos[1], pos[0]))
+        placements_list = []
+        for shape_coords in orientations:
+            if not shape_coords:
+                continue
+            ax, ay = shape_coords[0]
+            for cx, cy in cells:
+                placement = tuple(sorted((px - ax + cx, py - ay + cy) for px, py in shape_coords))
+                if all(pos in self.mask and pos not in occupied_positions for pos in placement):
+                    placements_list.append(((piece_id, len(placements_list)), piece_id, placement))
+        return placements_list
 
+    def _build_matrix(self, board_state, exclude=None, constraints=None):
         occupied_positions = set()
         placed_piece_ids = set()
 
         if board_state is None or not isinstance(board_state, list) or not board_state:
             board_state = [[0] * self.width for _ in range(self.height)]
 
+        # A short or ragged board is padded with empty cells (and cropped to
+        # the board), so the constraints and callers see a full grid.
+        grid = [[0] * self.width for _ in range(self.height)]
         for r in range(self.height):
             row = board_state[r] if r < len(board_state) else []
             for c in range(self.width):
                 piece_id = row[c] if c < len(row) else 0
-                if piece_id != 0:
+                grid[r][c] = piece_id
+                if piece_id != 0 and (self.mask is None or (c, r) in self.mask):
                     occupied_positions.add((c, r))
                     placed_piece_ids.add(piece_id)
+        board_state = grid
 
-        remaining_pieces_data = [
-            p for p in self.pieces_data if p['id'] not in placed_piece_ids
-        ]
+        remaining_pieces_data = [p for p in self.pieces_data if p['id'] not in placed_piece_ids]
 
         required_positions = set()
         for x in range(self.width):
             for y in range(self.height):
                 pos = (x, y)
-                if pos not in occupied_positions:
+                if pos not in occupied_positions and (self.mask is None or pos in self.mask):
                     required_positions.add(pos)
 
         total_unplaced_cells = len(required_positions)
         remaining_piece_cell_count = sum(len(p['shapeData']) for p in remaining_pieces_data)
 
         if remaining_piece_cell_count != total_unplaced_cells:
-            return {
-                'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'timedOut': False,
-                'limitReached': False, 'message': "Unsolvable: Placed pieces do not leave a solvable empty space."
-            }
+            return board_state, None, None, "Unsolvable: Placed pieces do not leave a solvable empty space."
 
-        columns = []
+        if constraints:
+            constraints, error = constraints.bind(board_state)
+            if error:
+                return board_state, None, None, error
 
+        columns = []
         for piece_data in remaining_pieces_data:
             columns.append(f"piece_{piece_data['id']}")
-
         for pos in required_positions:
             columns.append(f"pos_{pos[0]}_{pos[1]}")
 
-        print(f"DEBUG: Building DLX with {len(columns)} columns ({len(remaining_pieces_data)} pieces, {len(required_positions)} positions)")
-
-        dlx = DancingLinks(columns)
-
-        placement_info = {}
-
+        rows = []
         for piece_data in remaining_pieces_data:
             placements = self._get_placements(piece_data, occupied_positions)
-
             for placement_id, piece_id, positions in placements:
+                if exclude and placement_id in exclude:
+                    continue
+                if constraints and not constraints.allows(piece_id, positions):
+                    continue
                 if all(pos in required_positions for pos in positions):
-                    row_columns = [f"piece_{piece_id}"]
-                    for pos in positions:
-                        row_columns.append(f"pos_{pos[0]}_{pos[1]}")
+                    rows.append((placement_id, piece_id, positions))
+        conflicts = {}
+        if constraints and constraints.pair_rules:
+            rows, conflicts = constraints.pair_conflicts(rows)
 
-                    dlx.add_row(placement_id, row_columns)
-                    placement_info[placement_id] = (piece_id, positions)
+        dlx = DancingLinks(columns)
+        placement_info = {}
+        for placement_id, piece_id, positions in rows:
+            row_columns = [f"piece_{piece_id}"] + [f"pos_{pos[0]}_{pos[1]}" for pos in positions]
+            dlx.add_row(placement_id, row_columns)
+            placement_info[placement_id] = (piece_id, positions)
+        for placement_id, others in conflicts.items():
+            dlx.add_conflicts(placement_id, others)
 
         if not placement_info:
+            return board_state, None, None, "Unsolvable: No valid placements found."
+
+        return board_state, dlx, placement_info, None
+
+    def fingerprint(self, board_state):
+        return _hash_json({
+            'b': hash_board_state(self.width, self.height, board_state, self.mask),
+            'p': self.pieces_digest(),
+        })[:16]
+
+    def pieces_digest(self):
+        if self.pieces_hash is None:
+            self.pieces_hash = hash_pieces(self.pieces_data)
+        return self.pieces_hash
+
+    def worker_spec(self):
+        """Constructor arguments for rebuilding this solver in a process-pool worker (see ``_worker_solver``)."""
+        if self.placement_table is None:
+            self.placement_table = self.build_placement_table()
+        return (self.width, self.height, self.pieces_data, self.pieces_digest(), self.orientations,
+                self.placement_table, self.mask)
+
+    def estimate(self, board_state, probes=200, max_time=None, seed=None):
+        """Predict search cost with Knuth's Monte-Carlo estimator.
+
+        Runs up to ``probes`` random descents (fewer if ``max_time`` ms runs
+        out) and returns the mean node and solution counts with 95% normal
+        confidence bounds, plus a runtime estimate from the measured cost of
+        a probe node.
+        """
+        start = time.perf_counter()
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        if error:
+            return {
+                'estimatedNodes': 0, 'nodesLow': 0, 'nodesHigh': 0,
+                'estimatedSolutions': 0, 'solutionsLow': 0, 'solutionsHigh': 0,
+                'estimatedSeconds': 0.0, 'probes': 0, 'message': error
+            }
+
+        rng = random.Random(seed)
+        node_samples = []
+        solution_samples = []
+        visited = 0
+        probe_start = time.perf_counter()
+        for _ in range(max(1, int(probes))):
+            nodes, solutions, depth = dlx.random_probe(rng)
+            node_samples.append(nodes)
+            solution_samples.append(solutions)
+            visited += depth + 1
+            if max_time and max_time > 0 and (time.perf_counter() - start) * 1000 >= max_time:
+                break
+        seconds_per_node = (time.perf_counter() - probe_start) / max(visited, 1)
+
+        def summarize(samples):
+            n = len(samples)
+            mean = sum(samples) / n
+            var = sum((s - mean) ** 2 for s in samples) / (n - 1) if n > 1 else 0.0
+            half = 1.96 * math.sqrt(var / n)
+            return mean, max(0.0, mean - half), mean + half
+
+        nodes_mean, nodes_low, nodes_high = summarize(node_samples)
+        sols_mean, sols_low, sols_high = summarize(solution_samples)
+        return {
+            'estimatedNodes': round(nodes_mean),
+            'nodesLow': round(nodes_low),
+            'nodesHigh': round(nodes_high),
+            'estimatedSolutions': round(sols_mean),
+            'solutionsLow': round(sols_low),
+            'solutionsHigh': round(sols_high),
+            'estimatedSeconds': nodes_mean * seconds_per_node,
+            'probes': len(node_samples),
+            'message': f"Estimated from {len(node_samples)} random probe(s)."
+        }
+
+    def iter_solutions(self, board_state, start_path=None, pinned=0):
+        """Yield ``(board, path)`` for each solution; see ``DancingLinks.search_generator``."""
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        if error:
+            return
+        for rows, path in dlx.search_generator(start_path=start_path, with_path=True, pinned=pinned):
+            final_board = [list(row) for row in board_state]
+            for placement_id in rows:
+                piece_id, positions = placement_info[placement_id]
+                for x, y in positions:
+                    final_board[y][x] = piece_id
+            yield final_board, path
+
+    def shard_prefixes(self, board_state, depth=1):
+        """Split the search into independent subtrees by the first ``depth`` choices."""
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        if error:
+            return []
+        return dlx.branch_prefixes(depth)
+
+    def solvePartial(self, board_state, max_samples=100, max_time=None, all_required_constraints=None, progress=None):
+        start_time_ms = time.time() * 1000
+
+        try:
+            constraints = compile_constraints(all_required_constraints, self.width, self.height,
+                                              piece_ids=self.id_to_name.keys())
+        except ValueError as exc:
+            constraints, error = None, f"Invalid constraints: {exc}"
+        else:
+            board_state, dlx, placement_info, error = self._build_matrix(board_state, constraints=constraints)
+        if error:
             return {
                 'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'timedOut': False,
-                'limitReached': False, 'message': "Unsolvable: No valid placements found."
+                'limitReached': False, 'message': error
             }
 
         print(f"DEBUG: Built DLX with {len(placement_info)} possible placements")
 
+        if max_time and max_time > 0:
+            deadline = start_time_ms / 1000 + max_time / 1000
+            if progress is None:
+                progress = DeadlineProgress(deadline)
+            else:
+                progress.deadline = deadline
+
         solutions = []
         total_solutions_found = [0]
         limit_reached = [False]
@@ -373,12 +1233,19 @@ class KanoodleSolver:
                timed_out[0] = True
 
         try:
-            dlx.search([], solution_callback, max_samples if not timed_out[0] else None)
+            dlx.search([], solution_callback, max_samples if not timed_out[0] else None, progress)
+            if progress is not None:
+                progress.finish(complete=not limit_reached[0])
 
+        except DeadlineReached:
+            timed_out[0] = True
         except Exception as e:
             print(f"ERROR: Exception in DLX search: {e}")
             traceback.print_exc()
             raise
+        finally:
+            if progress is not None and not progress.done:
+                progress.finish()
 
         print(f"DEBUG: Found {total_solutions_found[0]} total solutions, returning {len(solutions)}")
 
@@ -400,104 +1267,299 @@ class KanoodleSolver:
             'message': message
         }
 
-    def solveIncremental(self, board_state, batch_size=24, max_time=None, skip_count=0):
-
+    def solve_many(self, items, max_samples=100, max_time=None, workers=1):
+        """``solvePartial`` over many boards; results come back in input order.
+
+        Each item is a board state or a dict with ``board`` and optional
+        ``max_samples``/``max_time`` overriding the defaults. Items with the
+        same board and limits are solved once. The placement table is built
+        once; with ``workers`` > 1 the boards are split over up to that
+        many slots of the shared process pool (``pool.get_process_pool``),
+        falling back to solving inline when no slots are free.
+        """
+        jobs = []
+        for item in items:
+            if isinstance(item, dict):
+                jobs.append((item.get('board'), item.get('max_samples') or max_samples,
+                             item.get('max_time') or max_time))
+            else:
+                jobs.append((item, max_samples, max_time))
+        keys = [json.dumps(job, separators=(',', ':')) for job in jobs]
+        unique = list(dict.fromkeys(keys))
+        by_key = dict(zip(keys, jobs))
+
+        if self.placement_table is None:
+            self.placement_table = self.build_placement_table()
+        from .pool import get_process_pool
+        pool = get_process_pool()
+        with pool.reserve(min(workers, len(unique))) as granted:
+            if not granted:
+                results = {key: self.solvePartial(*by_key[key]) for key in unique}
+            else:
+                spec = self.worker_spec()
+                chunks = [unique[i::granted] for i in range(granted)]
+                jobs = [(spec, [by_key[key] for key in chunk]) for chunk in chunks]
+                results = {}
+                for chunk, solved in zip(chunks, pool.map(_solve_batch_chunk, jobs)):
+                    results.update(zip(chunk, solved))
+        return [dict(results[key]) for key in keys]
+
+    def sample(self, board_state, samples=10, seed=None, max_time=None, cap=64):
+        """Draw ``samples`` random solutions (with replacement) via ``DancingLinks.sample_solution``.
+
+        The same ``seed`` gives the same draws; without one a seed is picked
+        and returned so the sample can be reproduced.
+        """
         start_time_ms = time.time() * 1000
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        if error:
+            return {'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'timedOut': False,
+                    'seed': seed, 'message': error}
+
+        rng = random.Random(seed)
+        solutions = []
+        timed_out = False
+        while len(solutions) < samples:
+            if max_time and max_time > 0 and time.time() * 1000 - start_time_ms >= max_time:
+                timed_out = True
+                break
+            rows = dlx.sample_solution(rng, cap)
+            if rows is None:
+                break
+            final_board = [list(row) for row in board_state]
+            for placement_id in rows:
+                piece_id, positions = placement_info[placement_id]
+                for x, y in positions:
+                    final_board[y][x] = piece_id
+            solutions.append({'board': final_board})
 
-        occupied_positions = set()
-        placed_piece_ids = set()
-
-        if board_state is None or not isinstance(board_state, list) or not board_state:
-            board_state = [[0] * self.width for _ in range(self.height)]
-
-        for r in range(self.height):
-            row = board_state[r] if r < len(board_state) else []
-            for c in range(self.width):
-                piece_id = row[c] if c < len(row) else 0
-                if piece_id != 0:
-                    occupied_positions.add((c, r))
-                    placed_piece_ids.add(piece_id)
-
-        remaining_pieces_data = [p for p in self.pieces_data if p['id'] not in placed_piece_ids]
+        if not solutions and not timed_out:
+            message = "No solutions found."
+        else:
+            message = f"Drew {len(solutions)} random solution(s)" + (" before time limit." if timed_out else ".")
+        return {
+            'solutions': solutions,
+            'solutionCount': len(solutions),
+            'solutionsReturned': len(solutions),
+            'timedOut': timed_out,
+            'seed': seed,
+            'message': message,
+        }
 
-        required_positions = set()
-        for x in range(self.width):
-            for y in range(self.height):
-                pos = (x, y)
-                if pos not in occupied_positions:
-                    required_positions.add(pos)
+    def _indexed_matrix(self, board_state):
+        """``_build_matrix`` plus the subtree-count memo shared by every solver for this board."""
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        memo = _rank_memo(self.fingerprint(board_state)) if not error else None
+        return board_state, dlx, placement_info, memo
+
+    def count(self, board_state, max_time=None):
+        """Exact number of solutions, via the memoised subtree counts.
+
+        Raises ``DeadlineReached`` after ``max_time`` ms; counts finished so
+        far are kept for the next call.
+        """
+        _, dlx, _, memo = self._indexed_matrix(board_state)
+        return dlx.count_subtree(memo, _deadline(max_time)) if dlx is not None else 0
+
+    def solution_at(self, board_state, k):
+        """The solution at 0-based rank ``k`` in ``solvePartial`` order, or None past the end."""
+        solutions = self.page(board_state, k, 1)['solutions']
+        return solutions[0]['board'] if solutions else None
+
+    def page(self, board_state, k, n, max_time=None):
+        """Solutions ``k`` to ``k + n - 1`` in search order without generating the ones before.
+
+        Rank ``k`` is located by descending through memoised subtree counts
+        and the page is read from there with ``search_generator``. The
+        returned ``resumeToken`` continues after the page like a session's.
+        The first call on a large board counts the whole tree; with
+        ``max_time`` (ms) it stops early and a retry resumes the counting.
+        """
+        board_state, dlx, placement_info, memo = self._indexed_matrix(board_state)
+        if dlx is None:
+            return {'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'offset': k, 'timedOut': False,
+                    'exhausted': True, 'resumeToken': None, 'message': "No solutions found."}
+        deadline = _deadline(max_time)
+        try:
+            total = dlx.count_subtree(memo, deadline)
+            path = dlx.unrank(k, memo, deadline) if 0 <= k < total else None
+        except DeadlineReached:
+            return {'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'offset': k, 'timedOut': True,
+                    'exhausted': False, 'resumeToken': None,
+                    'message': "Time limit reached while counting solutions; retry to continue counting."}
+        solutions = []
+        last_path = None
+        if path is not None:
+            for rows, last_path in dlx.search_generator(start_path=path, with_path=True):
+                final_board = [list(row) for row in board_state]
+                for placement_id in rows:
+                    piece_id, positions = placement_info[placement_id]
+                    for x, y in positions:
+                        final_board[y][x] = piece_id
+                solutions.append({'board': final_board})
+                if len(solutions) >= n:
+                    break
+        served = k + len(solutions)
+        exhausted = served >= total
+        return {
+            'solutions': solutions,
+            'solutionCount': total,
+            'solutionsReturned': len(solutions),
+            'offset': k,
+            'timedOut': False,
+            'exhausted': exhausted,
+            'resumeToken': (None if exhausted or last_path is None else
+                            encode_resume_token(next_start_path(last_path), served, self.fingerprint(board_state))),
+            'message': f"Solutions {k + 1}-{served} of {total}." if solutions else "No solutions at this offset.",
+        }
 
-        total_unplaced_cells = len(required_positions)
-        remaining_piece_cell_count = sum(len(p['shapeData']) for p in remaining_pieces_data)
+    def rank(self, board_state, solution_board, max_time=None):
+        """0-based position of ``solution_board`` in search order, or None if it does not solve ``board_state``.
 
-        if remaining_piece_cell_count != total_unplaced_cells:
-            return {
-                'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'timedOut': False,
-                'exhausted': True, 'message': "Unsolvable: Placed pieces do not leave a solvable empty space.",
-                'skipCount': skip_count
+        Raises ``DeadlineReached`` after ``max_time`` ms, like ``count``.
+        """
+        board_state, dlx, placement_info, memo = self._indexed_matrix(board_state)
+        if dlx is None:
+            return None
+        try:
+            row_ids = {
+                placement_id for placement_id, (piece_id, positions) in placement_info.items()
+                if all(solution_board[y][x] == piece_id for x, y in positions)
             }
+        except (IndexError, TypeError):
+            return None
+        return dlx.rank(row_ids, memo, _deadline(max_time))
+
+    def hint(self, board_state, piece_id, cap=100, max_time=None, workers=1):
+        """Rank every legal placement of ``piece_id`` by the solutions it leaves.
+
+        Each placement is selected on one shared matrix, counted up to ``cap``
+        solutions and unselected again. With ``workers`` > 1 the placements
+        are split over slots of the shared process pool, one matrix per
+        worker. ``placementId``
+        indexes the piece's entry in the placement table. ``max_time``
+        (ms) is a single deadline for the whole call; placements not counted
+        by then come back with ``solutions`` None.
+        """
+        piece_data = next((p for p in self.pieces_data if p['id'] == piece_id), None)
+        if piece_data is None:
+            return {'pieceId': piece_id, 'placements': [], 'timedOut': False, 'message': "Unknown piece."}
+        if self.placement_table is None:
+            self.placement_table = self.build_placement_table()
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        if any(piece_id in row for row in board_state):
+            return {'pieceId': piece_id, 'placements': [], 'timedOut': False,
+                    'message': "Piece is already on the board."}
+        occupied = {(c, r) for r, row in enumerate(board_state) for c, cell in enumerate(row) if cell}
+        legal = [(placement_id, positions)
+                 for placement_id, _, positions in self._get_placements(piece_data, occupied)]
+
+        deadline = time.time() + max_time / 1000 if max_time else None
+        row_ids = [placement_id for placement_id, _ in legal] if not error else []
+        from .pool import get_process_pool
+        pool = get_process_pool()
+        with pool.reserve(min(workers, len(row_ids))) as granted:
+            if not granted:
+                counts = _count_placements(dlx, row_ids, cap, deadline) if row_ids else []
+            else:
+                spec = self.worker_spec()
+                chunks = [row_ids[i::granted] for i in range(granted)]
+                jobs = [(spec, board_state, chunk, cap, deadline) for chunk in chunks]
+                by_row = {}
+                for chunk, chunk_counts in zip(chunks, pool.map(_hint_job, jobs)):
+                    by_row.update(zip(chunk, chunk_counts))
+                counts = [by_row[row_id] for row_id in row_ids]
+        counted = dict(zip(row_ids, counts))
+
+        placements = []
+        for placement_id, positions in legal:
+            solutions = counted.get(placement_id, 0) if not error else 0
+            placements.append({
+                'placementId': placement_id[1],
+                'cells': [list(pos) for pos in positions],
+                'solutions': solutions,
+                'solvable': None if solutions is None else solutions > 0,
+                'capped': solutions is not None and solutions >= cap,
+            })
+        placements.sort(key=lambda p: -1 if p['solutions'] is None else p['solutions'], reverse=True)
+        solvable = sum(1 for p in placements if p['solvable'])
+        return {
+            'pieceId': piece_id,
+            'placements': placements,
+            'timedOut': any(p['solutions'] is None for p in placements),
+            'message': error or f"{solvable} of {len(placements)} placement(s) keep the board solvable.",
+        }
 
-        columns = []
-        for piece_data in remaining_pieces_data:
-            columns.append(f"piece_{piece_data['id']}")
-        for pos in required_positions:
-            columns.append(f"pos_{pos[0]}_{pos[1]}")
+    def solveIncremental(self, board_state, batch_size=24, max_time=None, skip_count=0, resume_token=None):
+        """Return the next batch of solutions.
 
-        dlx = DancingLinks(columns)
-        placement_info = {}
-        for piece_data in remaining_pieces_data:
-            placements = self._get_placements(piece_data, occupied_positions)
-            for placement_id, piece_id, positions in placements:
-                if all(pos in required_positions for pos in positions):
-                    row_columns = [f"piece_{piece_id}"] + [f"pos_{pos[0]}_{pos[1]}" for pos in positions]
-                    dlx.add_row(placement_id, row_columns)
-                    placement_info[placement_id] = (piece_id, positions)
+        Without a ``resume_token`` the search starts from the beginning and
+        discards the first ``skip_count`` solutions.  With one (as returned in
+        ``resumeToken`` by a previous call) the search jumps straight down the
+        encoded branch path, so resuming costs O(depth) regardless of how many
+        solutions were already served.
+        """
+        start_time_ms = time.time() * 1000
 
-        if not placement_info:
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        if error:
             return {
                 'solutions': [], 'solutionCount': 0, 'solutionsReturned': 0, 'timedOut': False,
-                'exhausted': True, 'message': "Unsolvable: No valid placements found.", 'skipCount': skip_count
+                'exhausted': True, 'message': error, 'skipCount': skip_count, 'resumeToken': None
             }
 
+        fingerprint = self.fingerprint(board_state)
+        start_path = None
+        if resume_token:
+            start_path, skip_count = decode_resume_token(resume_token, fingerprint)
+            to_skip = 0
+        else:
+            to_skip = skip_count
+
         batch_solutions = []
-        total_solutions_found = 0
+        total_solutions_found = skip_count if resume_token else 0
         timed_out = False
         exhausted = False
-
-        def solution_callback(solution_placement_ids):
-            nonlocal batch_solutions, total_solutions_found, timed_out, exhausted
-            if timed_out or exhausted:
-                return
-            total_solutions_found += 1
-            if total_solutions_found <= skip_count:
-                return
-            final_board = [list(row) for row in board_state]
-            for placement_id in solution_placement_ids:
-                piece_id, positions = placement_info[placement_id]
-                for x, y in positions:
-                    final_board[y][x] = piece_id
-            batch_solutions.append({'board': final_board})
-            if len(batch_solutions) >= batch_size:
-                exhausted = False
-                raise StopIteration()
-            if max_time and max_time > 0 and (time.time() * 1000 - start_time_ms) >= max_time:
-                timed_out = True
-                raise StopIteration()
+        last_path = None
 
         try:
-            dlx.search([], solution_callback, None)
-            exhausted = True
-        except StopIteration:
-            if timed_out:
-                exhausted = False
+            for rows, path in dlx.search_generator(start_path=start_path, with_path=True):
+                if to_skip > 0:
+                    to_skip -= 1
+                    total_solutions_found += 1
+                    continue
+                total_solutions_found += 1
+                last_path = path
+                final_board = [list(row) for row in board_state]
+                for placement_id in rows:
+                    piece_id, positions = placement_info[placement_id]
+                    for x, y in positions:
+                        final_board[y][x] = piece_id
+                batch_solutions.append({'board': final_board})
+                if len(batch_solutions) >= batch_size:
+                    break
+                if max_time and max_time > 0 and (time.time() * 1000 - start_time_ms) >= max_time:
+                    timed_out = True
+                    break
+            else:
+                exhausted = True
         except Exception as e:
             traceback.print_exc()
             return {
                 'solutions': [], 'solutionCount': total_solutions_found, 'solutionsReturned': 0,
-                'timedOut': True, 'exhausted': False, 'message': 'Internal solver error.', 'skipCount': skip_count
+                'timedOut': True, 'exhausted': False, 'message': 'Internal solver error.',
+                'skipCount': skip_count, 'resumeToken': None
             }
 
         new_skip = skip_count + len(batch_solutions)
+        next_token = None
+        if not exhausted:
+            if last_path is not None:
+                next_token = encode_resume_token(next_start_path(last_path), new_skip, fingerprint)
+            else:
+                next_token = resume_token
         message = (
             "No solutions found." if total_solutions_found == 0 else
             ("Batch complete, more available." if (not exhausted and not timed_out) else
@@ -512,87 +1574,214 @@ class KanoodleSolver:
             'timedOut': timed_out,
             'exhausted': exhausted,
             'message': message,
-            'skipCount': new_skip
+            'skipCount': new_skip,
+            'resumeToken': next_token
         }
 
-    def build_incremental_session(self, board_state):
-        occupied_positions = set()
-        placed_piece_ids = set()
+    def copy_state(self, board_state):
+        """Private copy of ``board_state`` for a session (an empty board when None)."""
+        if not board_state:
+            return [[0] * self.width for _ in range(self.height)]
+        return [list(row) for row in board_state]
+
+    def render_solution(self, board_state, rows, placement_info):
+        """Solution payload for the placement ids ``rows`` completing ``board_state``."""
+        final_board = [list(row) for row in board_state]
+        for placement_id in rows:
+            piece_id, positions = placement_info[placement_id]
+            for x, y in positions:
+                final_board[y][x] = piece_id
+        return {'board': final_board}
+
+    def build_incremental_session(self, board_state, start_path=None, progress=None):
+        board_state, dlx, placement_info, error = self._build_matrix(board_state)
+        if error:
+            return None, None, {
+                'unsolvable': True,
+                'message': error
+            }
 
-        if board_state is None or not isinstance(board_state, list) or not board_state:
-            board_state = [[0] * self.width for _ in range(self.height)]
+        gen = dlx.search_generator(start_path=start_path, with_path=True, progress=progress)
+        return gen, placement_info, {
+            'unsolvable': False,
+            'board_state': [list(row) for row in board_state]
+        }
 
-        for r in range(self.height):
-            row = board_state[r] if r < len(board_state) else []
-            for c in range(self.width):
-                piece_id = row[c] if c < len(row) else 0
-                if piece_id != 0:
-                    occupied_positions.add((c, r))
-                    placed_piece_ids.add(piece_id)
+solverKanoodle = KanoodleSolver
 
-        remaining_pieces_data = [p for p in self.pieces_data if p['id'] not in placed_piece_ids]
 
-        required_positions = set()
-        for x in range(self.width):
-            for y in range(self.height):
-                pos = (x, y)
-                if pos not in occupied_positions:
-                    required_positions.add(pos)
+def _deadline(max_time):
+    return time.time() + max_time / 1000 if max_time else None
 
-        total_unplaced_cells = len(required_positions)
-        remaining_piece_cell_count = sum(len(p['shapeData']) for p in remaining_pieces_data)
+class _RankMemo(dict):
+    """Subtree-count memo holding at most ``max_entries`` counts.
 
-        if remaining_piece_cell_count != total_unplaced_cells:
-            return None, None, {
-                'unsolvable': True,
-                'message': "Unsolvable: Placed pieces do not leave a solvable empty space."
-            }
+    Any subset of the counts is still a valid memo, so a full memo drops
+    its oldest count for each new one. Counts are stored children before
+    parents, so the oldest tend to be deep subtrees that are cheap to
+    count again.
+    """
 
-        columns = []
-        for piece_data in remaining_pieces_data:
-            columns.append(f"piece_{piece_data['id']}")
-        for pos in required_positions:
-            columns.append(f"pos_{pos[0]}_{pos[1]}")
+    def __init__(self, max_entries):
+        super().__init__()
+        self.max_entries = max_entries
+
+    def __setitem__(self, key, value):
+        while len(self) >= self.max_entries:
+            try:
+                self.pop(next(iter(self)), None)
+            except (StopIteration, RuntimeError):
+                # Another thread emptied or resized the memo under us.
+                break
+        super().__setitem__(key, value)
+
+
+_RANK_MEMOS = OrderedDict()
+_RANK_MEMOS_LOCK = threading.Lock()
+
+def _rank_memo(fingerprint):
+    """Subtree-count memo for a board fingerprint.
+
+    The ``KANOODLE_RANK_MEMOS`` most recent are kept, and the oldest are
+    dropped whenever a memo is handed out while they hold more than
+    ``KANOODLE_RANK_MEMO_ENTRIES`` counts between them; that is also the
+    cap on any single memo.
+    """
+    max_entries = _setting('KANOODLE_RANK_MEMO_ENTRIES', 1_000_000)
+    with _RANK_MEMOS_LOCK:
+        memo = _RANK_MEMOS.get(fingerprint)
+        if memo is None:
+            memo = _RANK_MEMOS[fingerprint] = _RankMemo(max_entries)
+        _RANK_MEMOS.move_to_end(fingerprint)
+        while len(_RANK_MEMOS) > 1 and (len(_RANK_MEMOS) > _setting('KANOODLE_RANK_MEMOS', 8) or
+                                        sum(len(m) for m in _RANK_MEMOS.values()) > max_entries):
+            _RANK_MEMOS.popitem(last=False)
+    return memo
+
+
+# Solvers rebuilt from ``worker_spec`` inside process-pool workers, most recently used last.
+_WORKER_SOLVERS = OrderedDict()
+_WORKER_SOLVERS_MAX = 4
+
+def _worker_solver(spec):
+    width, height, pieces, pieces_hash, orientations, placement_table, mask = spec
+    key = (width, height, pieces_hash, mask)
+    solver = _WORKER_SOLVERS.get(key)
+    if solver is None:
+        solver = KanoodleSolver(width, height, pieces, pieces_hash=pieces_hash, orientations=orientations,
+                                placement_table=placement_table, mask=mask)
+        _WORKER_SOLVERS[key] = solver
+        while len(_WORKER_SOLVERS) > _WORKER_SOLVERS_MAX:
+            _WORKER_SOLVERS.popitem(last=False)
+    _WORKER_SOLVERS.move_to_end(key)
+    return solver
+
+def _solve_batch_chunk(job):
+    spec, boards = job
+    solver = _worker_solver(spec)
+    return [solver.solvePartial(*board) for board in boards]
+
+def _count_placements(dlx, row_ids, cap, deadline):
+    """Solutions (up to ``cap``) with each row selected in turn; None once ``deadline`` passes."""
+    counts = []
+    for row_id in row_ids:
+        if deadline is not None and time.time() >= deadline:
+            break
+        selected = dlx.select_rows([row_id])
+        try:
+            # search() may overshoot its limit by the solutions of the last branch.
+            counts.append(min(cap, dlx.search([], _discard, cap, DeadlineProgress(deadline) if deadline else None)))
+        except DeadlineReached:
+            break
+        dlx.unselect_rows(selected)
+    return counts + [None] * (len(row_ids) - len(counts))
 
-        dlx = DancingLinks(columns)
-        placement_info = {}
-        for piece_data in remaining_pieces_data:
-            placements = self._get_placements(piece_data, occupied_positions)
-            for placement_id, piece_id, positions in placements:
-                if all(pos in required_positions for pos in positions):
-                    row_columns = [f"piece_{piece_id}"] + [f"pos_{pos[0]}_{pos[1]}" for pos in positions]
-                    dlx.add_row(placement_id, row_columns)
-                    placement_info[placement_id] = (piece_id, positions)
+def _discard(_rows):
+    pass
 
-        if not placement_info:
-            return None, None, {
-                'unsolvable': True,
-                'message': "Unsolvable: No valid placements found."
-            }
+def _hint_job(job):
+    spec, board_state, row_ids, cap, deadline = job
+    _, dlx, _, _ = _worker_solver(spec)._build_matrix(board_state)
+    return _count_placements(dlx, row_ids, cap, deadline)
 
-        gen = dlx.search_generator()
-        return gen, placement_info, {
-            'unsolvable': False,
-            'board_state': [list(row) for row in board_state]
-        }
 
-solverKanoodle = KanoodleSolver
+def next_start_path(path):
+    """Branch path that resumes the search just after the solution at ``path``."""
+    if not path:
+        return [1]
+    return list(path[:-1]) + [path[-1] + 1]
+
+
+class ResumeTokenError(ValueError):
+    """A resume token that is malformed or was issued for another board and piece set."""
+
+
+def encode_resume_token(start_path, served, fingerprint):
+    payload = json.dumps({'v': 1, 'k': fingerprint, 'n': served, 'p': list(start_path)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_resume_token(token, fingerprint=None):
+    """Return ``(start_path, served)`` from a token, validating it against ``fingerprint``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        start_path = [int(i) for i in payload['p']]
+        served = int(payload.get('n', 0))
+    except Exception:
+        raise ResumeTokenError("Invalid resume token.")
+    if payload.get('v') != 1 or any(i < 0 for i in start_path) or served < 0:
+        raise ResumeTokenError("Invalid resume token.")
+    if fingerprint is not None and payload.get('k') != fingerprint:
+        raise ResumeTokenError("Resume token does not match this board and piece set.")
+    return start_path, served
+
 
 class SolverSession:
-    def __init__(self, solver: solverKanoodle, board_state):
-        gen, placement_info, meta = solver.build_incremental_session(board_state)
+    def __init__(self, solver: solverKanoodle, board_state, resume_token=None):
+        self.board_state = solver.copy_state(board_state)
+        self.fingerprint = solver.fingerprint(self.board_state)
+        start_path, served = None, 0
+        if resume_token:
+            start_path, served = decode_resume_token(resume_token, self.fingerprint)
+        self.progress = SearchProgress()
+        gen, placement_info, meta = solver.build_incremental_session(board_state, start_path=start_path,
+                                                                     progress=self.progress)
         if meta and meta.get('unsolvable'):
             raise ValueError(meta.get('message', 'Unsolvable'))
         self.solver = solver
-        self.board_state = [list(row) for row in board_state] if board_state else [[0]*solver.width for _ in range(solver.height)]
         self.gen = gen
         self.placement_info = placement_info
-        self.total_found = 0
+        self.total_found = served
+        self.next_path = start_path or []
         self.exhausted = False
         self.lock = threading.Lock()
         self.last_used_ms = time.time() * 1000
 
-    def next_batch(self, batch_size=24, max_time=None):
+    def next_solution(self):
+        """Advance the generator by one solution; returns ``None`` once exhausted.
+
+        Callers must hold ``self.lock``.
+        """
+        if self.exhausted:
+            return None
+        try:
+            rows, path = next(self.gen)
+        except StopIteration:
+            self.exhausted = True
+            return None
+        self.next_path = next_start_path(path)
+        self.total_found += 1
+        return self.solver.render_solution(self.board_state, rows, self.placement_info)
+
+    def next_batch(self, batch_size=24, max_time=None, cancel=None, start=None):
+        """Return ``(batch, total_found, exhausted, timed_out)``.
+
+        Setting the optional ``cancel`` event stops the batch early, the same
+        way an expired ``max_time`` does. With ``start`` the batch begins at
+        that position if the session is behind it (pages another client's
+        cached solutions already served); it never moves back.
+        """
         if self.exhausted:
             return [], self.total_found, True, False
 
@@ -605,51 +1794,457 @@ class SolverSession:
                 if max_time and max_time > 0 and (time.time() * 1000 - start_ms) >= max_time:
                     timed_out = True
                     break
+                if cancel is not None and cancel.is_set():
+                    timed_out = True
+                    break
+                sol = self.next_solution()
+                if sol is None:
+                    break
+                if start is None or self.total_found > start:
+                    batch.append(sol)
+
+            self.last_used_ms = time.time() * 1000
+
+        return batch, self.total_found, self.exhausted, timed_out
+
+    def resume_token(self):
+        """Opaque token that lets any worker continue after the last served solution."""
+        if self.exhausted:
+            return None
+        return encode_resume_token(self.next_path, self.total_found, self.fingerprint)
+
+
+class SharedSolutionStream:
+    """Single-flight producer for one (board, piece catalogue) pair.
+
+    Every solution is generated once and published to ``solutions``; any
+    number of ``StreamCursor`` objects read from it at their own offsets.
+    Only one caller drives the DLX generator at a time, the rest wait on
+    ``cond`` and are woken as solutions are published.
+
+    Only the latest ``window`` solutions are kept (``offset`` is the stream
+    position of ``solutions[0]``). A cursor left behind the window is handed
+    a resume token for its position and carries on with a private session.
+    """
+
+    def __init__(self, solver: solverKanoodle, board_state, window=None):
+        self.solver = solver
+        self.board_state = board_state
+        self.session = None
+        self.error = None
+        self.solutions = []
+        self.next_paths = []
+        self.offset = 0
+        self.base_path = []
+        self.window = window or _setting('KANOODLE_STREAM_WINDOW', 10_000)
+        self.cursors = weakref.WeakSet()
+        self.exhausted = False
+        self.producing = False
+        self.build_lock = threading.Lock()
+        self.cond = threading.Condition()
+
+    def start(self):
+        """Build the DLX matrix once; raises ``ValueError`` for unsolvable boards."""
+        with self.build_lock:
+            if self.session is None and self.error is None:
                 try:
-                    rows = next(self.gen)
-                except StopIteration:
+                    self.session = SolverSession(self.solver, self.board_state)
+                except ValueError as ve:
+                    self.error = str(ve)
                     self.exhausted = True
+        if self.error:
+            raise ValueError(self.error)
+        return self
+
+    @property
+    def fingerprint(self):
+        return self.start().session.fingerprint
+
+    def published(self):
+        with self.cond:
+            return self.offset + len(self.solutions)
+
+    def attach(self, position):
+        """A ``StreamCursor`` at ``position``, or None if that is outside the retained window."""
+        self.start()
+        with self.cond:
+            if not self.offset <= position <= self.offset + len(self.solutions):
+                return None
+            cursor = StreamCursor(self, position)
+            self.cursors.add(cursor)
+            return cursor
+
+    def _path_at(self, position):
+        # Callers hold ``cond``; ``position`` is at least ``offset``.
+        return self.next_paths[position - 1 - self.offset] if position > self.offset else self.base_path
+
+    def token_at(self, position):
+        with self.cond:
+            if self.exhausted and position >= self.offset + len(self.solutions):
+                return None
+            path = self._path_at(position)
+        return encode_resume_token(path, position, self.fingerprint)
+
+    def _trim(self, keep_from):
+        """Drop solutions beyond ``window``, but none at or after ``keep_from``. Callers hold ``cond``."""
+        drop = min(len(self.solutions) - self.window, keep_from - self.offset)
+        if drop <= 0:
+            return
+        new_offset = self.offset + drop
+        for cursor in list(self.cursors):
+            if cursor.fallback_token is None and cursor.position < new_offset:
+                cursor.fallback_token = encode_resume_token(self._path_at(cursor.position), cursor.position,
+                                                            self.session.fingerprint)
+        self.base_path = self.next_paths[drop - 1]
+        del self.solutions[:drop]
+        del self.next_paths[:drop]
+        self.offset = new_offset
+
+    def _produce(self, start, target, deadline_ms, cancel=None):
+        session = self.session
+        timed_out = False
+        with session.lock:
+            while True:
+                with self.cond:
+                    if self.offset + len(self.solutions) >= target:
+                        break
+                if deadline_ms is not None and time.time() * 1000 >= deadline_ms:
+                    timed_out = True
                     break
-                final_board = [list(row) for row in self.board_state]
-                for placement_id in rows:
-                    piece_id, positions = self.placement_info[placement_id]
-                    for x, y in positions:
-                        final_board[y][x] = piece_id
-                batch.append({'board': final_board})
-                self.total_found += 1
+                if cancel is not None and cancel.is_set():
+                    timed_out = True
+                    break
+                sol = session.next_solution()
+                with self.cond:
+                    if sol is None:
+                        self.exhausted = True
+                        self.cond.notify_all()
+                        break
+                    self.solutions.append(sol)
+                    self.next_paths.append(session.next_path)
+                    self._trim(start)
+                    self.cond.notify_all()
+            session.last_used_ms = time.time() * 1000
+        return timed_out
+
+    def read(self, cursor, batch_size=24, max_time=None, cancel=None):
+        """Return ``(batch, exhausted, timed_out)`` for the next ``batch_size`` solutions at ``cursor``.
+
+        Advances ``cursor.position``; ``batch`` is None once the cursor has
+        fallen behind the window (see ``StreamCursor.fallback_token``).
+        """
+        self.start()
+        start = cursor.position
+        end = start + batch_size
+        deadline_ms = time.time() * 1000 + max_time if max_time and max_time > 0 else None
+        timed_out = False
+        while True:
+            with self.cond:
+                while not (self.offset + len(self.solutions) >= end or self.exhausted or timed_out
+                           or cursor.fallback_token is not None):
+                    if not self.producing:
+                        self.producing = True
+                        break
+                    remaining = None if deadline_ms is None else (deadline_ms - time.time() * 1000) / 1000.0
+                    if (remaining is not None and remaining <= 0) or (cancel is not None and cancel.is_set()):
+                        timed_out = True
+                        break
+                    if cancel is not None:
+                        remaining = 0.25 if remaining is None else min(remaining, 0.25)
+                    self.cond.wait(remaining)
+                else:
+                    if cursor.fallback_token is not None:
+                        return None, False, False
+                    batch = self.solutions[start - self.offset:end - self.offset]
+                    cursor.position = start + len(batch)
+                    exhausted = self.exhausted and cursor.position >= self.offset + len(self.solutions)
+                    return batch, exhausted, timed_out and not exhausted
+                if timed_out:
+                    continue
+            try:
+                timed_out = self._produce(start, end, deadline_ms, cancel)
+            finally:
+                with self.cond:
+                    self.producing = False
+                    self.cond.notify_all()
+
+
+class StreamCursor:
+    """Per-client read position on a ``SharedSolutionStream`` (create with ``SharedSolutionStream.attach``).
+
+    ``position`` only moves under the stream's ``cond``. When the stream
+    trims past it, ``fallback_token`` is set and the next batch switches
+    the cursor to a private ``SolverSession`` resumed from that token.
+    """
+
+    def __init__(self, stream: SharedSolutionStream, position=0):
+        self.stream = stream
+        self.position = position
+        self.exhausted = False
+        self.fallback_token = None
+        self.private = None
+        self.lock = threading.Lock()
+        self.last_used_ms = time.time() * 1000
 
+    def next_batch(self, batch_size=24, max_time=None, cancel=None, start=None):
+        """Same as ``SolverSession.next_batch``."""
+        with self.lock:
+            batch = None
+            if self.private is None and start is not None:
+                with self.stream.cond:
+                    self.position = max(self.position, start)
+            if self.private is None:
+                batch, self.exhausted, timed_out = self.stream.read(self, batch_size, max_time, cancel)
+                if batch is None:
+                    self.private = SolverSession(self.stream.solver, self.stream.board_state,
+                                                 resume_token=self.fallback_token)
+            if batch is None:
+                batch, self.position, self.exhausted, timed_out = self.private.next_batch(batch_size, max_time, cancel,
+                                                                                         start)
             self.last_used_ms = time.time() * 1000
+        return batch, self.position, self.exhausted, timed_out
 
-        return batch, self.total_found, self.exhausted, timed_out
+    def resume_token(self):
+        if self.exhausted:
+            return None
+        if self.private is not None:
+            return self.private.resume_token()
+        with self.stream.cond:
+            token = self.fallback_token
+        return token or self.stream.token_at(self.position)
 
+    @property
+    def progress(self):
+        return (self.private or self.stream.session).progress
 
-_SESSIONS = {}
-_SESSIONS_MAX = 32
 
-def _evict_old_sessions():
-    if len(_SESSIONS) <= _SESSIONS_MAX:
-        return
-    oldest_key = None
-    oldest_time = float('inf')
-    for k, sess in _SESSIONS.items():
-        if sess.last_used_ms < oldest_time:
-            oldest_time = sess.last_used_ms
-            oldest_key = k
-    if oldest_key is not None:
-        _SESSIONS.pop(oldest_key, None)
+_STREAMS = weakref.WeakValueDictionary()
+_STREAMS_LOCK = threading.Lock()
+
+def get_shared_stream(shared_key, solver: solverKanoodle, board_state):
+    """Return the in-flight stream for ``shared_key`` (see ``make_cache_keys``), creating it if needed."""
+    with _STREAMS_LOCK:
+        stream = _STREAMS.get(shared_key)
+        if stream is None:
+            stream = SharedSolutionStream(solver, board_state)
+            _STREAMS[shared_key] = stream
+    return stream.start()
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def estimate_session_nodes(placement_info):
+    """Rough DLX size of a session: one node per covered cell plus the piece column."""
+    return sum(len(positions) + 1 for _, positions in placement_info.values())
+
+
+class SessionStore:
+    """Thread-safe LRU of solver sessions bounded by count, DLX nodes and idle time.
+
+    Entries live in an ``OrderedDict`` in recency order, so lookups, touches and
+    evictions are O(1). Each entry carries a ``weight`` (estimated DLX node
+    count); the least recently used entries are dropped while the total weight
+    exceeds ``max_nodes``. Entries idle for longer than ``idle_ttl_s`` are
+    removed by a daemon reaper thread started on first insert.
+
+    Entries can also reference a ``shared`` object (a ``SharedSolutionStream``)
+    whose ``shared_weight`` is counted once while any entry refers to it and
+    released when the last one leaves. ``on_remove(key, session)`` is called
+    for every entry deleted, replaced or evicted.
+    """
+
+    def __init__(self, max_sessions=32, max_nodes=2_000_000, idle_ttl_s=900, reap_interval_s=30, on_remove=None):
+        self.max_sessions = max_sessions
+        self.max_nodes = max_nodes
+        self.idle_ttl_s = idle_ttl_s
+        self.reap_interval_s = reap_interval_s
+        self.on_remove = on_remove
+        self._entries = OrderedDict()
+        self._shared = {}
+        self._nodes = 0
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop = threading.Event()
+        self._stats = {'hits': 0, 'misses': 0, 'evicted_lru': 0, 'evicted_memory': 0, 'evicted_ttl': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry[2] = time.monotonic()
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, session, weight=1, shared=None, shared_weight=0):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._release(key, old)
+            self._entries[key] = [session, weight, time.monotonic(), shared]
+            self._nodes += weight
+            if shared is not None:
+                refs = self._shared.setdefault(shared, [0, shared_weight])
+                if refs[0] == 0:
+                    self._nodes += refs[1]
+                refs[0] += 1
+            while len(self._entries) > self.max_sessions:
+                self._pop_oldest('evicted_lru')
+            while self._nodes > self.max_nodes and len(self._entries) > 1:
+                self._pop_oldest('evicted_memory')
+        self._ensure_reaper()
+        return session
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._release(key, entry)
+
+    def _release(self, key, entry):
+        session, weight, _, shared = entry
+        self._nodes -= weight
+        if shared is not None:
+            refs = self._shared[shared]
+            refs[0] -= 1
+            if refs[0] == 0:
+                self._nodes -= refs[1]
+                del self._shared[shared]
+        if self.on_remove is not None:
+            self.on_remove(key, session)
+
+    def _pop_oldest(self, reason):
+        key, entry = self._entries.popitem(last=False)
+        self._release(key, entry)
+        self._stats[reason] += 1
+
+    def reap(self):
+        """Drop entries idle for longer than ``idle_ttl_s``; returns how many were removed."""
+        if not self.idle_ttl_s:
+            return 0
+        cutoff = time.monotonic() - self.idle_ttl_s
+        removed = 0
+        with self._lock:
+            while self._entries:
+                key, (_, _, touched, _) = next(iter(self._entries.items()))
+                if touched > cutoff:
+                    break
+                self._pop_oldest('evicted_ttl')
+                removed += 1
+        return removed
+
+    def _ensure_reaper(self):
+        if self._reaper is not None or not self.idle_ttl_s:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name='kanoodle-session-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval_s):
+            try:
+                self.reap()
+            except Exception:
+                traceback.print_exc()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                'sessions': len(self._entries),
+                'nodes': self._nodes,
+                'maxSessions': self.max_sessions,
+                'maxNodes': self.max_nodes,
+                'idleTtlSeconds': self.idle_ttl_s,
+            })
+            return out
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_PROGRESS = {}
+_PROGRESS_LOCK = threading.Lock()
+
+def track_progress(progress_key, progress=None):
+    """Publish ``progress`` (a fresh ``SearchProgress`` by default) under ``progress_key``."""
+    progress = progress or SearchProgress()
+    with _PROGRESS_LOCK:
+        _PROGRESS[progress_key] = progress
+    return progress
+
+def get_progress(progress_key):
+    with _PROGRESS_LOCK:
+        return _PROGRESS.get(progress_key)
+
+def _untrack_session(session_key, session):
+    """Drop the progress a removed session published, unless a newer search has replaced it."""
+    progress = getattr(session, 'progress', None)
+    with _PROGRESS_LOCK:
+        if progress is not None and _PROGRESS.get(session_key) is progress:
+            del _PROGRESS[session_key]
+
+_SESSIONS = SessionStore(
+    max_sessions=_setting('KANOODLE_SESSIONS_MAX', 32),
+    max_nodes=_setting('KANOODLE_SESSIONS_MAX_NODES', 2_000_000),
+    idle_ttl_s=_setting('KANOODLE_SESSIONS_IDLE_TTL', 900),
+    on_remove=_untrack_session,
+)
 
 def get_session(session_key):
     return _SESSIONS.get(session_key)
 
-def create_session(session_key, solver: solverKanoodle, board_state):
-    sess = SolverSession(solver, board_state)
-    _SESSIONS[session_key] = sess
-    _evict_old_sessions()
-    return sess
+def session_stats():
+    return _SESSIONS.stats()
+
+def create_session(session_key, solver: solverKanoodle, board_state, resume_token=None, shared_key=None):
+    """Create the cursor for ``session_key``.
+
+    With ``shared_key`` the cursor reads from the single shared producer for
+    that board and catalogue; a resume token outside what the producer has
+    retained falls back to a private session resumed from the token.
+    """
+    if shared_key is not None:
+        stream = get_shared_stream(shared_key, solver, board_state)
+        position = 0
+        if resume_token:
+            _, position = decode_resume_token(resume_token, stream.fingerprint)
+        sess = stream.attach(position)
+        if sess is not None:
+            # Cursors only hold an offset; the stream's matrix is charged while
+            # any of them is in the store.
+            track_progress(session_key, sess.progress)
+            return _SESSIONS.put(session_key, sess, 1, shared=stream,
+                                 shared_weight=estimate_session_nodes(stream.session.placement_info))
+    sess = SolverSession(solver, board_state, resume_token=resume_token)
+    track_progress(session_key, sess.progress)
+    return _SESSIONS.put(session_key, sess, estimate_session_nodes(sess.placement_info))
 
 def delete_session(session_key):
-    _SESSIONS.pop(session_key, None)
+    _SESSIONS.delete(session_key)
+
 
+async def get_async_redis_client():
+    """``redis.asyncio`` counterpart of ``get_redis_client`` for the ASGI views."""
+    if aioredis is None:
+        return None
+    try:
+        client = aioredis.Redis(host='127.0.0.1', port=6379, db=0, decode_responses=True)
+        await client.ping()
+        return client
+    except Exception:
+        return None
 
 def get_redis_client():
     if redis is None:
@@ -661,21 +2256,101 @@ def get_redis_client():
     except Exception:
         return None
 
+_CELL_CHARS = '.123456789abcdefghijklmnopqrstuvwxyz'
+COMPACT_MAX_PIECE_ID = len(_CELL_CHARS) - 1
+
+def board_to_string(board):
+    """Row-major one-character-per-cell encoding ('.' empty, piece ids 1-35 in base 36).
+
+    Raises ``ValueError`` for a piece id outside that range.
+    """
+    try:
+        return ''.join(_CELL_CHARS[c] for row in board for c in row)
+    except (IndexError, TypeError):
+        bad = next(c for row in board for c in row
+                   if not isinstance(c, int) or not 0 <= c <= COMPACT_MAX_PIECE_ID)
+        raise ValueError(f"Piece id {bad!r} cannot be written in the compact format "
+                         f"(ids 1-{COMPACT_MAX_PIECE_ID} only).")
+
+def board_from_string(text, width):
+    cells = [_CELL_CHARS.index(ch) for ch in text]
+    return [cells[i:i + width] for i in range(0, len(cells), width)]
+
+
+SOLUTION_CACHE_TTL = 24 * 3600
+
+def _queue_append(pipe, base_key, meta_key, boards, total, exhausted, ttl, write_meta=True):
+    for board in boards:
+        pipe.rpush(base_key, json.dumps(board, separators=(',', ':')))
+    if write_meta:
+        pipe.hset(meta_key, mapping={'total': str(total), 'exhausted': '1' if exhausted else '0'})
+    pipe.expire(base_key, ttl)
+    pipe.expire(meta_key, ttl)
+
+def _unseen(start, cached_len, cached_total, boards, total, exhausted):
+    """``(boards, write_meta)`` for a batch that begins at list index ``start``.
+
+    Only boards past the cached list's end are new; a batch that starts past
+    it would leave a gap and is skipped. Meta is only moved forward.
+    """
+    if start > cached_len:
+        return [], False
+    return boards[cached_len - start:], exhausted or total > int(cached_total or -1)
+
+def append_cached_solutions(redis_client, base_key, meta_key, boards, total, exhausted, replace=False,
+                            ttl=SOLUTION_CACHE_TTL, start=None):
+    """Append solved boards to the Redis list for ``base_key`` and update its meta hash.
+
+    With ``start`` (the list index of ``boards[0]``) the append is a WATCH
+    transaction that only pushes boards past the list's current end, so
+    producers racing over the same solutions cannot push them twice.
+    """
+    if start is None:
+        pipe = redis_client.pipeline()
+        if replace:
+            pipe.delete(base_key)
+        _queue_append(pipe, base_key, meta_key, boards, total, exhausted, ttl)
+        pipe.execute()
+        return
+
+    def _append(pipe):
+        fresh, write_meta = _unseen(start, pipe.llen(base_key), pipe.hget(meta_key, 'total'), boards, total, exhausted)
+        pipe.multi()
+        _queue_append(pipe, base_key, meta_key, fresh, total, exhausted, ttl, write_meta)
+
+    redis_client.transaction(_append, base_key, meta_key)
+
+async def append_cached_solutions_async(redis_client, base_key, meta_key, boards, total, exhausted, start,
+                                        ttl=SOLUTION_CACHE_TTL):
+    """``redis.asyncio`` counterpart of ``append_cached_solutions`` with ``start``."""
+    async def _append(pipe):
+        fresh, write_meta = _unseen(start, await pipe.llen(base_key), await pipe.hget(meta_key, 'total'),
+                                    boards, total, exhausted)
+        pipe.multi()
+        _queue_append(pipe, base_key, meta_key, fresh, total, exhausted, ttl, write_meta)
+
+    await redis_client.transaction(_append, base_key, meta_key)
+
 def _hash_json(obj):
     s = json.dumps(obj, separators=(',', ':'), sort_keys=True)
     return hashlib.sha1(s.encode('utf-8')).hexdigest()
 
-def hash_board_state(width, height, board_state):
+def hash_board_state(width, height, board_state, mask=None):
+    """Digest of a board state; with a mask (see ``mask_cells``), cells outside it are ignored."""
     if board_state is None:
         board_state = [[0]*width for _ in range(height)]
-    return _hash_json({'w': width, 'h': height, 'b': board_state})
+    mask = mask_cells(width, height, mask)
+    if mask is None:
+        return _hash_json({'w': width, 'h': height, 'b': board_state})
+    board_state = [[cell if (x, y) in mask else 0 for x, cell in enumerate(row)] for y, row in enumerate(board_state)]
+    return _hash_json({'w': width, 'h': height, 'm': sorted(mask), 'b': board_state})
 
 def hash_pieces(pieces_for_solver):
     minimal = sorted(((int(p['id']), p['shapeData']) for p in pieces_for_solver), key=lambda x: x[0])
     return _hash_json(minimal)
 
-def make_cache_keys(width, height, board_state, pieces_for_solver):
-    bh = hash_board_state(width, height, board_state)
-    ph = hash_pieces(pieces_for_solver)
+def make_cache_keys(width, height, board_state, pieces_for_solver, pieces_hash=None, mask=None):
+    bh = hash_board_state(width, height, board_state, mask)
+    ph = pieces_hash or hash_pieces(pieces_for_solver)
     base = f"kanoodle:solutions:{width}x{height}:{ph}:{bh}"
     return base, base+":meta"
@@ -1,24 +1,52 @@
+import asyncio
+import functools
+import ipaddress
 import logging
+import threading
+import time
 
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition
 import json
-from .models import KanoodleBoard, Piece, partialSolution
+from .models import KanoodleBoard, partialSolution
 logger = logging.getLogger(__name__)
 from .util import (
+    DeadlineReached,
+    ResumeTokenError,
     KanoodleSolver,
     get_session,
     create_session,
     delete_session,
     get_redis_client,
+    get_async_redis_client,
     make_cache_keys,
+    append_cached_solutions,
+    append_cached_solutions_async,
+    session_stats,
+    _setting,
+    get_progress,
+    track_progress,
 )
+from .pool import SolverOverloaded, get_process_pool, get_solver_pool
+from .aggregate import aggregate_solutions
+from .capture import capture_solves
+from .constraints import compile_constraints
+from .pyramid import PyramidSolver, get_pyramid_table
+from .nqueens import count_solutions, iter_solutions
+from .exactcover import ExactCoverSolver
+from .cursors import get_cursor_store
+from .catalogue import get_catalogue
+from .warmstart import get_placement_table
+from .wire import WireFormat
 
 
 def render_puzzle(request):
     board = KanoodleBoard.objects.first()
-    pieces = Piece.objects.all()
+    pieces = get_catalogue().pieces
     solution, _ = partialSolution.objects.get_or_create(board=board, defaults={'state_data': {}})
     context = {'board': board, 'pieces': pieces, 'solution_id': solution.id}
     return render(request, 'index.html', context)
@@ -26,6 +54,204 @@ def render_puzzle(request):
 kanoodle_solver = render_puzzle
 
 
+def _trusted_proxy(addr, proxies):
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _client_id(request):
+    """Address the per-client admission cap counts against.
+
+    ``REMOTE_ADDR``, unless it is one of ``KANOODLE_TRUSTED_PROXIES`` (IPs
+    or networks); then X-Forwarded-For is read from the right, skipping
+    trusted hops, and the first address a trusted proxy added is used.
+    Entries to its left are whatever the client sent and are ignored.
+    """
+    remote = request.META.get('REMOTE_ADDR')
+    proxies = _setting('KANOODLE_TRUSTED_PROXIES', ())
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if not forwarded or not proxies or not _trusted_proxy(remote, proxies):
+        return remote
+    for addr in reversed(forwarded.split(',')):
+        addr = addr.strip()
+        if addr and not _trusted_proxy(addr, proxies):
+            return addr
+    return remote
+
+
+def _overloaded_response(exc):
+    resp = JsonResponse({'success': False, 'error': str(exc), 'retryAfter': exc.retry_after}, status=exc.status)
+    resp['Retry-After'] = str(exc.retry_after)
+    return resp
+
+
+def _solve_context(solution_id):
+    """Cursor record, board, catalogue and solver for a solve request."""
+    solution_record = get_cursor_store().get(solution_id)
+    board = solution_record.board
+    catalogue = get_catalogue()
+    solver = KanoodleSolver(board.width, board.height, catalogue.pieces,
+                            pieces_hash=catalogue.digest, orientations=catalogue.orientations,
+                            placement_table=get_placement_table(board.width, board.height, catalogue, board.mask),
+                            mask=board.mask)
+    return solution_record, board, catalogue, solver
+
+
+def _capped(name, value, default, limit_setting, limit):
+    """``value`` (``default`` when missing) as a positive int, clamped to the ``limit_setting`` maximum."""
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer.")
+    if value < 1:
+        raise ValueError(f"{name} must be at least 1.")
+    return min(value, _setting(limit_setting, limit))
+
+
+# Actions that do not search under ``constraints``; only a plain solve compiles them.
+_UNCONSTRAINED_ACTIONS = ('init', 'next', 'estimate', 'page', 'rank', 'aggregate', 'sample', 'hint')
+
+
+def _check_constraints(action, data):
+    """ValueError when ``constraints`` come with an action that would ignore them."""
+    if data.get('constraints') and action in _UNCONSTRAINED_ACTIONS:
+        raise ValueError(f"constraints are only supported by a plain solve, not action {action!r}.")
+
+
+def _one_shot_job(action, data, solver, partial_board, max_time, progress_key):
+    """Solver callable and arguments for the non-paging actions; ValueError for malformed parameters."""
+    _check_constraints(action, data)
+    if action == 'estimate':
+        probes = _capped('probes', data.get('probes'), 200, 'KANOODLE_MAX_PROBES', 5000)
+        return solver.estimate, (partial_board, probes, max_time)
+    if action == 'page':
+        batch_size = _capped('batchSize', data.get('batchSize') or None, 24, 'KANOODLE_MAX_BATCH_SIZE', 500)
+        try:
+            offset = int(data.get('offset') or 0)
+        except (TypeError, ValueError):
+            raise ValueError("offset must be an integer.")
+        if offset < 0:
+            raise ValueError("offset must not be negative.")
+        return solver.page, (partial_board, offset, batch_size, max_time)
+    if action == 'rank':
+        return _rank_result, (solver, partial_board, data.get('solution'), max_time)
+    if action == 'aggregate':
+        shard_depth = _capped('shardDepth', data.get('shardDepth'), 1, 'KANOODLE_MAX_SHARD_DEPTH', 3)
+        return _aggregate_result, (solver, partial_board, max_time, shard_depth)
+    if action == 'sample':
+        samples = _capped('samples', data.get('samples') or data.get('sampleLimit') or None, 10,
+                          'KANOODLE_MAX_SAMPLES', 1000)
+        return solver.sample, (partial_board, samples, data.get('seed'), max_time)
+    if action == 'hint':
+        try:
+            piece_id = int(data.get('pieceId'))
+        except (TypeError, ValueError):
+            raise ValueError("pieceId must be an integer.")
+        cap = _capped('cap', data.get('cap'), 100, 'KANOODLE_MAX_HINT_CAP', 10_000)
+        return solver.hint, (partial_board, piece_id, cap, max_time,
+                             _setting('KANOODLE_HINT_WORKERS', 1))
+    sample_limit = data.get('sampleLimit') or data.get('max_samples')
+    constraints = compile_constraints(data.get('constraints'), solver.width, solver.height,
+                                      piece_ids=[p['id'] for p in solver.pieces_data])
+    solve = functools.partial(solver.solvePartial, progress=track_progress(progress_key))
+    return solve, (partial_board, sample_limit, max_time, constraints)
+
+
+def _progress_response(progress_key):
+    """Snapshot of the latest search started under ``progress_key``, if any."""
+    progress = get_progress(progress_key)
+    if progress is None:
+        return JsonResponse({'success': True, 'active': False})
+    payload = progress.snapshot()
+    payload.update({'success': True, 'active': not progress.done})
+    return JsonResponse(payload)
+
+
+def _rank_result(solver, partial_board, solution_board, max_time):
+    try:
+        rank = solver.rank(partial_board, solution_board, max_time)
+    except DeadlineReached:
+        return {'rank': None, 'timedOut': True,
+                'message': 'Time limit reached while counting solutions; retry to continue counting.'}
+    return {'rank': rank, 'timedOut': False, 'message': 'Not a solution of this board.' if rank is None else f'Solution #{rank + 1}.'}
+
+
+def _aggregate_result(solver, partial_board, max_time, shard_depth):
+    result = aggregate_solutions(solver, partial_board, max_time=max_time, shard_depth=shard_depth,
+                                 workers=_setting('KANOODLE_AGGREGATE_WORKERS', 1))
+    for key in ('cellPieceCounts', 'contacts'):
+        if key in result:
+            result[key] = result[key].tolist()
+    return result
+
+
+def _one_shot_response(action, result, wire, partial_board):
+    result['success'] = True
+    if action not in ('estimate', 'hint', 'rank', 'aggregate') and (result.get('solutionCount', 0) == 0) and not result.get('timedOut'):
+        result['message'] = 'No solutions found.'
+    if 'solutions' in result:
+        result['solutions'] = wire.solutions(result['solutions'], partial_board)
+    return wire.response(result)
+
+
+def _token_error_response(exc):
+    return JsonResponse({"error": str(exc), "success": False}, status=400)
+
+
+def _unsolvable_response(message):
+    return JsonResponse({'success': True, 'solutions': [], 'solutionsReturned': 0, 'solutionCount': 0, 'timedOut': False, 'exhausted': True, 'message': message}, status=200)
+
+
+def _cached_page(meta, rng, available_len, cursor):
+    """Decode a Redis page; returns ``(out_batch, total_found, exhausted)``."""
+    out_batch = []
+    for item in rng:
+        try:
+            out_batch.append({'board': json.loads(item)})
+        except Exception:
+            break
+    total = int(meta.get('total', '0')) if meta else 0
+    next_cursor = cursor + len(out_batch)
+    total_found = max(total, available_len, next_cursor)
+    meta_exhausted = bool(meta.get('exhausted', '0') == '1') if meta else False
+    exhausted = (next_cursor >= available_len) and meta_exhausted
+    return out_batch, total_found, exhausted
+
+
+def _batch_response(out_batch, total_found, exhausted, timed_out, served_from_cache, session, wire, partial_board):
+    if len(out_batch) == 0 and not timed_out and (exhausted or total_found == 0):
+        msg = 'No solutions found.'
+    elif exhausted:
+        msg = 'All solutions found.'
+    elif timed_out:
+        msg = 'Time limit reached; partial batch.'
+    else:
+        msg = 'Batch complete, more available.'
+    response_payload = {
+        'success': True,
+        'solutions': wire.solutions(out_batch, partial_board),
+        'solutionsReturned': len(out_batch),
+        'solutionCount': total_found,
+        'timedOut': timed_out,
+        'exhausted': exhausted,
+        'message': msg,
+        'cache': ('hit' if served_from_cache else 'miss'),
+        'resumeToken': None if served_from_cache else session.resume_token()
+    }
+    resp = wire.response(response_payload)
+    try:
+        resp['X-Kanoodle-Cache'] = 'HIT' if served_from_cache else 'MISS'
+    except Exception:
+        pass
+    return resp
+
+
+@capture_solves
 @csrf_exempt
 def solve_partial_batch(request, solution_id):
     if request.method != 'POST':
@@ -34,38 +260,41 @@ def solve_partial_batch(request, solution_id):
     try:
         data = json.loads(request.body)
         partial_board = data.get('partialBoard') or data.get('partial_board')
-        sample_limit = data.get('sampleLimit') or data.get('max_samples')
         max_time = data.get('maxTime') or data.get('max_time')
         action = data.get('action')
-        batch_size = data.get('batchSize', 24)
-
-        solution_record = partialSolution.objects.get(pk=solution_id)
-        board = solution_record.board
-
-        pieces_for_solver = []
-        for p in Piece.objects.all():
-            pieces_for_solver.append({
-                'id': p.pk,
-                'name': p.name,
-                'shapeData': p.shapeData,
-                'color': p.color,
-            })
+        resume_token = data.get('resumeToken') or data.get('resume_token')
+        session_key = f"solve:{solution_id}"
+        if action == 'progress':
+            return _progress_response(session_key)
+        try:
+            _check_constraints(action, data)
+            batch_size = _capped('batchSize', data.get('batchSize'), 24, 'KANOODLE_MAX_BATCH_SIZE', 500)
+            wire = WireFormat.negotiate(request, data)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc), "success": False}, status=400)
 
-        solver = KanoodleSolver(board.width, board.height, pieces_for_solver)
+        solution_record, board, catalogue, solver = _solve_context(solution_id)
+        pool = get_solver_pool()
+        client = _client_id(request)
 
         if action in ('init', 'next'):
-            session_key = f"solve:{solution_id}"
+            base_key, meta_key = make_cache_keys(board.width, board.height, partial_board, catalogue.pieces,
+                                                 pieces_hash=catalogue.digest, mask=board.mask)
             if action == 'init':
                 delete_session(session_key)
-                solution_record.state_data = {'mode': 'incremental', 'cursor': 0}
+                solution_record.state_data = {'mode': 'incremental', 'cursor': 0, 'board': partial_board}
                 solution_record.save(update_fields=['state_data'])
 
             session = get_session(session_key)
             if session is None:
                 try:
-                    session = create_session(session_key, solver, partial_board)
+                    session = pool.run(create_session, session_key, solver, partial_board,
+                                       resume_token=resume_token if action == 'next' else None,
+                                       shared_key=base_key, client=client)
+                except ResumeTokenError as exc:
+                    return _token_error_response(exc)
                 except ValueError as ve:
-                    return JsonResponse({'success': True, 'solutions': [], 'solutionsReturned': 0, 'solutionCount': 0, 'timedOut': False, 'exhausted': True, 'message': str(ve)}, status=200)
+                    return _unsolvable_response(str(ve))
 
             redis_client = get_redis_client()
             out_batch = []
@@ -74,30 +303,18 @@ def solve_partial_batch(request, solution_id):
             exhausted = False
             timed_out = False
             if redis_client is not None:
-                base_key, meta_key = make_cache_keys(board.width, board.height, partial_board, pieces_for_solver)
                 try:
                     meta = redis_client.hgetall(meta_key)
                     cursor = int(solution_record.state_data.get('cursor', 0))
-                    total = int(meta.get('total', '0')) if meta else 0
                     exists = redis_client.exists(base_key)
                     available_len = redis_client.llen(base_key) if exists else 0
-                    if exists:
-                        rng = redis_client.lrange(base_key, cursor, cursor + batch_size - 1)
-                    else:
-                        rng = []
-                    for item in rng:
-                        try:
-                            out_batch.append({'board': json.loads(item)})
-                        except Exception:
-                            break
+                    rng = redis_client.lrange(base_key, cursor, cursor + batch_size - 1) if exists else []
+                    out_batch, total_found, exhausted = _cached_page(meta, rng, available_len, cursor)
                     if out_batch:
                         served_from_cache = True
                         next_cursor = cursor + len(out_batch)
                         solution_record.state_data['cursor'] = next_cursor
                         solution_record.save(update_fields=['state_data'])
-                        total_found = max(total, available_len, next_cursor)
-                        meta_exhausted = bool(meta.get('exhausted', '0') == '1') if meta else False
-                        exhausted = (next_cursor >= available_len) and meta_exhausted
                         try:
                             logger.info("CACHE HIT key=%s cursor=%d +%d ->%d total=%d avail=%d exhausted=%s", base_key, cursor, len(out_batch), next_cursor, total_found, available_len, exhausted)
                         except Exception:
@@ -106,19 +323,12 @@ def solve_partial_batch(request, solution_id):
                     out_batch = []
 
             if not out_batch:
-                batch, total_found, exhausted, timed_out = session.next_batch(batch_size=batch_size, max_time=max_time)
+                batch, total_found, exhausted, timed_out = pool.run(
+                    session.next_batch, batch_size=batch_size, max_time=max_time,
+                    start=int(solution_record.state_data.get('cursor', 0)), client=client)
                 if redis_client is not None and batch:
-                    base_key, meta_key = make_cache_keys(board.width, board.height, partial_board, pieces_for_solver)
-                    pipe = redis_client.pipeline()
-                    for sol in batch:
-                        try:
-                            pipe.rpush(base_key, json.dumps(sol['board'], separators=(',', ':')))
-                        except Exception:
-                            pass
-                    pipe.hset(meta_key, mapping={'total': str(total_found), 'exhausted': '1' if exhausted else '0'})
-                    pipe.expire(base_key, 24*3600)
-                    pipe.expire(meta_key, 24*3600)
-                    pipe.execute()
+                    append_cached_solutions(redis_client, base_key, meta_key, [sol['board'] for sol in batch],
+                                            total_found, exhausted, start=total_found - len(batch))
                     try:
                         logger.info("CACHE MISS key=%s produced +%d cursor->%d total=%d exhausted=%s", base_key, len(batch), int(solution_record.state_data.get('cursor', 0)) + len(batch), total_found, exhausted)
                     except Exception:
@@ -129,38 +339,16 @@ def solve_partial_batch(request, solution_id):
                 out_batch = batch
                 served_from_cache = False
 
-            
-            if len(out_batch) == 0 and not timed_out and (exhausted or total_found == 0):
-                msg = 'No solutions found.'
-            elif exhausted:
-                msg = 'All solutions found.'
-            elif timed_out:
-                msg = 'Time limit reached; partial batch.'
-            else:
-                msg = 'Batch complete, more available.'
-            response_payload = {
-                'success': True,
-                'solutions': out_batch,
-                'solutionsReturned': len(out_batch),
-                'solutionCount': total_found,
-                'timedOut': timed_out,
-                'exhausted': exhausted,
-                'message': msg,
-                'cache': ('hit' if served_from_cache else 'miss')
-            }
-            resp = JsonResponse(response_payload, status=200)
-            try:
-                resp['X-Kanoodle-Cache'] = 'HIT' if served_from_cache else 'MISS'
-            except Exception:
-                pass
-            return resp
+            return _batch_response(out_batch, total_found, exhausted, timed_out, served_from_cache, session, wire, partial_board)
 
-        result = solver.solvePartial(partial_board, sample_limit, max_time)
-        result['success'] = True
-        if (result.get('solutionCount', 0) == 0) and not result.get('timedOut'):
-            result['message'] = 'No solutions found.'
-        return JsonResponse(result, safe=False)
+        try:
+            fn, args = _one_shot_job(action, data, solver, partial_board, max_time, session_key)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc), "success": False}, status=400)
+        return _one_shot_response(action, pool.run(fn, *args, client=client), wire, partial_board)
 
+    except SolverOverloaded as exc:
+        return _overloaded_response(exc)
     except partialSolution.DoesNotExist:
         return JsonResponse({"error": "No solution found.", "success": False}, status=404)
     except Exception as e:
@@ -169,27 +357,468 @@ def solve_partial_batch(request, solution_id):
              "success": False}, status=500)
 
 
+async def _run_in_pool(pool, fn, *args, client=None, **kwargs):
+    """Await a solver pool job without holding a thread for the request."""
+    return await asyncio.wrap_future(pool.submit(fn, *args, client=client, **kwargs))
+
+
+@capture_solves
+@csrf_exempt
+async def solve_partial_batch_async(request, solution_id):
+    """ASGI variant of ``solve_partial_batch``.
+
+    Solver work runs on the solver pool and is awaited, Redis is reached
+    through ``redis.asyncio``, and if the client disconnects mid-batch the
+    cancellation is forwarded to the producer so it stops at the next
+    solution.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    redis_client = None
+    try:
+        data = json.loads(request.body)
+        partial_board = data.get('partialBoard') or data.get('partial_board')
+        max_time = data.get('maxTime') or data.get('max_time')
+        action = data.get('action')
+        resume_token = data.get('resumeToken') or data.get('resume_token')
+        session_key = f"solve:{solution_id}"
+        if action == 'progress':
+            return _progress_response(session_key)
+        try:
+            _check_constraints(action, data)
+            batch_size = _capped('batchSize', data.get('batchSize'), 24, 'KANOODLE_MAX_BATCH_SIZE', 500)
+            wire = WireFormat.negotiate(request, data)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc), "success": False}, status=400)
+
+        solution_record, board, catalogue, solver = await sync_to_async(_solve_context)(solution_id)
+        pool = get_solver_pool()
+        client = _client_id(request)
+
+        if action in ('init', 'next'):
+            base_key, meta_key = make_cache_keys(board.width, board.height, partial_board, catalogue.pieces,
+                                                 pieces_hash=catalogue.digest, mask=board.mask)
+            if action == 'init':
+                delete_session(session_key)
+                solution_record.state_data = {'mode': 'incremental', 'cursor': 0, 'board': partial_board}
+                await sync_to_async(solution_record.save)(update_fields=['state_data'])
+
+            session = get_session(session_key)
+            if session is None:
+                try:
+                    session = await _run_in_pool(pool, create_session, session_key, solver, partial_board,
+                                                 resume_token=resume_token if action == 'next' else None,
+                                                 shared_key=base_key, client=client)
+                except ResumeTokenError as exc:
+                    return _token_error_response(exc)
+                except ValueError as ve:
+                    return _unsolvable_response(str(ve))
+
+            redis_client = await get_async_redis_client()
+            out_batch = []
+            served_from_cache = False
+            total_found = 0
+            exhausted = False
+            timed_out = False
+            cursor = int(solution_record.state_data.get('cursor', 0))
+            if redis_client is not None:
+                try:
+                    meta = await redis_client.hgetall(meta_key)
+                    exists = await redis_client.exists(base_key)
+                    available_len = await redis_client.llen(base_key) if exists else 0
+                    rng = await redis_client.lrange(base_key, cursor, cursor + batch_size - 1) if exists else []
+                    out_batch, total_found, exhausted = _cached_page(meta, rng, available_len, cursor)
+                    served_from_cache = bool(out_batch)
+                except Exception:
+                    out_batch = []
+
+            if not out_batch:
+                cancel = threading.Event()
+                try:
+                    batch, total_found, exhausted, timed_out = await _run_in_pool(
+                        pool, session.next_batch, batch_size=batch_size, max_time=max_time,
+                        cancel=cancel, start=cursor, client=client)
+                except asyncio.CancelledError:
+                    cancel.set()
+                    raise
+                if redis_client is not None and batch:
+                    await append_cached_solutions_async(redis_client, base_key, meta_key,
+                                                        [sol['board'] for sol in batch], total_found, exhausted,
+                                                        start=total_found - len(batch))
+                out_batch = batch
+
+            solution_record.state_data['cursor'] = cursor + len(out_batch)
+            await sync_to_async(solution_record.save)(update_fields=['state_data'])
+            return _batch_response(out_batch, total_found, exhausted, timed_out, served_from_cache, session, wire, partial_board)
+
+        try:
+            fn, args = _one_shot_job(action, data, solver, partial_board, max_time, session_key)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc), "success": False}, status=400)
+        return _one_shot_response(action, await _run_in_pool(pool, fn, *args, client=client), wire, partial_board)
+
+    except SolverOverloaded as exc:
+        return _overloaded_response(exc)
+    except partialSolution.DoesNotExist:
+        return JsonResponse({"error": "No solution found.", "success": False}, status=404)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Async solve failed")
+        return JsonResponse(
+            {"error": "An internal error occurred while solving. Check server logs for details.",
+             "success": False}, status=500)
+    finally:
+        if redis_client is not None:
+            await redis_client.aclose()
+
+
+@csrf_exempt
+def solve_batch(request):
+    """Solve many partial boards of one ``KanoodleBoard`` in a single call.
+
+    Body: ``{"boards": [...], "sampleLimit", "maxTime", "boardId", "format"}``
+    where each entry is a board state or ``{"partialBoard", "sampleLimit",
+    "maxTime"}``. Results are returned in input order.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        entries = data.get('boards')
+        if not isinstance(entries, list) or not entries:
+            return JsonResponse({"error": "boards must be a non-empty list.", "success": False}, status=400)
+        max_boards = _setting('KANOODLE_BATCH_MAX_BOARDS', 1000)
+        if len(entries) > max_boards:
+            return JsonResponse({"error": f"At most {max_boards} boards per batch.", "success": False}, status=400)
+        try:
+            wire = WireFormat.negotiate(request, data)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc), "success": False}, status=400)
+
+        board = (KanoodleBoard.objects.get(pk=data['boardId']) if data.get('boardId')
+                 else KanoodleBoard.objects.first())
+        catalogue = get_catalogue()
+        solver = KanoodleSolver(board.width, board.height, catalogue.pieces,
+                                pieces_hash=catalogue.digest, orientations=catalogue.orientations,
+                                placement_table=get_placement_table(board.width, board.height, catalogue, board.mask),
+                                mask=board.mask)
+        items = [
+            {'board': e.get('partialBoard') or e.get('partial_board'),
+             'max_samples': _capped('sampleLimit', e.get('sampleLimit') or e.get('max_samples'), None,
+                                    'KANOODLE_MAX_SAMPLES', 1000),
+             'max_time': e.get('maxTime') or e.get('max_time')} if isinstance(e, dict) else e
+            for e in entries
+        ]
+        results = get_solver_pool().run(solver.solve_many, items,
+                                        max_samples=_capped('sampleLimit', data.get('sampleLimit'), 100,
+                                                            'KANOODLE_MAX_SAMPLES', 1000),
+                                        max_time=data.get('maxTime'),
+                                        workers=_setting('KANOODLE_BATCH_WORKERS', 2),
+                                        client=_client_id(request))
+        for item, result in zip(items, results):
+            result['solutions'] = wire.solutions(result['solutions'], item['board'] if isinstance(item, dict) else item)
+        return wire.response({'success': True, 'results': results, 'boards': len(results)})
+
+    except SolverOverloaded as exc:
+        return _overloaded_response(exc)
+    except KanoodleBoard.DoesNotExist:
+        return JsonResponse({"error": "No such board.", "success": False}, status=404)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc), "success": False}, status=400)
+    except Exception:
+        logger.exception("Batch solve failed")
+        return JsonResponse(
+            {"error": "An internal error occurred while solving. Check server logs for details.",
+             "success": False}, status=500)
+
+
+@csrf_exempt
+def solve_pyramid(request):
+    """Solve the 3D pyramid variant with the current piece catalogue.
+
+    Body: ``{"layers", "size", "sampleLimit", "maxTime"}``; ``layers`` is
+    bottom-first, layer ``z`` a ``size - z`` square grid (see
+    ``PyramidSolver``). ``size`` defaults to ``KANOODLE_PYRAMID_SIZE``.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        try:
+            size = int(data.get('size') or _setting('KANOODLE_PYRAMID_SIZE', 5))
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "size must be an integer.", "success": False}, status=400)
+        if not 1 <= size <= _setting('KANOODLE_PYRAMID_MAX_SIZE', 8):
+            return JsonResponse({"error": f"Unsupported pyramid size {size}.", "success": False}, status=400)
+        catalogue = get_catalogue()
+        solver = PyramidSolver(size, catalogue.pieces, placement_table=get_pyramid_table(size, catalogue))
+        if data.get('layers'):
+            try:
+                solver._read_board(data['layers'])
+            except ValueError as exc:
+                return JsonResponse({"error": str(exc), "success": False}, status=400)
+        sample_limit = _capped('sampleLimit', data.get('sampleLimit') or None, 100, 'KANOODLE_MAX_SAMPLES', 1000)
+        result = get_solver_pool().run(solver.solvePartial, data.get('layers'), sample_limit, data.get('maxTime'),
+                                       client=_client_id(request))
+        result['success'] = True
+        result['size'] = size
+        return JsonResponse(result)
+
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc), "success": False}, status=400)
+    except SolverOverloaded as exc:
+        return _overloaded_response(exc)
+    except Exception:
+        logger.exception("Pyramid solve failed")
+        return JsonResponse(
+            {"error": "An internal error occurred while solving. Check server logs for details.",
+             "success": False}, status=500)
+
+
+def _queens_request(request):
+    """``(data, n)`` from an N-Queens request body; ValueError when ``n`` is missing or out of range."""
+    data = json.loads(request.body)
+    n = int(data.get('n') or 0)
+    max_n = _setting('KANOODLE_NQUEENS_MAX_N', 20)
+    if not 1 <= n <= max_n:
+        raise ValueError(f"n must be between 1 and {max_n}.")
+    return data, n
+
+
+def _queens_max_time(data):
+    limit = _setting('KANOODLE_NQUEENS_MAX_TIME', 10_000)
+    return _capped('maxTime', data.get('maxTime') or None, limit, 'KANOODLE_NQUEENS_MAX_TIME', limit)
+
+
+@csrf_exempt
+def count_queens(request):
+    """Count the solutions of the ``n``-queens puzzle.
+
+    Body: ``{"n", "maxTime"}``; ``maxTime`` (ms) defaults to, and is capped
+    at, ``KANOODLE_NQUEENS_MAX_TIME``. A count that runs out of time reports
+    ``timedOut`` with ``shardsDone`` of ``shards``; asking again continues
+    from the finished shards (see ``nqueens.count_solutions``).
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    try:
+        data, n = _queens_request(request)
+        result = get_solver_pool().run(count_solutions, n, _queens_max_time(data),
+                                       _setting('KANOODLE_NQUEENS_WORKERS', 1), client=_client_id(request))
+        result['success'] = True
+        return JsonResponse(result)
+
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc), "success": False}, status=400)
+    except SolverOverloaded as exc:
+        return _overloaded_response(exc)
+    except Exception:
+        logger.exception("N-Queens count failed")
+        return JsonResponse(
+            {"error": "An internal error occurred while counting. Check server logs for details.",
+             "success": False}, status=500)
+
+
+def _queens_page(n, after, limit):
+    solutions = []
+    for columns in iter_solutions(n, after):
+        solutions.append([c + 1 for c in columns])
+        if len(solutions) >= limit:
+            break
+    return solutions
+
+
+@csrf_exempt
+def queens_solutions(request):
+    """Solutions of the ``n``-queens puzzle, one page at a time or streamed.
+
+    Body: ``{"n", "limit", "after", "stream", "maxTime"}``. A solution lists the
+    1-based queen column of each row, as the client's ``NqueenService``
+    does, in lexicographic order. ``after`` is the last solution of the
+    previous page (the response's ``next``). With ``stream`` the
+    solutions are sent as newline-delimited JSON while the search runs,
+    up to ``KANOODLE_NQUEENS_STREAM_LIMIT`` solutions or ``maxTime`` ms
+    (capped at ``KANOODLE_NQUEENS_MAX_TIME``), whichever comes first; the
+    last line sent is the ``after`` that continues the stream.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    try:
+        data, n = _queens_request(request)
+        after = data.get('after')
+        if after is not None:
+            if not isinstance(after, list):
+                raise ValueError("after must be a list of columns.")
+            after = tuple(int(c) - 1 for c in after)
+            next(iter_solutions(n, after), None)  # validates the cursor before a stream starts
+        if data.get('stream'):
+            limit = min(int(data.get('limit') or 0) or float('inf'), _setting('KANOODLE_NQUEENS_STREAM_LIMIT', 100_000))
+            # The stream runs on the response thread rather than the solver
+            # pool, so it is bounded by time as well as by count.
+            deadline = time.monotonic() + _queens_max_time(data) / 1000
+
+            def _lines():
+                for i, columns in enumerate(iter_solutions(n, after)):
+                    if i >= limit or time.monotonic() >= deadline:
+                        break
+                    yield json.dumps([c + 1 for c in columns]) + '\n'
+
+            return StreamingHttpResponse(_lines(), content_type='application/x-ndjson')
+        limit = max(1, min(int(data.get('limit') or 100), _setting('KANOODLE_NQUEENS_MAX_PAGE', 1000)))
+        solutions = get_solver_pool().run(_queens_page, n, after, limit, client=_client_id(request))
+        return JsonResponse({
+            'success': True,
+            'n': n,
+            'solutions': solutions,
+            'solutionsReturned': len(solutions),
+            'next': solutions[-1] if len(solutions) == limit else None,
+        })
+
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc), "success": False}, status=400)
+    except SolverOverloaded as exc:
+        return _overloaded_response(exc)
+    except Exception:
+        logger.exception("N-Queens solutions failed")
+        return JsonResponse(
+            {"error": "An internal error occurred while solving. Check server logs for details.",
+             "success": False}, status=500)
+
+
+def _exact_cover_count(solver, selected, max_time):
+    try:
+        count = solver.count(selected, max_time)
+    except DeadlineReached:
+        return {'solutionCount': None, 'timedOut': True,
+                'message': 'Time limit reached while counting solutions; retry to continue counting.'}
+    return {'solutionCount': count, 'timedOut': False, 'message': f'{count} solution(s).'}
+
+
+@csrf_exempt
+def solve_exact_cover(request):
+    """Solve a generic exact cover problem given as a sparse matrix.
+
+    Body: ``{"columns", "secondary", "rows", "selected", "action",
+    "sampleLimit", "batchSize", "maxTime", "resumeToken"}``; ``rows`` maps
+    row ids to column names and ``selected`` lists rows already chosen
+    (see ``ExactCoverSolver``). ``action`` is ``solve`` (default),
+    ``count``, or ``init``/``next`` to page through solutions on a
+    session shared by every client asking the same problem, as the board
+    endpoints do.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        rows = data.get('rows')
+        max_rows = _setting('KANOODLE_EXACT_COVER_MAX_ROWS', 50_000)
+        if isinstance(rows, dict) and len(rows) > max_rows:
+            raise ValueError(f"At most {max_rows} rows are accepted.")
+        solver = ExactCoverSolver(data.get('columns') or [], rows, data.get('secondary') or [])
+        selected = solver.copy_state(data.get('selected'))
+        action = data.get('action') or 'solve'
+        max_time = data.get('maxTime')
+        pool = get_solver_pool()
+        client = _client_id(request)
+
+        if action in ('init', 'next'):
+            batch_size = _capped('batchSize', data.get('batchSize'), 24, 'KANOODLE_MAX_BATCH_SIZE', 500)
+            fingerprint = solver.fingerprint(selected)
+            session_key = f"exactcover:{client}:{fingerprint}"
+            if action == 'init':
+                delete_session(session_key)
+            session = get_session(session_key)
+            if session is None:
+                try:
+                    session = pool.run(create_session, session_key, solver, selected,
+                                       resume_token=data.get('resumeToken') if action == 'next' else None,
+                                       shared_key=f"exactcover:{fingerprint}", client=client)
+                except ResumeTokenError as exc:
+                    return _token_error_response(exc)
+                except ValueError as ve:
+                    return _unsolvable_response(str(ve))
+            batch, total_found, exhausted, timed_out = pool.run(session.next_batch, batch_size=batch_size,
+                                                                max_time=max_time, client=client)
+            return JsonResponse({
+                'success': True,
+                'solutions': batch,
+                'solutionsReturned': len(batch),
+                'solutionCount': total_found,
+                'timedOut': timed_out,
+                'exhausted': exhausted,
+                'resumeToken': session.resume_token(),
+            })
+        if action == 'count':
+            result = pool.run(_exact_cover_count, solver, selected, max_time, client=client)
+        elif action == 'solve':
+            result = pool.run(solver.solvePartial, selected, data.get('sampleLimit') or 100, max_time, client=client)
+        else:
+            raise ValueError(f"Unknown action {action!r}.")
+        result['success'] = True
+        return JsonResponse(result)
+
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc), "success": False}, status=400)
+    except SolverOverloaded as exc:
+        return _overloaded_response(exc)
+    except Exception:
+        logger.exception("Exact cover solve failed")
+        return JsonResponse(
+            {"error": "An internal error occurred while solving. Check server logs for details.",
+             "success": False}, status=500)
+
+
+def _catalogue_etag(request, *args, **kwargs):
+    try:
+        return get_catalogue().digest
+    except Exception:
+        return None
+
+
 @csrf_exempt
+@condition(etag_func=_catalogue_etag)
 def get_pieces(request):
     if request.method != 'GET':
         return JsonResponse({"error": "GET required."}, status=405)
 
     try:
-        pieces = Piece.objects.all()
-
-        piece_data = [
-            {
-                'id': p.pk,
-                'name': p.name,
-                'shapeData': p.shapeData,
-                'color': p.color,
-            } for p in pieces
-        ]
+        piece_data = get_catalogue().pieces
 
         return JsonResponse({"pieces": piece_data}, safe=False)
 
     except Exception as e:
         return JsonResponse({"error": f"Error fetching pieces: {str(e)}"}, status=500)
 
+
+@csrf_exempt
+async def get_pieces_async(request):
+    if request.method != 'GET':
+        return JsonResponse({"error": "GET required."}, status=405)
+
+    try:
+        catalogue = await sync_to_async(get_catalogue)()
+    except Exception as e:
+        return JsonResponse({"error": f"Error fetching pieces: {str(e)}"}, status=500)
+    not_modified = get_conditional_response(request, etag=catalogue.etag)
+    if not_modified is not None:
+        return not_modified
+    resp = JsonResponse({"pieces": catalogue.pieces}, safe=False)
+    resp['ETag'] = catalogue.etag
+    return resp
+
+@csrf_exempt
+def get_session_stats(request):
+    if request.method != 'GET':
+        return JsonResponse({"error": "GET required."}, status=405)
+    return JsonResponse({'sessions': session_stats(), 'pool': get_solver_pool().stats(),
+                         'processes': get_process_pool().stats()})
+
 solvePartialSolution = solve_partial_batch
 getPiecesApi = get_pieces
\ No newline at end of file
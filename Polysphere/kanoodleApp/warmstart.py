@@ -0,0 +1,71 @@
+import logging
+import os
+import pickle
+import threading
+
+from .catalogue import register_orientations
+from .util import KanoodleSolver, mask_cells
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+_TABLES = {}
+_LOCK = threading.Lock()
+
+
+def get_placement_table(width, height, catalogue, mask=None):
+    """Placement table for a board size (and mask) and catalogue, built once per process.
+
+    Tables loaded from a warm-start snapshot are returned directly; anything
+    else is generated on first use and kept for later requests. Masked
+    boards get their own table holding only placements inside the mask.
+    """
+    mask = mask_cells(width, height, mask)
+    key = (width, height, catalogue.digest) if mask is None else (width, height, catalogue.digest, mask)
+    table = _TABLES.get(key)
+    if table is None:
+        solver = KanoodleSolver(width, height, catalogue.pieces, pieces_hash=catalogue.digest,
+                                orientations=catalogue.orientations, mask=mask)
+        table = solver.build_placement_table()
+        with _LOCK:
+            table = _TABLES.setdefault(key, table)
+    return table
+
+
+def write_snapshot(path, board_sizes, catalogue):
+    """Pickle the placement tables for ``board_sizes`` under the catalogue hash.
+
+    Each table is the sparse master incidence matrix for that board: one row
+    per placement, covering its piece column and its cell columns.
+    """
+    payload = {
+        'version': SNAPSHOT_VERSION,
+        'pieces_hash': catalogue.digest,
+        'orientations': catalogue.orientations,
+        'tables': [
+            {'width': w, 'height': h, 'placements': get_placement_table(w, h, catalogue)}
+            for w, h in sorted(set(board_sizes))
+        ],
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return len(payload['tables'])
+
+
+def load_snapshot(path):
+    """Register the tables and piece orientations from a snapshot file; returns how many tables were loaded."""
+    with open(path, 'rb') as f:
+        payload = pickle.load(f)
+    if payload.get('version') != SNAPSHOT_VERSION:
+        logger.warning("Ignoring warm-start snapshot %s: version %s != %s",
+                       path, payload.get('version'), SNAPSHOT_VERSION)
+        return 0
+    pieces_hash = payload['pieces_hash']
+    register_orientations(pieces_hash, payload['orientations'])
+    with _LOCK:
+        for entry in payload['tables']:
+            _TABLES[(entry['width'], entry['height'], pieces_hash)] = entry['placements']
+    return len(payload['tables'])
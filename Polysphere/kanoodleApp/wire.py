@@ -0,0 +1,119 @@
+import gzip
+import json
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .util import _setting, board_to_string
+
+
+BOARD_FORMATS = ('grid', 'compact', 'placements')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+def _header_tokens(value):
+    """Lower-cased media types / codings from an Accept-style header, skipping ``q=0`` entries."""
+    tokens = []
+    for part in (value or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = params.replace(' ', '').lower()
+        if q.startswith('q=') and q[2:] in ('0', '0.0', '0.00', '0.000'):
+            continue
+        tokens.append(name)
+    return tokens
+
+
+def board_placements(board, request_board=None):
+    """Pieces a solution adds to ``request_board`` as ``[[piece_id, [cell, ...]], ...]``.
+
+    Cells are row-major indices; pieces already on the request board are left out.
+    """
+    placed = {}
+    width = len(board[0]) if board else 0
+    request_board = request_board or []
+    for r, row in enumerate(board):
+        given = request_board[r] if r < len(request_board) else []
+        for c, cell in enumerate(row):
+            if cell and not (c < len(given) and given[c]):
+                placed.setdefault(cell, []).append(r * width + c)
+    return [[piece_id, cells] for piece_id, cells in sorted(placed.items())]
+
+
+class WireFormat:
+    """Negotiated encoding for solve responses.
+
+    ``board_format`` comes from the request body (``format``): ``grid`` is
+    the nested-list board, ``compact`` a row-major string per board (see
+    ``board_to_string``; with piece ids it cannot encode the response falls
+    back to ``grid``, so clients should check ``format``) and ``placements``
+    only the pieces added to the request board. The body is msgpack when the client explicitly lists a
+    msgpack media type in ``Accept`` and the package is installed, and is
+    brotli- or gzip-compressed per ``Accept-Encoding`` once it reaches
+    ``KANOODLE_COMPRESS_MIN_BYTES``. Defaults reproduce the plain JSON
+    response.
+    """
+
+    def __init__(self, board_format='grid', use_msgpack=False, encoding=None):
+        self.board_format = board_format
+        self.use_msgpack = use_msgpack
+        self.encoding = encoding
+
+    @classmethod
+    def negotiate(cls, request, data):
+        board_format = data.get('format') or 'grid'
+        if board_format not in BOARD_FORMATS:
+            raise ValueError(f"Unknown format {board_format!r}; expected one of {', '.join(BOARD_FORMATS)}.")
+        accept = _header_tokens(request.headers.get('Accept'))
+        use_msgpack = msgpack is not None and any(t in MSGPACK_TYPES for t in accept)
+        codings = _header_tokens(request.headers.get('Accept-Encoding'))
+        encoding = None
+        if brotli is not None and 'br' in codings:
+            encoding = 'br'
+        elif 'gzip' in codings:
+            encoding = 'gzip'
+        return cls(board_format, use_msgpack, encoding)
+
+    def solutions(self, solutions, request_board=None):
+        if self.board_format == 'compact':
+            try:
+                return [board_to_string(sol['board']) for sol in solutions]
+            except ValueError:
+                self.board_format = 'grid'
+                return solutions
+        if self.board_format == 'placements':
+            return [board_placements(sol['board'], request_board) for sol in solutions]
+        return solutions
+
+    def response(self, payload, status=200):
+        if self.board_format != 'grid':
+            payload['format'] = self.board_format
+        if self.use_msgpack:
+            body = msgpack.packb(payload, use_bin_type=True)
+            content_type = 'application/msgpack'
+        else:
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            content_type = 'application/json'
+        encoding = self.encoding if len(body) >= _setting('KANOODLE_COMPRESS_MIN_BYTES', 1024) else None
+        if encoding == 'br':
+            body = brotli.compress(body, quality=4)
+        elif encoding == 'gzip':
+            body = gzip.compress(body, compresslevel=5)
+        resp = HttpResponse(body, status=status, content_type=content_type)
+        if encoding:
+            resp['Content-Encoding'] = encoding
+        resp['Content-Length'] = str(len(body))
+        patch_vary_headers(resp, ('Accept', 'Accept-Encoding'))
+        return resp
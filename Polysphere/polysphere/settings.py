@@ -127,3 +127,85 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Solver session store (kanoodleApp.util.SessionStore)
+KANOODLE_SESSIONS_MAX = 32
+KANOODLE_SESSIONS_MAX_NODES = 2_000_000
+KANOODLE_SESSIONS_IDLE_TTL = 900
+
+# Solutions a shared solution stream keeps for its cursors; cursors further behind continue privately
+KANOODLE_STREAM_WINDOW = 10_000
+
+# Solver worker pool (kanoodleApp.pool.SolverPool); 0 disables the per-client cap
+KANOODLE_SOLVER_WORKERS = 4
+KANOODLE_SOLVER_QUEUE = 16
+KANOODLE_SOLVER_PER_CLIENT = 0
+KANOODLE_SOLVER_RETRY_AFTER = 2
+
+# Reverse proxies (IPs or networks) whose X-Forwarded-For entries identify the client for the per-client cap;
+# empty means clients are told apart by REMOTE_ADDR only
+KANOODLE_TRUSTED_PROXIES = []
+
+# Largest `probes` accepted by `action: "estimate"`; larger requests are clamped
+KANOODLE_MAX_PROBES = 5000
+
+# Largest `cap` (solutions counted per placement) accepted by `action: "hint"`; larger requests are clamped
+KANOODLE_MAX_HINT_CAP = 10_000
+
+# Largest `samples` for `action: "sample"` (and each board's `sampleLimit` in /api/solve/batch/) and `batchSize`
+# for the paging actions (init/next, page); larger requests are clamped
+KANOODLE_MAX_SAMPLES = 1000
+KANOODLE_MAX_BATCH_SIZE = 500
+
+# Seconds between write-behind flushes of paging cursors (kanoodleApp.cursors) and how many cursor records it caches
+KANOODLE_CURSOR_FLUSH_INTERVAL = 5
+KANOODLE_CURSOR_CACHE_MAX = 10_000
+
+# Prebuilt solver tables loaded at startup; regenerate with `manage.py build_warmstart`
+KANOODLE_WARMSTART_PATH = BASE_DIR / 'warmstart.pkl'
+
+# Solve responses at least this large are gzip/brotli-compressed when the client accepts it
+KANOODLE_COMPRESS_MIN_BYTES = 1024
+
+# Process pool shared by batch solves, hints, aggregate statistics and N-Queens counts (kanoodleApp.pool.ProcessPool);
+# the *_WORKERS settings below are the slots one request asks for, granted only while this many are free
+KANOODLE_PROCESS_WORKERS = 2
+
+# Batch solve endpoint (/api/solve/batch/): board cap and process slots per request
+KANOODLE_BATCH_MAX_BOARDS = 1000
+KANOODLE_BATCH_WORKERS = 2
+
+# Process slots used to count placements for `action: "hint"` (1 = in the request's pool slot)
+KANOODLE_HINT_WORKERS = 1
+
+# Boards whose subtree-count memo (rank/unrank paging, `action: "page"`, exact cover counts) is kept in memory,
+# and the most counts those memos hold between them
+KANOODLE_RANK_MEMOS = 8
+KANOODLE_RANK_MEMO_ENTRIES = 1_000_000
+
+# Process slots folding shards for `action: "aggregate"` (requires NumPy), and the deepest `shardDepth` accepted;
+# the shard count grows exponentially with depth, so larger requests are clamped
+KANOODLE_AGGREGATE_WORKERS = 1
+KANOODLE_MAX_SHARD_DEPTH = 3
+
+# 3D pyramid endpoint (/api/pyramid/solve/): default base size (5 fits the 12 standard pieces) and largest accepted
+KANOODLE_PYRAMID_SIZE = 5
+KANOODLE_PYRAMID_MAX_SIZE = 8
+
+# N-Queens endpoints (/api/nqueens/...): largest n, counting process slots per request, page and stream caps,
+# and the default and largest `maxTime` (ms) of a count or stream
+KANOODLE_NQUEENS_MAX_N = 20
+KANOODLE_NQUEENS_WORKERS = 1
+KANOODLE_NQUEENS_MAX_PAGE = 1000
+KANOODLE_NQUEENS_STREAM_LIMIT = 100_000
+KANOODLE_NQUEENS_MAX_TIME = 10_000
+
+# Generic exact cover endpoint (/api/exactcover/solve/): largest matrix accepted, in rows
+KANOODLE_EXACT_COVER_MAX_ROWS = 50_000
+
+# Sampled capture of /api/solve/ requests for `manage.py replay_captures`: fraction captured (0 = off),
+# directory of the size-rotated requests.jsonl and its catalogue files, rotation size and kept files
+KANOODLE_CAPTURE_RATE = 0
+KANOODLE_CAPTURE_DIR = BASE_DIR / 'captures'
+KANOODLE_CAPTURE_MAX_BYTES = 10 * 1024 * 1024
+KANOODLE_CAPTURE_BACKUPS = 5